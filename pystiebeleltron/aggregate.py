@@ -0,0 +1,309 @@
+"""
+Incremental aggregation of derived metrics.
+
+A :class:`DeviceAggregator` is fed with successive snapshots of one device
+and keeps rolling windows of derived metrics:
+
+* min/max/mean of selected registers and of the flow/return delta-T,
+* time in state and duty cycle of every operating status bit,
+* compressor starts per hour from the ``COMPRESSOR_STARTS`` counter,
+* DHW heat-up rate while the DHW bit is set.
+
+A :class:`RollingWindow` splits its window into a fixed number of buckets
+and aggregates the samples of a bucket as they arrive. Memory does not grow
+with the number of samples and queries never re-read history, at the cost
+of the window edge being accurate to one bucket.
+
+:class:`FleetAggregator` keeps one aggregator per device and can be passed
+as ``on_poll`` of :class:`pystiebeleltron.fleet.FleetPoller`.
+"""
+
+import math
+from collections import namedtuple
+
+from .pystiebeleltron import REGISTER_MODEL
+
+DEFAULT_REGISTERS = ('OUTSIDE_TEMPERATURE', 'FLOW_TEMPERATURE',
+                     'RETURN_TEMPERATURE', 'ACTUAL_DHW_TEMPERATURE')
+
+_STATUS = 'OPERATING_STATUS'
+_STARTS = 'COMPRESSOR_STARTS'
+_FLOW = 'FLOW_TEMPERATURE'
+_RETURN = 'RETURN_TEMPERATURE'
+_DHW_TEMPERATURE = 'ACTUAL_DHW_TEMPERATURE'
+
+# Names of the derived windows
+_DELTA_T = 'delta_t'
+_START_COUNT = 'starts'
+_DHW_HEAT_UP = 'dhw_heat_up'
+
+
+class Stats(namedtuple('Stats', ['min', 'max', 'mean', 'count', 'total',
+                                 'weighted', 'duration'])):
+    """Aggregate of a window.
+
+    ``total`` is the sum of the values, ``weighted`` the sum of value times
+    duration and ``duration`` the sum of the durations added.
+    """
+
+    __slots__ = ()
+
+    @property
+    def time_mean(self):
+        """Return the time weighted mean or None without duration."""
+        if not self.duration:
+            return None
+        return self.weighted / self.duration
+
+    def rate(self, per=3600.0):
+        """Return the total per time unit (default hours) or None."""
+        if not self.duration:
+            return None
+        return self.total / self.duration * per
+
+
+EMPTY_STATS = Stats(None, None, None, 0, 0.0, 0.0, 0.0)
+
+
+class _Bucket():
+    """Aggregate of the samples of one bucket."""
+
+    __slots__ = ('number', 'count', 'total', 'weighted', 'duration',
+                 'minimum', 'maximum')
+
+    def __init__(self):
+        self.number = None
+        self.count = 0
+        self.total = self.weighted = self.duration = 0.0
+        self.minimum = self.maximum = 0.0
+
+    def reset(self, number: int, value: float, duration: float):
+        """Start the bucket with a number over with a sample."""
+        self.number = number
+        self.count = 1
+        self.total = value
+        self.weighted = value * duration
+        self.duration = duration
+        self.minimum = self.maximum = value
+
+    def add(self, value: float, duration: float):
+        """Add a sample."""
+        self.count += 1
+        self.total += value
+        self.weighted += value * duration
+        self.duration += duration
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+
+
+class RollingWindow():
+    """Sliding window of samples in a fixed number of buckets."""
+
+    __slots__ = ('_width', '_buckets', '_slots', '_last')
+
+    def __init__(self, window: float, buckets: int = 60):
+        """Initialize the window.
+
+        Args:
+            window: Length of the window in seconds.
+            buckets: Number of buckets, the resolution of the window edge
+                is window / buckets.
+        """
+        if window <= 0 or buckets < 1:
+            raise ValueError("Window and buckets must be positive")
+        self._width = window / buckets
+        self._buckets = buckets
+        self._slots = [_Bucket() for _ in range(buckets)]
+        self._last = None
+
+    def add(self, timestamp: float, value: float, duration: float = 0.0):
+        """Add a sample.
+
+        Args:
+            timestamp: Time of the sample in seconds.
+            value: Value of the sample.
+            duration: Time the value applies to, for time weighted means
+                and rates.
+        """
+        number = math.floor(timestamp / self._width)
+        bucket = self._slots[number % self._buckets]
+        if bucket.number != number:
+            bucket.reset(number, value, duration)
+        else:
+            bucket.add(value, duration)
+        if self._last is None or timestamp > self._last:
+            self._last = timestamp
+
+    def stats(self, now: float = None) -> Stats:
+        """Return the aggregate of the window ending at now.
+
+        Args:
+            now: End of the window, defaults to the latest sample.
+        """
+        if now is None:
+            now = self._last
+            if now is None:
+                return EMPTY_STATS
+        newest = math.floor(now / self._width)
+        oldest = newest - self._buckets
+        count = 0
+        total = weighted = duration = 0.0
+        minimum = maximum = None
+        for bucket in self._slots:
+            if bucket.number is None or not oldest < bucket.number <= newest:
+                continue
+            count += bucket.count
+            total += bucket.total
+            weighted += bucket.weighted
+            duration += bucket.duration
+            if minimum is None or bucket.minimum < minimum:
+                minimum = bucket.minimum
+            if maximum is None or bucket.maximum > maximum:
+                maximum = bucket.maximum
+        if not count:
+            return EMPTY_STATS
+        return Stats(minimum, maximum, total / count, count, total, weighted,
+                     duration)
+
+
+class DeviceAggregator():
+    """Rolling derived metrics of one device."""
+
+    def __init__(self, window=3600.0, buckets=60, max_gap=600.0,
+                 registers=DEFAULT_REGISTERS, model=None):
+        """Initialize the aggregator.
+
+        Args:
+            window: Length of the rolling windows in seconds.
+            buckets: Number of buckets per window.
+            max_gap: Snapshots further apart are not used for durations,
+                rates and time in state, e.g. after an outage.
+            registers: Names of registers with min/max/mean.
+            model: Register model of the snapshots, None for the built-in.
+        """
+        if model is None:
+            model = REGISTER_MODEL
+        self._decoders = model.decoders
+        self._max_gap = max_gap
+        self._bits = model.bitmask(_STATUS)
+        self.registers = {name: RollingWindow(window, buckets)
+                          for name in registers}
+        self.states = {name: RollingWindow(window, buckets)
+                       for name in self._bits}
+        # Windows of the flow/return delta-T, compressor starts and DHW
+        # temperature rise
+        self.derived = {name: RollingWindow(window, buckets)
+                        for name in (_DELTA_T, _START_COUNT, _DHW_HEAT_UP)}
+        self._previous = None
+
+    def _value(self, name, words):
+        return self._decoders.decode(name, words)
+
+    def add(self, snapshot):
+        """Aggregate a snapshot.
+
+        Placeholder snapshots and snapshots not newer than the last one are
+        ignored.
+        """
+        timestamp = snapshot.timestamp
+        previous = self._previous
+        if timestamp is None or (previous is not None and
+                                 timestamp <= previous.timestamp):
+            return
+        words = snapshot.words
+        for name, window in self.registers.items():
+            value = self._value(name, words)
+            if value is not None:
+                window.add(timestamp, value)
+        flow = self._value(_FLOW, words)
+        flow_return = self._value(_RETURN, words)
+        if flow is not None and flow_return is not None:
+            self.derived[_DELTA_T].add(timestamp, flow - flow_return)
+
+        if (previous is not None and
+                timestamp - previous.timestamp <= self._max_gap):
+            self._add_interval(previous.words, words,
+                               timestamp - previous.timestamp, timestamp)
+        self._previous = snapshot
+
+    def _add_interval(self, previous, words, duration, timestamp):
+        """Aggregate the interval between two snapshots.
+
+        The states of the earlier snapshot held during the interval.
+        """
+        status = self._value(_STATUS, previous)
+        if status is not None:
+            for name, mask in self._bits.items():
+                self.states[name].add(timestamp, 1.0 if status & mask else 0.0,
+                                      duration)
+
+        starts = self._value(_STARTS, words)
+        previous_starts = self._value(_STARTS, previous)
+        if starts is not None and previous_starts is not None:
+            # The counter wraps at 16 bit, a large jump is a reset
+            delta = (starts - previous_starts) & 0xFFFF
+            if delta < 0x8000:
+                self.derived[_START_COUNT].add(timestamp, delta, duration)
+
+        dhw_mask = self._bits.get('DHW')
+        if status is not None and dhw_mask and status & dhw_mask:
+            temperature = self._value(_DHW_TEMPERATURE, words)
+            previous_temperature = self._value(_DHW_TEMPERATURE, previous)
+            if temperature is not None and previous_temperature is not None:
+                self.derived[_DHW_HEAT_UP].add(
+                    timestamp, temperature - previous_temperature, duration)
+
+    def stats(self, name: str, now=None) -> Stats:
+        """Return min/max/mean of a register in the window."""
+        return self.registers[name].stats(now)
+
+    def time_in_state(self, now=None) -> dict:
+        """Return the seconds every status bit was set in the window."""
+        return {name: window.stats(now).weighted
+                for name, window in self.states.items()}
+
+    def duty_cycle(self, name='COMPRESSOR', now=None):
+        """Return the fraction of time a status bit was set or None."""
+        return self.states[name].stats(now).time_mean
+
+    def starts_per_hour(self, now=None):
+        """Return the compressor starts per hour or None."""
+        return self.derived[_START_COUNT].stats(now).rate()
+
+    def dhw_heat_up_rate(self, now=None):
+        """Return the DHW temperature rise in K/h while heating DHW."""
+        return self.derived[_DHW_HEAT_UP].stats(now).rate()
+
+    def delta_t(self, now=None) -> Stats:
+        """Return min/max/mean of the flow/return delta-T in the window."""
+        return self.derived[_DELTA_T].stats(now)
+
+
+class FleetAggregator():
+    """Derived metrics of many devices."""
+
+    def __init__(self, **kwargs):
+        """Initialize the aggregators.
+
+        Args:
+            kwargs: Arguments of every :class:`DeviceAggregator`.
+        """
+        self._kwargs = kwargs
+        self.devices = {}
+
+    def device(self, key) -> DeviceAggregator:
+        """Return the aggregator of a device, created on first use."""
+        aggregator = self.devices.get(key)
+        if aggregator is None:
+            aggregator = DeviceAggregator(**self._kwargs)
+            self.devices[key] = aggregator
+        return aggregator
+
+    def add(self, key, snapshot):
+        """Aggregate a snapshot of a device."""
+        self.device(key).add(snapshot)
+
+    def on_poll(self, target, api, success):
+        """Aggregate the snapshot of a successful poll of a FleetPoller."""
+        if success:
+            self.add(target, api.snapshot)
@@ -0,0 +1,305 @@
+"""
+Asyncio connection to a Stiebel Eltron ModBus API.
+
+Mirrors :class:`pystiebeleltron.pystiebeleltron.StiebelEltronAPI` for use
+with the pymodbus asyncio clients (e.g. ``AsyncModbusTcpClient``). The three
+register blocks are requested concurrently, so one poll costs roughly a single
+Modbus round trip.
+"""
+
+import asyncio
+import time
+
+from .pystiebeleltron import BaseStiebelEltronAPI, next_deadline
+from .connection import COMMUNICATION_ERRORS, AsyncPriorityConnection
+from .metrics import AsyncInstrumentedConnection
+from .status import DeviceStatus
+from .transaction import AsyncWriteTransaction
+
+
+class AsyncStiebelEltronAPI(BaseStiebelEltronAPI):
+    """Stiebel Eltron API for asyncio Modbus clients."""
+
+    def __init__(self, conn, slave=1, update_on_read=False, *,
+                 max_in_flight=3, **kwargs):
+        """Initialize Stiebel Eltron communication.
+
+        Args:
+            max_in_flight: Requests pipelined on the connection, further
+                requests wait in a queue where writes and read-backs come
+                before polls. See
+                :class:`pystiebeleltron.connection.AsyncPriorityConnection`.
+
+        See :class:`pystiebeleltron.pystiebeleltron.BaseStiebelEltronAPI`
+        for the other arguments.
+        """
+        super().__init__(conn, slave, update_on_read, **kwargs)
+        self._conn = AsyncPriorityConnection(self._conn, max_in_flight)
+        self._refresh_task = None
+
+    async def connect(self) -> bool:
+        """Connect the Modbus client, returns whether it is connected."""
+        return await self._conn.connect()
+
+    def _instrument(self, conn, metrics):
+        """Wrap the connection to report requests to the metrics hook."""
+        return AsyncInstrumentedConnection(conn, metrics, self._model.layout)
+
+    async def refresh(self, max_age=None):
+        """Update the values, if they are older than max_age seconds.
+
+        Concurrent callers share one update in flight.
+        """
+        if not self._needs_refresh(max_age):
+            return True
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.ensure_future(self.update())
+            self._refresh_task.add_done_callback(self._refresh_done)
+        return await asyncio.shield(self._refresh_task)
+
+    def _refresh_done(self, _task):
+        self._refresh_task = None
+
+    async def update(self):
+        """Request current values from heat pump.
+
+        The reads of all blocks are pipelined on the connection.
+        """
+        start = time.perf_counter()
+        ret = True
+        try:
+            registers = await asyncio.gather(
+                *(self.read_registers(request)
+                  for request in self._full_reads))
+        except COMMUNICATION_ERRORS as exc:
+            # The unit does not reply reliably
+            ret = False
+            self.request_failed(exc)
+        else:
+            self._store_reads(zip(
+                (request.offset for request in self._full_reads), registers))
+
+        if self._metrics is not None:
+            self._metrics.observe_duration('update',
+                                           time.perf_counter() - start)
+        return ret
+
+    async def read_registers(self, request):
+        """Read the registers of a planned request."""
+        return (await self._send_read(request)).registers
+
+    async def write_registers(self, address, values):
+        """Write contiguous holding registers."""
+        return await self._send_write(address, values)
+
+    async def update_registers(self, names):
+        """Request current values of some registers from heat pump.
+
+        The planned reads are pipelined on the connection.
+        """
+        reads = self._planner.plan(names)
+        try:
+            registers = await asyncio.gather(
+                *(self.read_registers(request) for request in reads))
+        except COMMUNICATION_ERRORS as exc:
+            # The unit does not reply reliably
+            self.request_failed(exc)
+            return False
+        self.patch_snapshot(
+            zip((request.offset for request in reads), registers))
+        return True
+
+    def transaction(self, verify=True, skip_unchanged=True):
+        """Start a batch of holding register writes.
+
+        Returns:
+            :class:`pystiebeleltron.transaction.AsyncWriteTransaction`,
+            committed when used as async context manager.
+        """
+        return AsyncWriteTransaction(self, verify, skip_unchanged)
+
+    async def changes(self, names, deadband=None, maxsize=100):
+        """Iterate over the changes of registers or status bits.
+
+        Args:
+            names: Register names or names of bits of B3_OPERATING_STATUS.
+            deadband: Minimum change of analog values to be reported.
+            maxsize: Maximum number of queued changes, the oldest change is
+                dropped when a slow consumer falls behind.
+
+        Yields:
+            :class:`pystiebeleltron.subscription.Change`
+        """
+        queue = asyncio.Queue(maxsize)
+
+        def put(change):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(change)
+
+        unsubscribes = [self.subscribe(name, put, deadband) for name in names]
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            for unsubscribe in unsubscribes:
+                unsubscribe()
+
+    async def stream(self, interval, registers=None, count=None):
+        """Poll at a fixed rate and yield the decoded values.
+
+        Polling runs in a task of its own on a fixed grid. Only the latest
+        sample is kept for a slow consumer, samples it did not take are
+        counted in the `missed` field of the next one.
+
+        Args:
+            interval: Time between two polls in seconds.
+            registers: Names of the registers to poll, None for all.
+            count: Number of samples to yield, None for no limit.
+
+        Yields:
+            :class:`pystiebeleltron.pystiebeleltron.Sample`
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(1)
+
+        async def produce():
+            deadline = loop.time()
+            missed = 0
+            while True:
+                delay = deadline - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if registers is None:
+                    success = await self.update()
+                else:
+                    success = await self.update_registers(registers)
+                if success:
+                    if queue.full():
+                        missed += queue.get_nowait().missed + 1
+                    queue.put_nowait(self._sample(registers, missed))
+                    missed = 0
+                else:
+                    missed += 1
+                deadline, skipped = next_deadline(deadline, interval,
+                                                  loop.time())
+                missed += skipped
+
+        producer = asyncio.ensure_future(produce())
+        samples = 0
+        try:
+            while count is None or samples < count:
+                getter = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait(
+                    (getter, producer), return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    # The producer only stops on an error, raise it here
+                    getter.cancel()
+                    producer.result()
+                yield getter.result()
+                samples += 1
+        finally:
+            producer.cancel()
+
+    async def poll(self, schedule):
+        """Update the register groups of a schedule which are due."""
+        groups = schedule.due()
+        if not groups:
+            return True
+        previous = self._snapshot
+        if not await self.update_registers(schedule.registers(groups)):
+            return False
+        schedule.polled(groups, self._snapshot.changed(previous))
+        return True
+
+    # Handle room temperature & humidity
+
+    async def get_current_temp(self, max_age=None):
+        """Get the current room temperature."""
+        await self.refresh(max_age)
+        return self.get_conv_val('ACTUAL_ROOM_TEMPERATURE_HC1')
+
+    async def get_target_temp(self, max_age=None):
+        """Get the target room temperature."""
+        await self.refresh(max_age)
+        return self.get_conv_val('ROOM_TEMP_HEAT_DAY_HC1')
+
+    async def _write_value(self, name: str, value, confirm: bool) -> bool:
+        """Write a converted value to a register."""
+        if confirm:
+            transaction = self.transaction(skip_unchanged=False)
+            transaction.set(name, value)
+            return await transaction.commit()
+        address, _, word = self.encode_write(name, value)
+        await self.write_registers(address, [word])
+        return True
+
+    async def set_target_temp(self, temp: float, confirm=False):
+        """Set the target room temperature (day)(HC1).
+
+        Args:
+            temp: Temperature in °C.
+            confirm: Read the register back ahead of queued polls.
+
+        Returns:
+            With confirm whether the register holds the temperature, otherwise
+            True once the write is sent.
+        """
+        return await self._write_value('ROOM_TEMP_HEAT_DAY_HC1', temp,
+                                       confirm)
+
+    async def get_current_humidity(self, max_age=None):
+        """Get the current room humidity."""
+        await self.refresh(max_age)
+        return self.get_conv_val('RELATIVE_HUMIDITY_HC1')
+
+    # Handle operation mode
+
+    async def get_operation(self, max_age=None):
+        """Return the current mode of operation."""
+        await self.refresh(max_age)
+
+        op_mode = self.get_conv_val('OPERATING_MODE')
+        return self._model.label('OPERATING_MODE', op_mode, 'UNKNOWN')
+
+    async def set_operation(self, mode: str, confirm=False):
+        """Set the operation mode.
+
+        Args:
+            mode: Label of the mode, e.g. 'AUTOMATIC'.
+            confirm: Read the register back ahead of queued polls.
+
+        Returns:
+            With confirm whether the register holds the mode, otherwise
+            True once the write is sent.
+        """
+        return await self._write_value(
+            'OPERATING_MODE', self._operation_value(mode), confirm)
+
+    # Handle device status
+
+    async def get_heating_status(self, max_age=None):
+        """Return heater status."""
+        await self.refresh(max_age)
+        bits = self._model.bitmask('OPERATING_STATUS')
+        return bool(self.get_conv_val('OPERATING_STATUS') & bits['HEATING'])
+
+    async def get_cooling_status(self, max_age=None):
+        """Cooling status."""
+        await self.refresh(max_age)
+        bits = self._model.bitmask('OPERATING_STATUS')
+        return bool(self.get_conv_val('OPERATING_STATUS') & bits['COOLING'])
+
+    async def get_filter_alarm_status(self, max_age=None):
+        """Return filter alarm."""
+        await self.refresh(max_age)
+
+        bits = self._model.bitmask('OPERATING_STATUS')
+        filter_mask = (bits['FILTER'] | bits['FILTER_EXTRACT_AIR'] |
+                       bits['FILTER_VENTILATION_AIR'])
+        return bool(self.get_conv_val('OPERATING_STATUS') & filter_mask)
+
+    async def get_status(self, max_age=None) -> DeviceStatus:
+        """Return operating, fault and bus status of a single update."""
+        await self.refresh(max_age)
+        return DeviceStatus.from_snapshot(self._snapshot)
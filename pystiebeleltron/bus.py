@@ -0,0 +1,272 @@
+"""
+Poll many slaves sharing one Modbus line.
+
+On an RS-485 line, or a serial gateway behind one TCP connection, only one
+request can be on the wire at a time. :class:`BusScheduler` owns the
+pymodbus client and sends the requests of all slaves from one worker
+thread:
+
+* requests are prioritized: writes first, then reads of status registers,
+  then other reads, in order of submission within a priority,
+* the line is kept silent for ``frame_delay`` seconds between a
+  response and the next request (3.5 character times for Modbus RTU),
+* a slave which stopped answering is skipped for a while by its own
+  circuit breaker, so it does not block the line with timeouts.
+
+Every slave gets a :class:`StiebelEltronAPI` view (see :meth:`api`) whose
+requests go through the scheduler, so views can be used from any thread.
+"""
+
+import itertools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from pymodbus.exceptions import ModbusException
+
+from .connection import (
+    CircuitBreaker, CircuitOpenError, ConnectionWrapper, READ_BACK,
+    current_priority)
+from .pystiebeleltron import StiebelEltronAPI, REGISTER_MODEL
+from .registers import load_model
+from .snapshot import INPUT_REGISTERS, HOLDING_REGISTERS
+
+_LOGGER = logging.getLogger(__name__)
+
+# Request priorities, lower first
+WRITE = 0
+STATUS = 1
+READ = 2
+
+_STOP = -1
+
+# Character of Modbus RTU: start bit, 8 data bits, parity, stop bit
+_BITS_PER_CHARACTER = 11
+
+
+def inter_frame_delay(baudrate: int) -> float:
+    """Return the silent interval between Modbus RTU frames.
+
+    The specification requires 3.5 character times, but a fixed 1.75 ms
+    above 19200 baud.
+    """
+    if baudrate > 19200:
+        return 0.00175
+    return 3.5 * _BITS_PER_CHARACTER / baudrate
+
+
+class BusConnection(ConnectionWrapper):
+    """Connection of one slave, sending its requests through the bus."""
+
+    def __init__(self, scheduler, slave: int, model=REGISTER_MODEL):
+        """Initialize the connection.
+
+        Args:
+            scheduler: The :class:`BusScheduler` of the line.
+            slave: Modbus slave id.
+            model: Register model, reads of its status registers (those
+                with status bits) get the STATUS priority.
+        """
+        self._scheduler = scheduler
+        self._slave = slave
+        self._status = set()
+        for register in model.bitmasks:
+            offset = model.layout.offset(register)
+            self._status.add(model.layout.locate(offset)[1:])
+
+    @property
+    def connected(self) -> bool:
+        """Return whether the bus client is connected."""
+        return bool(self._scheduler.client.connected)
+
+    def connect(self) -> bool:
+        """The scheduler connects the bus client on demand."""
+        return True
+
+    def close(self):
+        """The scheduler closes the bus client when stopped."""
+
+    def priority(self, table: str, address: int, count: int) -> int:
+        """Return the priority of a read, read-backs of writes go first."""
+        if current_priority() <= READ_BACK:
+            return WRITE
+        for status_table, status_address in self._status:
+            if (table == status_table and
+                    address <= status_address < address + count):
+                return STATUS
+        return READ
+
+    def _request(self, method: str, **kwargs):
+        kwargs['slave'] = self._slave
+        if method.startswith('write'):
+            priority = WRITE
+        elif method == 'read_input_registers':
+            priority = self.priority(INPUT_REGISTERS, kwargs['address'],
+                                     kwargs['count'])
+        else:
+            priority = self.priority(HOLDING_REGISTERS, kwargs['address'],
+                                     kwargs['count'])
+        return self._scheduler.submit(priority, method, **kwargs).result()
+
+
+class BusScheduler():
+    """Serialize and prioritize the requests of many slaves on one line."""
+
+    # Line settings, queue, breakers and counters of the bus
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, client, frame_delay=0.0, failure_threshold=3,
+                 reset_timeout=60.0):
+        """Initialize the scheduler.
+
+        Args:
+            client: Synchronous pymodbus client of the line, e.g.
+                ``ModbusSerialClient`` or ``ModbusTcpClient`` of a gateway.
+            frame_delay: Silent time between a response and the next
+                request in seconds, see :func:`inter_frame_delay`.
+            failure_threshold: Consecutive failed requests of a slave after
+                which its requests are rejected.
+            reset_timeout: Seconds until a rejected slave is tried again.
+        """
+        self.client = client
+        self._frame_delay = frame_delay
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._breakers = {}
+        self._views = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_frame = float('-inf')
+        self.requests = 0
+        self.busy = 0.0
+
+    def start(self):
+        """Start the worker thread, unless it is running."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='BusScheduler', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Stop the worker thread and close the client.
+
+        Requests still queued fail with a CircuitOpenError.
+        """
+        with self._lock:
+            if self._thread is not None:
+                self._queue.put((_STOP, next(self._sequence), None))
+                self._thread.join()
+                self._thread = None
+        while not self._queue.empty():
+            _, _, job = self._queue.get_nowait()
+            if job is not None:
+                job[0].set_exception(CircuitOpenError("Bus stopped"))
+        self.client.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.stop()
+
+    def api(self, slave: int, model=None, **kwargs) -> StiebelEltronAPI:
+        """Return the API view of a slave.
+
+        Args:
+            slave: Modbus slave id.
+            model: Register model or name of a bundled model.
+            kwargs: Further arguments of :class:`StiebelEltronAPI`.
+        """
+        view = self._views.get(slave)
+        if view is None:
+            if model is None:
+                model = REGISTER_MODEL
+            elif isinstance(model, str):
+                model = load_model(model)
+            view = StiebelEltronAPI(BusConnection(self, slave, model), slave,
+                                    model=model, **kwargs)
+            self._views[slave] = view
+        return view
+
+    @property
+    def views(self) -> dict:
+        """Return the API views by slave id."""
+        return dict(self._views)
+
+    def update_all(self) -> dict:
+        """Update all views one after the other.
+
+        Returns:
+            Dict of slave id to the result of the update.
+        """
+        return {slave: view.update() for slave, view in self._views.items()}
+
+    def _breaker(self, slave: int) -> CircuitBreaker:
+        breaker = self._breakers.get(slave)
+        if breaker is None:
+            breaker = CircuitBreaker(self._failure_threshold,
+                                     self._reset_timeout)
+            self._breakers[slave] = breaker
+        return breaker
+
+    def submit(self, priority: int, method: str, **kwargs) -> Future:
+        """Queue a request of the client.
+
+        Args:
+            priority: WRITE, STATUS or READ.
+            method: Name of the client method.
+            kwargs: Arguments of the client method incl. slave.
+
+        Returns:
+            Future of the response.
+        """
+        future = Future()
+        self._queue.put((priority, next(self._sequence),
+                         (future, method, kwargs)))
+        self.start()
+        return future
+
+    def _run(self):
+        while True:
+            priority, _, job = self._queue.get()
+            if priority == _STOP:
+                return
+            future, method, kwargs = job
+            if future.set_running_or_notify_cancel():
+                self._execute(future, method, kwargs)
+
+    def _execute(self, future, method, kwargs):
+        breaker = self._breaker(kwargs['slave'])
+        try:
+            breaker.before_request()
+        except CircuitOpenError as exc:
+            future.set_exception(exc)
+            return
+
+        wait = self._last_frame + self._frame_delay - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        start = time.monotonic()
+        try:
+            if not self.client.connected:
+                self.client.connect()
+            response = getattr(self.client, method)(**kwargs)
+        except Exception as exc:  # pylint: disable=broad-except
+            breaker.record_failure()
+            future.set_exception(exc)
+        else:
+            if isinstance(response, ModbusException) or response is None:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            future.set_result(response)
+        finally:
+            self._last_frame = time.monotonic()
+            self.requests += 1
+            self.busy += self._last_frame - start
@@ -0,0 +1,484 @@
+"""
+Resilient connection to the ISG.
+
+:class:`ResilientConnection` wraps a pymodbus client and can be passed to
+:class:`StiebelEltronAPI` in its place. It
+
+* connects lazily and reconnects after the ISG dropped the connection,
+* retries a failed request with bounded exponential backoff,
+* trips a circuit breaker after repeated failures, so callers fail fast
+  with :class:`CircuitOpenError` instead of each waiting for the timeout.
+  After ``reset_timeout`` seconds a single trial request is let through.
+
+:class:`AsyncResilientConnection` does the same for the asyncio clients.
+
+:class:`LockedConnection` serializes the requests of several threads on one
+client. Its :class:`PriorityLock` is granted to waiting writes before polls.
+
+:class:`AsyncPriorityConnection` limits the requests in flight on an asyncio
+client and lets writes and their read-backs overtake queued polls.
+
+Wrappers derived from :class:`ConnectionWrapper` and
+:class:`AsyncConnectionWrapper` only implement ``_request``, the base
+forwards the client methods used by the API to it.
+
+A response with a Modbus exception code counts as an answer of the device,
+it is returned to the caller and not retried.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from pymodbus.exceptions import ConnectionException, ModbusException
+
+_LOGGER = logging.getLogger(__name__)
+
+# Errors of a request which mean the device did not answer (properly)
+COMMUNICATION_ERRORS = (
+    AttributeError, ModbusException, OSError, asyncio.TimeoutError)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitOpenError(ConnectionException):
+    """Request rejected, because the circuit breaker is open."""
+
+
+class CircuitBreaker():
+    """Count consecutive failures and reject requests after too many."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        """Initialize the breaker.
+
+        Args:
+            failure_threshold: Consecutive failures opening the circuit.
+            reset_timeout: Seconds until a trial request is let through.
+        """
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        """Return CLOSED, OPEN or HALF_OPEN."""
+        if self._opened_at is None:
+            return CLOSED
+        if time.monotonic() - self._opened_at >= self._reset_timeout:
+            return HALF_OPEN
+        return OPEN
+
+    def before_request(self):
+        """Raise CircuitOpenError if the request is not allowed."""
+        state = self.state
+        if state == OPEN or (state == HALF_OPEN and self._trial):
+            raise CircuitOpenError(
+                f"Circuit open after {self._failures} failures")
+        self._trial = state == HALF_OPEN
+
+    def record_success(self):
+        """Close the circuit."""
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    def record_failure(self):
+        """Count a failure, open the circuit at the threshold."""
+        self._failures += 1
+        self._trial = False
+        if self._failures >= self._failure_threshold:
+            if self._opened_at is None:
+                _LOGGER.warning("Opening circuit after %d failures",
+                                self._failures)
+            self._opened_at = time.monotonic()
+
+
+def _check_response(response):
+    """Raise the exception pymodbus returned in place of a response."""
+    if isinstance(response, ModbusException):
+        raise response
+    if response is None:
+        raise ConnectionException("No response received")
+    return response
+
+
+class ConnectionWrapper():
+    """Base of the wrappers of a synchronous client.
+
+    The requests of the API are forwarded to :meth:`_request` with the name
+    of the client method, subclasses implement it.
+    """
+
+    def _request(self, method: str, **kwargs):
+        raise NotImplementedError
+
+    def read_input_registers(self, address, count=1, slave=0):
+        """Read input registers."""
+        return self._request('read_input_registers', address=address,
+                             count=count, slave=slave)
+
+    def read_holding_registers(self, address, count=1, slave=0):
+        """Read holding registers."""
+        return self._request('read_holding_registers', address=address,
+                             count=count, slave=slave)
+
+    def write_register(self, address, value, slave=0):
+        """Write a single holding register."""
+        return self._request('write_register', address=address, value=value,
+                             slave=slave)
+
+    def write_registers(self, address, values, slave=0):
+        """Write contiguous holding registers."""
+        return self._request('write_registers', address=address,
+                             values=values, slave=slave)
+
+
+class AsyncConnectionWrapper():
+    """Base of the wrappers of an asyncio client."""
+
+    async def _request(self, method: str, **kwargs):
+        raise NotImplementedError
+
+    async def read_input_registers(self, address, count=1, slave=0):
+        """Read input registers."""
+        return await self._request('read_input_registers', address=address,
+                                   count=count, slave=slave)
+
+    async def read_holding_registers(self, address, count=1, slave=0):
+        """Read holding registers."""
+        return await self._request('read_holding_registers', address=address,
+                                   count=count, slave=slave)
+
+    async def write_register(self, address, value, slave=0):
+        """Write a single holding register."""
+        return await self._request('write_register', address=address,
+                                   value=value, slave=slave)
+
+    async def write_registers(self, address, values, slave=0):
+        """Write contiguous holding registers."""
+        return await self._request('write_registers', address=address,
+                                   values=values, slave=slave)
+
+
+class _Resilience():
+    """Retry and circuit breaker settings of the resilient connections."""
+
+    def __init__(self, client, retries=2, backoff_base=0.1, backoff_max=2.0,
+                 breaker=None):
+        """Initialize the connection.
+
+        Args:
+            client: pymodbus client, e.g. ``ModbusTcpClient``.
+            retries: Retries of a failed request.
+            backoff_base: Wait before the first retry in seconds, doubled
+                for every further retry.
+            backoff_max: Upper bound of the wait between retries.
+            breaker: :class:`CircuitBreaker` counting the failed requests
+                (after retries), None for one with the default settings.
+        """
+        self.client = client
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self._retries = retries
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+
+    @property
+    def connected(self) -> bool:
+        """Return whether the client is connected."""
+        return bool(self.client.connected)
+
+    def close(self):
+        """Close the client."""
+        self.client.close()
+
+    def _backoff(self, attempt: int) -> float:
+        return min(self._backoff_max, self._backoff_base * 2 ** attempt)
+
+
+class ResilientConnection(_Resilience, ConnectionWrapper):
+    """Reconnecting, retrying wrapper of a synchronous pymodbus client."""
+
+    def connect(self) -> bool:
+        """Connect the client."""
+        return self.client.connect()
+
+    def _request(self, method: str, **kwargs):
+        self.breaker.before_request()
+        attempt = 0
+        while True:
+            try:
+                if not self.client.connected and not self.client.connect():
+                    raise ConnectionException("Failed to connect")
+                response = _check_response(
+                    getattr(self.client, method)(**kwargs))
+            except (ModbusException, OSError) as exc:
+                self.client.close()
+                if attempt >= self._retries:
+                    self.breaker.record_failure()
+                    raise
+                _LOGGER.debug("%s failed (attempt %d): %s",
+                              method, attempt + 1, exc)
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+            else:
+                self.breaker.record_success()
+                return response
+
+
+class AsyncResilientConnection(_Resilience, AsyncConnectionWrapper):
+    """Reconnecting, retrying wrapper of an asyncio pymodbus client."""
+
+    async def connect(self) -> bool:
+        """Connect the client."""
+        return await self.client.connect()
+
+    async def _request(self, method: str, **kwargs):
+        self.breaker.before_request()
+        attempt = 0
+        while True:
+            try:
+                if (not self.client.connected and
+                        not await self.client.connect()):
+                    raise ConnectionException("Failed to connect")
+                response = _check_response(
+                    await getattr(self.client, method)(**kwargs))
+            except (ModbusException, OSError, asyncio.TimeoutError) as exc:
+                self.client.close()
+                if attempt >= self._retries:
+                    self.breaker.record_failure()
+                    raise
+                _LOGGER.debug("%s failed (attempt %d): %s",
+                              method, attempt + 1, exc)
+                await asyncio.sleep(self._backoff(attempt))
+                attempt += 1
+            else:
+                self.breaker.record_success()
+                return response
+
+
+class LockedConnection(ConnectionWrapper):
+    """Wrapper of a synchronous client serializing requests with a lock.
+
+    Writes wait for the lock with WRITE priority, reads with the priority of
+    :func:`current_priority`.
+    """
+
+    def __init__(self, client, lock=None):
+        """Initialize the wrapper.
+
+        Args:
+            client: pymodbus client or another connection wrapper.
+            lock: :class:`PriorityLock` shared with the API, None for a new
+                one.
+        """
+        self.client = client
+        self.lock = lock if lock is not None else PriorityLock()
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    @property
+    def connected(self) -> bool:
+        """Return whether the client is connected."""
+        return bool(self.client.connected)
+
+    def connect(self) -> bool:
+        """Connect the client."""
+        with self.lock:
+            return self.client.connect()
+
+    def close(self):
+        """Close the client."""
+        with self.lock:
+            self.client.close()
+
+    def _request(self, method: str, **kwargs):
+        if method.startswith('write'):
+            self.lock.acquire(WRITE)
+        else:
+            self.lock.acquire()
+        try:
+            return getattr(self.client, method)(**kwargs)
+        finally:
+            self.lock.release()
+
+
+# Request priorities, lower first
+WRITE = 0
+READ_BACK = 1
+POLL = 2
+
+_request_priority = contextvars.ContextVar('request_priority', default=POLL)
+
+
+@contextlib.contextmanager
+def request_priority(priority: int):
+    """Send the reads of the current thread or task with a priority."""
+    token = _request_priority.set(priority)
+    try:
+        yield
+    finally:
+        _request_priority.reset(token)
+
+
+def current_priority() -> int:
+    """Return the read priority of the current thread or task."""
+    return _request_priority.get()
+
+
+class PriorityLock():
+    """Reentrant lock granted to the waiting thread of highest priority.
+
+    A thread acquires it with the priority of :func:`current_priority`
+    unless it passes one, threads of equal priority get it in order of
+    arrival. :meth:`yield_lock` lets a series of reads step aside for
+    waiting writes.
+    """
+
+    def __init__(self):
+        """Initialize the lock."""
+        self._condition = threading.Condition(threading.Lock())
+        self._owner = None
+        self._depth = 0
+        self._priority = None
+        self._waiters = []
+        self._sequence = itertools.count()
+
+    def _take(self, entry, depth: int):
+        """Wait until the entry is first in line and the lock is free."""
+        heapq.heappush(self._waiters, entry)
+        self._condition.wait_for(
+            lambda: self._owner is None and self._waiters[0] is entry)
+        heapq.heappop(self._waiters)
+        self._owner = threading.get_ident()
+        self._depth = depth
+        self._priority = entry[0]
+
+    def acquire(self, priority=None):
+        """Acquire the lock, blocking until it is granted."""
+        if priority is None:
+            priority = current_priority()
+        with self._condition:
+            if self._owner == threading.get_ident():
+                self._depth += 1
+            else:
+                self._take((priority, next(self._sequence)), 1)
+
+    def release(self):
+        """Release the lock."""
+        with self._condition:
+            self._depth -= 1
+            if not self._depth:
+                self._owner = None
+                self._condition.notify_all()
+
+    def yield_lock(self):
+        """Let waiting threads of a higher priority go first.
+
+        The lock is taken back ahead of other waiters of the same priority.
+        A nested holder keeps the lock.
+        """
+        with self._condition:
+            if (self._depth != 1 or not self._waiters or
+                    self._waiters[0][0] >= self._priority):
+                return
+            self._owner = None
+            self._depth = 0
+            self._condition.notify_all()
+            self._take((self._priority, -1), 1)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.release()
+
+
+class AsyncPriorityConnection():
+    """Wrapper of an asyncio client sending requests by priority.
+
+    At most ``max_in_flight`` requests are sent at once, the others wait.
+    A free slot goes to the waiting request of the highest priority: writes,
+    then reads in a :func:`request_priority` block of READ_BACK, then polls.
+    """
+
+    def __init__(self, client, max_in_flight=3):
+        """Initialize the wrapper.
+
+        Args:
+            client: Asyncio pymodbus client or another connection wrapper.
+            max_in_flight: Requests pipelined on the connection. 1 lets a
+                write overtake all polls but the one in flight.
+        """
+        self.client = client
+        self._max_in_flight = max_in_flight
+        self._in_flight = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    async def _acquire(self, priority: int):
+        if self._in_flight < self._max_in_flight and not self._waiters:
+            self._in_flight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over before the cancellation
+                self._release()
+            raise
+
+    def _release(self):
+        """Hand the slot to the first waiter or free it."""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._in_flight -= 1
+
+    async def _request(self, priority, operation, **kwargs):
+        await self._acquire(priority)
+        try:
+            return await getattr(self.client, operation)(**kwargs)
+        finally:
+            # Hand the slot over on the next iteration of the loop, so the
+            # caller can queue its follow-up request, e.g. the read-back of
+            # a write, before the slot goes to a waiting poll
+            asyncio.get_running_loop().call_soon(self._release)
+
+    async def read_input_registers(self, address, count=1, slave=0):
+        """Read input registers."""
+        return await self._request(current_priority(), 'read_input_registers',
+                                   address=address, count=count, slave=slave)
+
+    async def read_holding_registers(self, address, count=1, slave=0):
+        """Read holding registers."""
+        return await self._request(
+            current_priority(), 'read_holding_registers', address=address,
+            count=count, slave=slave)
+
+    async def write_register(self, address, value, slave=0):
+        """Write a single holding register."""
+        return await self._request(WRITE, 'write_register', address=address,
+                                   value=value, slave=slave)
+
+    async def write_registers(self, address, values, slave=0):
+        """Write contiguous holding registers."""
+        return await self._request(WRITE, 'write_registers', address=address,
+                                   values=values, slave=slave)
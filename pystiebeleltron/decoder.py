@@ -0,0 +1,127 @@
+"""
+Precompiled decoders for raw register words.
+
+The decoder of every register (offset in the snapshot, multiplier, signedness
+and error values) is compiled once, so converting a value is a dict lookup,
+an index into the snapshot words and a multiplication.
+
+Error values are only checked for the signed data types (2 and 7), which
+carry the sensor readings. Unsigned registers use the whole value range, e.g.
+counters and status bit masks.
+"""
+
+import math
+from collections import namedtuple
+
+# Data type: (multiplier for reading, signed)
+DATA_TYPES = {
+    2: (0.1, True),
+    6: (1, False),
+    7: (0.01, True),
+    8: (1, False),
+}
+
+# Data type: (minimum, maximum) of the raw value
+RAW_RANGES = {
+    2: (-0x8000, 0x7FFF),
+    6: (0, 0xFFFF),
+    7: (-0x8000, 0x7FFF),
+    8: (0, 0xFF),
+}
+
+RegisterDecoder = namedtuple(
+    'RegisterDecoder',
+    ['name', 'offset', 'type', 'multiplier', 'signed', 'error_words'])
+
+
+def to_signed(word: int) -> int:
+    """Convert an unsigned 16 bit word to a signed value."""
+    return word - 0x10000 if word & 0x8000 else word
+
+
+def decode_word(word: int, decoder: RegisterDecoder):
+    """Convert a raw word, returns None for error values."""
+    if word in decoder.error_words:
+        return None
+    if decoder.signed and word & 0x8000:
+        word -= 0x10000
+    if decoder.multiplier == 1:
+        return word
+    return word * decoder.multiplier
+
+
+def encode_value(value, decoder: RegisterDecoder) -> int:
+    """Convert a value to the raw word to be written.
+
+    Raises:
+        ValueError: If the value is not finite or out of range of the data
+            type.
+    """
+    if not math.isfinite(value):
+        raise ValueError(f"Value {value} of {decoder.name} is not finite")
+    raw = round(value / decoder.multiplier)
+    low, high = RAW_RANGES[decoder.type]
+    if not low <= raw <= high or raw & 0xFFFF in decoder.error_words:
+        raise ValueError(f"Value {value} out of range for {decoder.name} "
+                         f"(data type {decoder.type})")
+    return raw & 0xFFFF
+
+
+class DecoderTable():
+    """Decoders of all registers of a layout."""
+
+    __slots__ = ('layout', 'decoders', '_sequence')
+
+    def __init__(self, layout, regmaps, error_values=(), unavailable=None):
+        """Compile the decoders.
+
+        Args:
+            layout: :class:`pystiebeleltron.snapshot.RegisterLayout` of the
+                snapshots to decode.
+            regmaps: Register maps defining the data type of each register.
+            error_values: Converted values of signed registers which signal
+                a sensor error.
+            unavailable: Raw word of signed registers which signals an
+                unavailable object.
+        """
+        decoders = {}
+        for regmap in regmaps:
+            for name, entry in regmap.items():
+                multiplier, signed = DATA_TYPES[entry['type']]
+                error_words = frozenset()
+                if signed:
+                    words = [round(value / multiplier) & 0xFFFF
+                             for value in error_values]
+                    if unavailable is not None:
+                        words.append(unavailable)
+                    error_words = frozenset(words)
+                decoders[name] = RegisterDecoder(
+                    name, layout.index[name], entry['type'], multiplier,
+                    signed, error_words)
+        self.layout = layout
+        self.decoders = decoders
+        self._sequence = tuple(decoders.values())
+
+    def __contains__(self, name) -> bool:
+        return self.get(name) is not None
+
+    def get(self, name: str):
+        """Return the decoder of a register name or alias or None."""
+        decoder = self.decoders.get(name)
+        if decoder is None and name in self.layout.aliases:
+            decoder = self.decoders.get(self.layout.aliases[name])
+        return decoder
+
+    def decode(self, name: str, words):
+        """Convert the value of one register, None if unknown or invalid."""
+        decoder = self.decoders.get(name)
+        if decoder is None:
+            decoder = self.get(name)
+            if decoder is None:
+                return None
+        return decode_word(words[decoder.offset], decoder)
+
+    def decode_all(self, words) -> dict:
+        """Convert the values of all registers in one pass."""
+        return {decoder.name: decode_word(words[decoder.offset], decoder)
+                for decoder in self._sequence}
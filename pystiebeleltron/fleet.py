@@ -0,0 +1,251 @@
+"""
+Poll a fleet of Stiebel Eltron ISG gateways from one process.
+
+Every target is a (host, port, slave) tuple. Targets sharing a host and port
+share one asyncio Modbus client. A poll cycle requests all targets with
+:meth:`AsyncStiebelEltronAPI.update`, limited by:
+
+* a global concurrency limit (number of polls in flight),
+* a per-host rate limit (minimum time between two polls of one host),
+* a random start offset (jitter) so the polls of a cycle are spread out,
+* a per-device exponential backoff after a device stopped answering, so a
+  dead slave does not hold back the other slaves behind its gateway.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import namedtuple
+
+from pymodbus.client import AsyncModbusTcpClient
+from pymodbus.exceptions import ModbusException
+
+from .async_api import AsyncStiebelEltronAPI
+
+_LOGGER = logging.getLogger(__name__)
+
+FleetTarget = namedtuple('FleetTarget', ['host', 'port', 'slave'])
+
+CycleReport = namedtuple(
+    'CycleReport', ['cycle', 'duration', 'polled', 'failed', 'skipped'])
+
+
+class DeviceStats():
+    """Poll statistics of a single target."""
+
+    __slots__ = ('polls', 'failures', 'skipped', 'last_latency',
+                 'max_latency', 'total_latency', 'last_success')
+
+    def __init__(self):
+        """Initialize empty statistics."""
+        self.polls = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_latency = None
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+        self.last_success = None
+
+    @property
+    def mean_latency(self):
+        """Return the mean poll latency in seconds or None."""
+        if not self.polls:
+            return None
+        return self.total_latency / self.polls
+
+    def record(self, success: bool, latency: float):
+        """Record the outcome of one poll."""
+        self.polls += 1
+        self.last_latency = latency
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        if success:
+            self.last_success = time.time()
+        else:
+            self.failures += 1
+
+
+class _HostState():
+    """Rate limit of one host and backoff of its slaves."""
+
+    def __init__(self):
+        self.lock = None
+        self.last_request = float('-inf')
+        # slave: (consecutive failures, monotonic time the backoff ends)
+        self.backoff = {}
+
+    async def throttle(self, min_interval: float):
+        """Wait until the host may be polled again."""
+        if min_interval <= 0:
+            return
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            wait = self.last_request + min_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.last_request = time.monotonic()
+
+    def backing_off(self, slave: int) -> bool:
+        """Return whether polls of a slave are skipped."""
+        _, until = self.backoff.get(slave, (0, float('-inf')))
+        return until > time.monotonic()
+
+    def record(self, slave: int, success: bool, backoff_base: float,
+               backoff_max: float):
+        """Update the backoff of a slave after a poll."""
+        if success:
+            self.backoff.pop(slave, None)
+            return
+        failures, _ = self.backoff.get(slave, (0, None))
+        failures += 1
+        backoff = min(backoff_max, backoff_base * 2 ** (failures - 1))
+        self.backoff[slave] = (failures, time.monotonic() + backoff)
+
+
+def _default_client_factory(host: str, port: int):
+    """Create an asyncio Modbus TCP client."""
+    return AsyncModbusTcpClient(host, port=port, timeout=2)
+
+
+class FleetPoller():
+    """Poll many ISG gateways with bounded concurrency."""
+
+    # The limits of the poller are independent keyword options
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+
+    def __init__(self, targets, *, interval=60.0, max_concurrency=50,
+                 host_min_interval=0.0, jitter=0.1, backoff_base=5.0,
+                 backoff_max=600.0, client_factory=None, on_poll=None):
+        """Initialize the poller.
+
+        Args:
+            targets: Iterable of (host, port, slave) tuples.
+            interval: Time between the starts of two poll cycles in seconds.
+            max_concurrency: Maximum number of polls in flight.
+            host_min_interval: Minimum time between two polls of one host.
+            jitter: Polls start at a random offset within this fraction of
+                the interval.
+            backoff_base: First backoff of a target after a failed poll.
+            backoff_max: Upper bound of the backoff of a target.
+            client_factory: Callable (host, port) returning an asyncio
+                pymodbus client.
+            on_poll: Callable (target, api, success) run after every poll.
+        """
+        self._targets = [FleetTarget(*target) for target in targets]
+        self._interval = interval
+        self._max_concurrency = max_concurrency
+        self._host_min_interval = host_min_interval
+        self._jitter = jitter
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+        self._client_factory = client_factory or _default_client_factory
+        self._on_poll = on_poll
+        self._semaphore = None
+        self._clients = {}
+        self._apis = {}
+        self._hosts = {target.host: _HostState() for target in self._targets}
+        self.stats = {target: DeviceStats() for target in self._targets}
+        self.cycles = 0
+        self.last_cycle = None
+
+    @property
+    def targets(self):
+        """Return the polled targets."""
+        return list(self._targets)
+
+    def add_targets(self, targets):
+        """Poll further targets from the next cycle on."""
+        for target in targets:
+            target = FleetTarget(*target)
+            if target in self.stats:
+                continue
+            self._targets.append(target)
+            self._hosts.setdefault(target.host, _HostState())
+            self.stats[target] = DeviceStats()
+
+    def api(self, target) -> AsyncStiebelEltronAPI:
+        """Return the API instance of a target."""
+        target = FleetTarget(*target)
+        api = self._apis.get(target)
+        if api is None:
+            key = (target.host, target.port)
+            client = self._clients.get(key)
+            if client is None:
+                client = self._client_factory(target.host, target.port)
+                self._clients[key] = client
+            api = AsyncStiebelEltronAPI(client, target.slave)
+            self._apis[target] = api
+        return api
+
+    async def _poll_target(self, target: FleetTarget):
+        """Poll one target, returns True, False or None if skipped."""
+        host = self._hosts[target.host]
+        stats = self.stats[target]
+        if host.backing_off(target.slave):
+            stats.skipped += 1
+            return None
+
+        if self._jitter > 0:
+            await asyncio.sleep(
+                random.uniform(0, self._jitter * self._interval))
+
+        api = self.api(target)
+        async with self._semaphore:
+            # Throttled once the request can be sent, so a wait for the
+            # semaphore does not eat up the interval
+            await host.throttle(self._host_min_interval)
+            start = time.monotonic()
+            try:
+                if not api.connected and not await api.connect():
+                    success = False
+                else:
+                    success = await api.update()
+            except (ModbusException, OSError, asyncio.TimeoutError) as exc:
+                _LOGGER.debug("Poll of %s failed: %s", target, exc)
+                success = False
+            latency = time.monotonic() - start
+
+        stats.record(success, latency)
+        host.record(target.slave, success, self._backoff_base,
+                    self._backoff_max)
+        if self._on_poll is not None:
+            self._on_poll(target, api, success)
+        return success
+
+    async def poll_cycle(self) -> CycleReport:
+        """Poll every target once and return the cycle report."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        start = time.monotonic()
+        results = await asyncio.gather(
+            *(self._poll_target(target) for target in self._targets))
+        self.cycles += 1
+        self.last_cycle = CycleReport(
+            cycle=self.cycles,
+            duration=time.monotonic() - start,
+            polled=sum(1 for result in results if result is not None),
+            failed=sum(1 for result in results if result is False),
+            skipped=sum(1 for result in results if result is None))
+        _LOGGER.debug("Poll cycle finished: %s", self.last_cycle)
+        return self.last_cycle
+
+    async def run(self, cycles=None):
+        """Run poll cycles every interval, forever or `cycles` times."""
+        count = 0
+        while cycles is None or count < cycles:
+            start = time.monotonic()
+            await self.poll_cycle()
+            count += 1
+            if cycles is None or count < cycles:
+                await asyncio.sleep(
+                    max(0.0, start + self._interval - time.monotonic()))
+
+    def close(self):
+        """Close all client connections."""
+        for client in self._clients.values():
+            client.close()
+        self._clients.clear()
+        self._apis.clear()
@@ -0,0 +1,326 @@
+"""
+HTTP/JSON gateway sharing one connection to the ISG.
+
+Services polling the same ISG over Modbus each open their own connection,
+which overloads the gateway. :class:`Gateway` owns the only connection and
+serves the decoded values over HTTP instead:
+
+``GET /snapshot``
+    Decoded values of all registers and the time of the poll. The device
+    is polled at most every ``max_age`` seconds, other requests get the
+    cached snapshot or wait for the poll in flight. The ETag is a digest of
+    the raw register words, a request with a matching ``If-None-Match``
+    header gets 304 without body.
+
+``POST /target_temp`` with ``{"temperature": 21.5}``
+``POST /operation`` with ``{"mode": "AUTOMATIC"}``
+    Write the value, read it back and return the register read.
+
+A synchronous :class:`StiebelEltronAPI` is called from a single worker
+thread, so its requests never overlap on the Modbus client. Concurrent GETs
+queue behind the refresh in flight and find its values fresh.
+
+Run ``python -m pystiebeleltron.gateway ISG_HOST`` to start it.
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import functools
+import hashlib
+import json
+import logging
+
+from pymodbus.client import AsyncModbusTcpClient
+
+from .async_api import AsyncStiebelEltronAPI
+
+_LOGGER = logging.getLogger(__name__)
+
+MAX_HEADER_LINES = 100
+MAX_BODY = 64 * 1024
+IDLE_TIMEOUT = 60.0
+
+_REASONS = {
+    200: 'OK',
+    304: 'Not Modified',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    502: 'Bad Gateway',
+    503: 'Service Unavailable',
+}
+
+_TARGET_TEMP = 'ROOM_TEMP_HEAT_DAY_HC1'
+_OPERATION = 'OPERATING_MODE'
+
+
+class HttpError(Exception):
+    """Request answered with an error status."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def snapshot_etag(snapshot) -> str:
+    """Return the ETag of the raw words of a snapshot."""
+    digest = hashlib.blake2b(snapshot.words.tobytes(), digest_size=8)
+    return f'"{digest.hexdigest()}"'
+
+
+class Gateway():
+    """HTTP server for one StiebelEltronAPI."""
+
+    def __init__(self, api, host='127.0.0.1', port=8080, max_age=10.0):
+        """Initialize the gateway.
+
+        Args:
+            api: :class:`pystiebeleltron.async_api.AsyncStiebelEltronAPI`,
+                or a StiebelEltronAPI whose calls are run one at a time in
+                a worker thread.
+            host: Address to listen on.
+            port: Port to listen on, 0 picks a free port.
+            max_age: Seconds a snapshot is served before the device is
+                polled again.
+        """
+        self._api = api
+        self._address = (host, port)
+        self._max_age = max_age
+        self._server = None
+        self._executor = None
+        self._write_lock = None
+        self._body = (None, None, None)
+
+    @property
+    def port(self) -> int:
+        """Return the port listened on."""
+        if self._server is None:
+            return self._address[1]
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self):
+        """Start listening."""
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            1, thread_name_prefix='gateway')
+        self._write_lock = asyncio.Lock()
+        self._server = await asyncio.start_server(
+            self._handle, *self._address)
+        _LOGGER.info("Gateway listening on %s:%d", self._address[0],
+                     self.port)
+
+    async def close(self):
+        """Stop listening."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def serve_forever(self):
+        """Start listening and serve until cancelled."""
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        await self.close()
+
+    async def _call(self, method, *args, **kwargs):
+        """Await a method of the API, or run it in the worker thread."""
+        if asyncio.iscoroutinefunction(method):
+            return await method(*args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(method, *args, **kwargs))
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(
+                        self._read_request(reader), IDLE_TIMEOUT)
+                except HttpError as exc:
+                    await self._respond(writer, exc.status,
+                                        {'error': str(exc)}, keep_alive=False)
+                    return
+                if request is None:
+                    return
+                method, path, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                try:
+                    status, payload, extra = await self._dispatch(
+                        method, path, headers, body)
+                except HttpError as exc:
+                    status, payload, extra = exc.status, {
+                        'error': str(exc)}, {}
+                await self._respond(writer, status, payload, extra,
+                                    keep_alive)
+                if not keep_alive:
+                    return
+        except (asyncio.TimeoutError, ConnectionError,
+                asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        """Return (method, path, headers, body) or None at end of stream."""
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, path, version = line.decode('latin-1').split()
+        except ValueError as exc:
+            raise HttpError(400, "Invalid request line") from exc
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise HttpError(400, "Too many headers")
+        if version == 'HTTP/1.0' and 'connection' not in headers:
+            headers['connection'] = 'close'
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError as exc:
+            raise HttpError(400, "Invalid Content-Length") from exc
+        if length > MAX_BODY:
+            raise HttpError(413, "Body too large")
+        body = await reader.readexactly(length) if length > 0 else b''
+        return method, path.split('?', 1)[0], headers, body
+
+    async def _respond(self, writer, status, payload, extra=None,
+                       keep_alive=True):
+        if isinstance(payload, bytes) or payload is None:
+            body = payload or b''
+        else:
+            body = json.dumps(payload).encode()
+        connection = 'keep-alive' if keep_alive else 'close'
+        lines = [f'HTTP/1.1 {status} {_REASONS[status]}',
+                 f'Content-Length: {len(body)}',
+                 f'Connection: {connection}']
+        if body:
+            lines.append('Content-Type: application/json')
+        lines.extend(f'{name}: {value}'
+                     for name, value in (extra or {}).items())
+        writer.write('\r\n'.join(lines).encode('latin-1') + b'\r\n\r\n' +
+                     body)
+        await writer.drain()
+
+    async def _dispatch(self, method, path, headers, body):
+        """Return (status, payload, extra headers) of a request."""
+        routes = {
+            '/snapshot': ('GET', self._get_snapshot),
+            '/target_temp': ('POST', self._post_target_temp),
+            '/operation': ('POST', self._post_operation),
+        }
+        if path not in routes:
+            raise HttpError(404, f"Unknown path {path}")
+        allowed, handler = routes[path]
+        if method != allowed:
+            raise HttpError(405, f"Use {allowed}")
+        if method == 'POST':
+            try:
+                data = json.loads(body)
+            except ValueError as exc:
+                raise HttpError(400, "Invalid JSON body") from exc
+            if not isinstance(data, dict):
+                raise HttpError(400, "Expected a JSON object")
+            return await handler(data)
+        return await handler(headers)
+
+    async def _get_snapshot(self, headers):
+        await self._call(self._api.refresh, self._max_age)
+        snapshot = self._api.snapshot
+        if snapshot.timestamp is None:
+            raise HttpError(503, "No values read from the device yet")
+
+        cached, etag, body = self._body
+        if cached is not snapshot:
+            etag = snapshot_etag(snapshot)
+            body = json.dumps({
+                'timestamp': snapshot.timestamp,
+                'values': self._api.get_all_converted(),
+            }).encode()
+            self._body = (snapshot, etag, body)
+        extra = {'ETag': etag}
+        if etag in (tag.strip() for tag in
+                    headers.get('if-none-match', '').split(',')):
+            return 304, None, extra
+        return 200, body, extra
+
+    async def _write(self, method, value, register):
+        """Write a value, read it back and return its payload."""
+        async with self._write_lock:
+            try:
+                confirmed = await self._call(method, value, confirm=True)
+            except ValueError as exc:
+                raise HttpError(400, str(exc)) from exc
+            if not confirmed:
+                raise HttpError(502, "Write not confirmed")
+        return 200, {register: self._api.get_conv_val(register)}, {}
+
+    async def _post_target_temp(self, data):
+        temp = data.get('temperature')
+        if isinstance(temp, bool) or not isinstance(temp, (int, float)):
+            raise HttpError(400, "Expected a number as temperature")
+        return await self._write(self._api.set_target_temp, temp,
+                                 _TARGET_TEMP)
+
+    async def _post_operation(self, data):
+        mode = data.get('mode')
+        if self._api.model.value(_OPERATION, mode) is None:
+            raise HttpError(400, f"Unknown operation mode {mode!r}")
+        status, payload, extra = await self._write(
+            self._api.set_operation, mode, _OPERATION)
+        payload[_OPERATION] = self._api.model.label(
+            _OPERATION, payload[_OPERATION], 'UNKNOWN')
+        return status, payload, extra
+
+
+def main(argv=None):
+    """Serve a heat pump over HTTP."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('isg', help="Host of the ISG")
+    parser.add_argument('--modbus-port', type=int, default=502)
+    parser.add_argument('--slave', type=int, default=1)
+    parser.add_argument('--host', default='127.0.0.1',
+                        help="Address to listen on")
+    parser.add_argument('--port', type=int, default=8080,
+                        help="Port to listen on")
+    parser.add_argument('--max-age', type=float, default=10.0,
+                        help="Seconds between polls of the device")
+    args = parser.parse_args(argv)
+
+    async def serve():
+        client = AsyncModbusTcpClient(args.isg, port=args.modbus_port,
+                                      timeout=2)
+        await client.connect()
+        api = AsyncStiebelEltronAPI(client, args.slave)
+        try:
+            await Gateway(api, args.host, args.port,
+                          args.max_age).serve_forever()
+        finally:
+            client.close()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+"""
+Instrumentation of Modbus requests, updates and decoding.
+
+Pass a :class:`MetricsHook` to :class:`StiebelEltronAPI` to observe every
+request: operation, register block, latency, bytes on the wire (Modbus TCP
+framing) and errors. :class:`Metrics` collects latency histograms and
+counters, :func:`render_prometheus` exports them in the Prometheus text
+format. Without a hook the API does not wrap its connection, so there is
+no overhead.
+"""
+
+import asyncio
+import socket
+import time
+from bisect import bisect_left
+from collections import namedtuple
+
+from pymodbus.exceptions import ModbusIOException
+
+from .connection import AsyncConnectionWrapper, ConnectionWrapper
+
+# Modbus TCP frame sizes: 7 bytes MBAP header + PDU
+READ_REQUEST_BYTES = 12
+WRITE_REQUEST_BYTES = 12
+WRITE_MULTIPLE_REQUEST_BYTES = 13
+EXCEPTION_RESPONSE_BYTES = 9
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+
+TIMEOUT = 'timeout'
+EXCEPTION = 'exception'
+ERROR_RESPONSE = 'error_response'
+
+# Observation of a Modbus request:
+#   operation: Name of the client method, e.g. 'write_registers'.
+#   block: Register block ('B1', 'B2', 'B3') or None.
+#   duration: Latency in seconds.
+#   sent: Bytes sent.
+#   received: Bytes received.
+#   error: None, TIMEOUT, EXCEPTION or ERROR_RESPONSE.
+RequestObservation = namedtuple('RequestObservation', [
+    'operation', 'block', 'duration', 'sent', 'received', 'error'])
+
+
+class MetricsHook():
+    """Interface of instrumentation hooks, all methods do nothing."""
+
+    def observe_request(self, request: RequestObservation):
+        """Observe a Modbus request."""
+
+    def observe_duration(self, operation, duration):
+        """Observe the duration of an API operation like 'update'."""
+
+
+class Histogram():
+    """Cumulative latency histogram."""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """Initialize an empty histogram."""
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        """Add a value."""
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Return (upper bound, cumulative count) tuples incl. +Inf."""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        result.append((float('inf'), self.count))
+        return result
+
+
+class Metrics(MetricsHook):
+    """Collect latency histograms and counters."""
+
+    def __init__(self, labels=None, buckets=DEFAULT_BUCKETS):
+        """Initialize the collector.
+
+        Args:
+            labels: Dict of constant labels, e.g. host and slave.
+            buckets: Upper bounds of the histogram buckets in seconds.
+        """
+        self.labels = dict(labels or {})
+        self._buckets = buckets
+        # (operation, block) -> Histogram
+        self.requests = {}
+        # (operation, block, error) -> count
+        self.errors = {}
+        # (operation, block) -> bytes
+        self.bytes_sent = {}
+        self.bytes_received = {}
+        # operation -> Histogram
+        self.durations = {}
+
+    def observe_request(self, request: RequestObservation):
+        key = (request.operation, request.block)
+        histogram = self.requests.get(key)
+        if histogram is None:
+            histogram = self.requests[key] = Histogram(self._buckets)
+        histogram.observe(request.duration)
+        self.bytes_sent[key] = self.bytes_sent.get(key, 0) + request.sent
+        self.bytes_received[key] = (self.bytes_received.get(key, 0) +
+                                    request.received)
+        if request.error is not None:
+            key = (request.operation, request.block, request.error)
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+    def observe_duration(self, operation, duration):
+        histogram = self.durations.get(operation)
+        if histogram is None:
+            histogram = self.durations[operation] = Histogram(self._buckets)
+        histogram.observe(duration)
+
+
+def _request_bytes(operation: str, kwargs) -> int:
+    if operation == 'write_registers':
+        return WRITE_MULTIPLE_REQUEST_BYTES + 2 * len(kwargs['values'])
+    if operation == 'write_register':
+        return WRITE_REQUEST_BYTES
+    return READ_REQUEST_BYTES
+
+
+def _is_error(response) -> bool:
+    is_error = getattr(response, 'isError', None)
+    return is_error is not None and is_error()
+
+
+def _response_bytes(operation: str, kwargs, response) -> int:
+    if _is_error(response):
+        return EXCEPTION_RESPONSE_BYTES
+    if operation.startswith('read'):
+        return 9 + 2 * kwargs['count']
+    return 12
+
+
+def _classify(exc: Exception) -> str:
+    if isinstance(exc, (ModbusIOException, asyncio.TimeoutError,
+                        socket.timeout)):
+        return TIMEOUT
+    return EXCEPTION
+
+
+class _Instrumentation():
+    """Report the requests of a wrapped client to a hook."""
+
+    def __init__(self, client, hook: MetricsHook, layout):
+        """Initialize the wrapper.
+
+        Args:
+            client: pymodbus client or resilient connection.
+            hook: Receives the observations.
+            layout: Register layout naming the blocks.
+        """
+        self._client = client
+        self._hook = hook
+        self._blocks = tuple(
+            (f'B{i + 1}', start, start + count)
+            for i, (start, _, count) in enumerate(layout.blocks))
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    @property
+    def connected(self) -> bool:
+        """Return whether the client is connected."""
+        return bool(self._client.connected)
+
+    def close(self):
+        """Close the client."""
+        self._client.close()
+
+    def _block(self, address: int):
+        for name, first, end in self._blocks:
+            if first <= address < end:
+                return name
+        return None
+
+    def _observe(self, operation, kwargs, start, response=None, exc=None):
+        duration = time.perf_counter() - start
+        sent = _request_bytes(operation, kwargs)
+        block = self._block(kwargs['address'])
+        if exc is not None:
+            received, error = 0, _classify(exc)
+        elif isinstance(response, ModbusIOException):
+            received, error = 0, TIMEOUT
+        else:
+            received = _response_bytes(operation, kwargs, response)
+            error = ERROR_RESPONSE if _is_error(response) else None
+        self._hook.observe_request(RequestObservation(
+            operation, block, duration, sent, received, error))
+
+
+class InstrumentedConnection(_Instrumentation, ConnectionWrapper):
+    """Wrapper of a pymodbus client reporting every request to a hook."""
+
+    def _request(self, method, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = getattr(self._client, method)(**kwargs)
+        except Exception as exc:
+            self._observe(method, kwargs, start, exc=exc)
+            raise
+        self._observe(method, kwargs, start, response)
+        return response
+
+
+class AsyncInstrumentedConnection(_Instrumentation, AsyncConnectionWrapper):
+    """Instrumented wrapper of an asyncio pymodbus client."""
+
+    async def _request(self, method, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await getattr(self._client, method)(**kwargs)
+        except Exception as exc:
+            self._observe(method, kwargs, start, exc=exc)
+            raise
+        self._observe(method, kwargs, start, response)
+        return response
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels.items()) + '}'
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _render_histogram(lines, name, labels, histogram):
+    for bound, count in histogram.cumulative():
+        bucket = _format_labels(dict(labels, le=_format_value(bound)))
+        lines.append(f'{name}_bucket{bucket} {count}')
+    lines.append(f'{name}_sum{_format_labels(labels)} {histogram.sum!r}')
+    lines.append(f'{name}_count{_format_labels(labels)} {histogram.count}')
+
+
+def render_prometheus(*collectors, prefix='stiebeleltron') -> str:
+    """Render collected metrics in the Prometheus text exposition format.
+
+    Args:
+        collectors: :class:`Metrics` instances, e.g. one per device.
+        prefix: Prefix of the metric names.
+    """
+    lines = []
+
+    name = prefix + '_request_duration_seconds'
+    lines.append(f'# HELP {name} Latency of Modbus requests.')
+    lines.append(f'# TYPE {name} histogram')
+    for metrics in collectors:
+        for (operation, block), histogram in sorted(
+                metrics.requests.items(), key=lambda item: str(item[0])):
+            labels = dict(metrics.labels, operation=operation,
+                          block=block or '')
+            _render_histogram(lines, name, labels, histogram)
+
+    name = prefix + '_request_errors_total'
+    lines.append(f'# HELP {name} Failed Modbus requests.')
+    lines.append(f'# TYPE {name} counter')
+    for metrics in collectors:
+        for (operation, block, error), count in sorted(
+                metrics.errors.items(), key=lambda item: str(item[0])):
+            labels = dict(metrics.labels, operation=operation,
+                          block=block or '', type=error)
+            lines.append(f'{name}{_format_labels(labels)} {count}')
+
+    for suffix, attribute, text in (
+            ('_sent_bytes_total', 'bytes_sent', 'Bytes sent to the ISG.'),
+            ('_received_bytes_total', 'bytes_received',
+             'Bytes received from the ISG.')):
+        name = prefix + suffix
+        lines.append(f'# HELP {name} {text}')
+        lines.append(f'# TYPE {name} counter')
+        for metrics in collectors:
+            for (operation, block), count in sorted(
+                    getattr(metrics, attribute).items(),
+                    key=lambda item: str(item[0])):
+                labels = dict(metrics.labels, operation=operation,
+                              block=block or '')
+                lines.append(f'{name}{_format_labels(labels)} {count}')
+
+    name = prefix + '_operation_duration_seconds'
+    lines.append(f'# HELP {name} Duration of API operations.')
+    lines.append(f'# TYPE {name} histogram')
+    for metrics in collectors:
+        for operation, histogram in sorted(metrics.durations.items()):
+            labels = dict(metrics.labels, operation=operation)
+            _render_histogram(lines, name, labels, histogram)
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,170 @@
+"""
+Read planning and per-group poll scheduling.
+
+:class:`ReadPlanner` merges a set of wanted registers into the fewest
+contiguous Modbus reads. Gaps of unwanted registers up to ``max_gap`` words
+are read along, since an extra word is much cheaper than an extra request
+to the ISG.
+
+:class:`PollSchedule` polls groups of registers at their own intervals,
+e.g. status bits every few seconds and setpoints every few minutes. A group
+with a ``max_interval`` adapts: its interval doubles while its values stay
+unchanged and drops back to ``interval`` as soon as one changes.
+"""
+
+import time
+from collections import namedtuple
+
+# Modbus limit of registers per read request
+MAX_READ_COUNT = 125
+
+ReadRequest = namedtuple(
+    'ReadRequest', ['table', 'address', 'count', 'offset'])
+ReadRequest.__doc__ = """Contiguous read of `count` registers of a table.
+
+`offset` is the position of the first word in the snapshot."""
+
+
+class ReadPlanner():
+    """Merge wanted registers into contiguous reads."""
+
+    def __init__(self, layout, max_gap=8, max_count=MAX_READ_COUNT):
+        """Initialize the planner.
+
+        Args:
+            layout: :class:`pystiebeleltron.snapshot.RegisterLayout`.
+            max_gap: Maximum number of unwanted words read to join two reads.
+            max_count: Maximum number of registers per read.
+        """
+        self._layout = layout
+        self._max_gap = max_gap
+        self._max_count = max_count
+        self._cache = {}
+
+    def plan(self, names) -> tuple:
+        """Return the reads covering the given registers.
+
+        Raises:
+            KeyError: If a name is not part of the layout.
+        """
+        key = frozenset(names)
+        reads = self._cache.get(key)
+        if reads is None:
+            reads = self._plan(key)
+            self._cache[key] = reads
+        return reads
+
+    def plan_all(self) -> tuple:
+        """Return the reads covering every register of the layout."""
+        return self.plan(self._layout.index)
+
+    def _plan(self, names) -> tuple:
+        layout = self._layout
+        offsets = sorted(layout.offset(name) for name in names)
+        reads = []
+        block = 0
+        current = None
+        for offset in offsets:
+            while offset >= layout.blocks[block][1] + layout.blocks[block][2]:
+                block += 1
+            if current is not None:
+                first, last, current_block = current
+                if (current_block == block and
+                        offset - last - 1 <= self._max_gap and
+                        offset - first < self._max_count):
+                    current = (first, offset, block)
+                    continue
+                reads.append(self._request(first, last, current_block))
+            current = (offset, offset, block)
+        if current is not None:
+            reads.append(self._request(*current))
+        return tuple(reads)
+
+    def _request(self, first, last, block) -> ReadRequest:
+        start, block_offset, _ = self._layout.blocks[block]
+        return ReadRequest(
+            table=self._layout.tables[block],
+            address=start + first - block_offset,
+            count=last - first + 1,
+            offset=first)
+
+
+class PollGroup():
+    """Registers polled at a common interval."""
+
+    __slots__ = ('name', 'registers', 'interval', 'min_interval',
+                 'max_interval', 'next_due')
+
+    def __init__(self, name, registers, interval, max_interval=None):
+        """Initialize the group.
+
+        Args:
+            name: Name of the group.
+            registers: Names of the registers of the group.
+            interval: Poll interval in seconds.
+            max_interval: Upper bound of the adaptive interval, None keeps
+                the interval fixed.
+        """
+        self.name = name
+        self.registers = tuple(registers)
+        self.interval = interval
+        self.min_interval = interval
+        self.max_interval = max_interval
+        self.next_due = float('-inf')
+
+    def is_due(self, now: float) -> bool:
+        """Return whether the group is due for polling."""
+        return self.next_due <= now
+
+    def polled(self, now: float, changed: bool):
+        """Schedule the next poll."""
+        if self.max_interval is not None:
+            if changed:
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.interval * 2, self.max_interval)
+        self.next_due = now + self.interval
+
+
+class PollSchedule():
+    """Poll groups of registers at their own intervals."""
+
+    def __init__(self, groups):
+        """Initialize the schedule.
+
+        Args:
+            groups: Iterable of :class:`PollGroup`.
+        """
+        self.groups = {group.name: group for group in groups}
+
+    def due(self, now=None) -> list:
+        """Return the groups due for polling."""
+        if now is None:
+            now = time.monotonic()
+        return [group for group in self.groups.values()
+                if group.is_due(now)]
+
+    def registers(self, groups) -> set:
+        """Return the registers of the given groups."""
+        return {name for group in groups for name in group.registers}
+
+    def polled(self, groups, changed, now=None):
+        """Schedule the next poll of groups after a successful poll.
+
+        Args:
+            groups: The polled groups.
+            changed: Names of the registers whose values changed.
+            now: Time of the poll.
+        """
+        if now is None:
+            now = time.monotonic()
+        changed = set(changed)
+        for group in groups:
+            group.polled(now, not changed.isdisjoint(group.registers))
+
+    def next_due(self, now=None) -> float:
+        """Return the seconds until the next group is due."""
+        if now is None:
+            now = time.monotonic()
+        return max(0.0, min(group.next_due for group in self.groups.values())
+                   - now)
@@ -17,7 +17,27 @@ type | range      | for reading | for writing |        | size 1 | size 5
 8    | 0 to 255   | 1           | 1           | No     | 1      | 5
 """
 
-from pymodbus.client.mixin import ModbusClientMixin
+import contextlib
+import logging
+import threading
+import time
+from collections import namedtuple
+from typing import TYPE_CHECKING
+
+from .decoder import encode_value
+from .planner import PollGroup, PollSchedule
+from .registers import RegisterModel, load_model
+from .subscription import SubscriptionManager
+from .snapshot import (
+    RegisterSnapshot, INPUT_REGISTERS, HOLDING_REGISTERS, load_snapshot,
+    save_snapshot)
+
+if TYPE_CHECKING:
+    from pymodbus.client.mixin import ModbusClientMixin
+    from .metrics import MetricsHook
+    from .status import DeviceStatus
+
+_LOGGER = logging.getLogger(__name__)
 
 # Error - sensor lead is missing or disconnected.
 ERROR_NOTAVAILABLE = -60
@@ -174,50 +194,375 @@ B3_BUS_STATUS = {
     'PHYSICAL-ERROR': -4
 }
 
+CacheStats = namedtuple('CacheStats', ['hits', 'misses'])
 
-class StiebelEltronAPI():
-    """Stiebel Eltron API."""
+# Poll result of a stream, missed counts the ticks without a sample before
+Sample = namedtuple('Sample', ['timestamp', 'values', 'snapshot', 'missed'])
+
+# Correct spellings of misspelled register names
+REGISTER_ALIASES = {
+    'MANUAL_SET_TEMP_HC2': 'MANUAL_SET_TEAMP_HC2',
+    'DEW_POINT_TEMPERATURE_HC1': 'DEW_POINT_TEMPERATUR_HC1',
+    'DEW_POINT_TEMPERATURE_HC2': 'DEW_POINT_TEMPERATUR_HC2',
+}
+
+# Register map of the blocks above, see load_model() for other models
+REGISTER_MODEL = RegisterModel(
+    'builtin',
+    ((B1_START_ADDR, B1_REGMAP_INPUT, INPUT_REGISTERS),
+     (B2_START_ADDR, B2_REGMAP_HOLDING, HOLDING_REGISTERS),
+     (B3_START_ADDR, B3_REGMAP_INPUT, INPUT_REGISTERS)),
+    enums={'OPERATING_MODE': B2_OPERATING_MODE_READ},
+    bitmasks={'OPERATING_STATUS': B3_OPERATING_STATUS},
+    aliases=REGISTER_ALIASES,
+    error_values=(ERROR_NOTAVAILABLE, ERROR_SHORTCUT),
+    unavailable=UNAVAILABLE_OBJECT)
+
+# Flat layout of the raw words of all three blocks
+REGISTER_LAYOUT = REGISTER_MODEL.layout
+
+# Decoders of all registers, compiled once
+DECODER_TABLE = REGISTER_MODEL.decoders
+
+# Planner of partial reads
+READ_PLANNER = REGISTER_MODEL.planner
+
+
+def next_deadline(deadline: float, interval: float, now: float):
+    """Return the next tick of a fixed rate schedule after `now`.
+
+    Ticks stay on the grid deadline + k * interval, so a slow poll does not
+    delay the later ones. Ticks in the past are skipped.
+
+    Returns:
+        Tuple of the next deadline and the number of skipped ticks.
+    """
+    deadline += interval
+    if now < deadline:
+        return deadline, 0
+    skipped = int((now - deadline) // interval) + 1
+    return deadline + skipped * interval, skipped
+
+
+def default_poll_schedule() -> PollSchedule:
+    """Return a schedule polling status often and settings rarely."""
+    return PollSchedule((
+        PollGroup('status', B3_REGMAP_INPUT, 10),
+        PollGroup('sensors', B1_REGMAP_INPUT, 60, max_interval=300),
+        PollGroup('settings', B2_REGMAP_HOLDING, 300)))
+
+
+class BaseStiebelEltronAPI():
+    """State and decoding shared by the synchronous and asyncio APIs.
+
+    Subclasses send the requests: :class:`StiebelEltronAPI` on a synchronous
+    client, :class:`pystiebeleltron.async_api.AsyncStiebelEltronAPI` on an
+    asyncio client.
+    """
+
+    # Decoding, caching, snapshot file and subscription state of a device
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+
+    def __init__(self, conn, slave=1, update_on_read=False, *,
+                 max_age=None, metrics: 'MetricsHook' = None, model=None,
+                 snapshot_file=None, snapshot_interval=300.0):
+        """Initialize Stiebel Eltron communication.
 
-    def __init__(self, conn: ModbusClientMixin, slave=1, update_on_read=False):
-        """Initialize Stiebel Eltron communication."""
+        Args:
+            conn: Modbus client, a synchronous one for StiebelEltronAPI,
+                an asyncio one for AsyncStiebelEltronAPI.
+            slave: Modbus slave id of the ISG.
+            update_on_read: Update the values on every getter call.
+            max_age: Getters update the values only when the last update is
+                older than this many seconds. Implies update_on_read.
+            metrics: Hook observing requests, updates and decoding.
+            model: :class:`pystiebeleltron.registers.RegisterModel` or name
+                of a bundled model file, None for the blocks of this module.
+            snapshot_file: Path of a file keeping the last snapshot. It is
+                loaded here and marked stale until the first update.
+            snapshot_interval: Minimum seconds between two writes of the
+                snapshot file. It is written after full updates and by
+                :meth:`close`.
+        """
+        if model is None:
+            model = REGISTER_MODEL
+        elif isinstance(model, str):
+            model = load_model(model)
+        self._model = model
+        # pymodbus is loaded with the first API instead of this module, so
+        # the register maps, decoders and snapshots import without it
+        # pylint: disable=import-outside-toplevel
+        from pymodbus.exceptions import ModbusException
+        from .connection import COMMUNICATION_ERRORS
+        self._communication_errors = COMMUNICATION_ERRORS
+        self._invalid_response = ModbusException
+        self._metrics = metrics
+        if metrics is not None:
+            conn = self._instrument(conn, metrics)
+        self._lock = contextlib.nullcontext()
         self._conn = conn
-        self._block_1_input_regs = B1_REGMAP_INPUT
-        self._block_2_holding_regs = B2_REGMAP_HOLDING
-        self._block_3_input_regs = B3_REGMAP_INPUT
         self._slave = slave
-        self._update_on_read = update_on_read
+        self._update_on_read = update_on_read or max_age is not None
+        if max_age is None and update_on_read:
+            max_age = 0
+        self._max_age = max_age
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._layout = model.layout
+        self._decoders = model.decoders
+        self._planner = model.planner
+        self._full_reads = self._planner.plan_all()
+        self._snapshot = RegisterSnapshot(self._layout, self._layout.defaults)
+        self._snapshot_file = snapshot_file
+        self._snapshot_interval = snapshot_interval
+        self._snapshot_saved = None
+        self._snapshot_dirty = False
+        self._stale = False
+        self._load_snapshot()
+        self._subscriptions = None
+        self.last_error = None
+
+    def _instrument(self, conn, metrics: 'MetricsHook'):
+        """Wrap the connection to report requests to the metrics hook."""
+        raise NotImplementedError
+
+    @property
+    def model(self):
+        """Return the register model of the device."""
+        return self._model
+
+    @property
+    def metrics(self):
+        """Return the metrics hook or None."""
+        return self._metrics
+
+    @property
+    def lock(self):
+        """Return the lock serializing the requests of several threads.
+
+        It is a :class:`pystiebeleltron.connection.PriorityLock` if the API
+        is thread safe, a null context otherwise.
+        """
+        return self._lock
 
-    def update(self):
-        """Request current values from heat pump."""
-        ret = True
+    @property
+    def connected(self) -> bool:
+        """Return whether the Modbus client is connected."""
+        return bool(self._conn.connected)
+
+    @property
+    def snapshot(self) -> RegisterSnapshot:
+        """Return the raw register words of the last update."""
+        return self._snapshot
+
+    @property
+    def stale(self) -> bool:
+        """Return whether the values were loaded from the snapshot file.
+
+        They stay stale until the first successful full update.
+        """
+        return self._stale
+
+    def _snapshot_identity(self) -> dict:
+        """Return the device identity stored in the snapshot file."""
+        return {'model': self._model.name, 'slave': self._slave}
+
+    def _load_snapshot(self):
+        """Start from the snapshot file, if there is a matching one."""
+        if self._snapshot_file is None:
+            return
+        snapshot = load_snapshot(self._snapshot_file, self._layout,
+                                 self._snapshot_identity())
+        if snapshot is not None:
+            self._snapshot = snapshot
+            self._stale = True
+
+    def _save_snapshot(self, force=False):
+        """Write a changed snapshot to the snapshot file, if there is one.
+
+        Args:
+            force: Write it even if the last write is more recent than the
+                snapshot interval.
+        """
+        if (self._snapshot_file is None or not self._snapshot_dirty or
+                self._snapshot.timestamp is None):
+            return
+        now = time.monotonic()
+        if (not force and self._snapshot_saved is not None and
+                now - self._snapshot_saved < self._snapshot_interval):
+            return
         try:
-            block_1_result_input = self._conn.read_input_registers(
-                slave=self._slave,
-                address=B1_START_ADDR,
-                count=len(self._block_1_input_regs)).registers
-            block_2_result_holding = self._conn.read_holding_registers(
-                slave=self._slave,
-                address=B2_START_ADDR,
-                count=len(self._block_2_holding_regs)).registers
-            block_3_result_input = self._conn.read_input_registers(
-                slave=self._slave,
-                address=B3_START_ADDR,
-                count=len(self._block_3_input_regs)).registers
-        except AttributeError:
-            # The unit does not reply reliably
-            ret = False
-            print("Modbus read failed")
+            save_snapshot(self._snapshot, self._snapshot_file,
+                          self._snapshot_identity())
+        except OSError as exc:
+            _LOGGER.warning("Cannot write snapshot file %s: %s",
+                            self._snapshot_file, exc)
+            return
+        self._snapshot_saved = now
+        self._snapshot_dirty = False
+
+    def close(self):
+        """Write the last snapshot to the snapshot file.
+
+        The Modbus client is owned by the caller and stays open.
+        """
+        self._save_snapshot(force=True)
+
+    @property
+    def snapshot_age(self):
+        """Return the age of the values in seconds or None."""
+        if self._snapshot.timestamp is None:
+            return None
+        return time.time() - self._snapshot.timestamp
+
+    @property
+    def cache_stats(self) -> CacheStats:
+        """Return how often getters used cached or updated values."""
+        return CacheStats(self._cache_hits, self._cache_misses)
+
+    def _needs_refresh(self, max_age=None) -> bool:
+        """Return whether the values are older than max_age seconds.
+
+        Args:
+            max_age: Overrides the max age of the instance.
+        """
+        if max_age is None:
+            max_age = self._max_age
+            if max_age is None:
+                return False
+        age = self.snapshot_age
+        if age is not None and age < max_age and not self._stale:
+            self._cache_hits += 1
+            return False
+        self._cache_misses += 1
+        return True
+
+    def request_failed(self, exc: Exception, action='read'):
+        """Record and log a failed request.
+
+        Helpers sending requests on the connection of the API, e.g. write
+        transactions, report their failures here.
+
+        Args:
+            exc: Exception raised by the request.
+            action: Kind of request for the log, 'read' or 'write'.
+        """
+        if isinstance(exc, AttributeError):
+            # Error response without registers
+            exc = self._invalid_response(f"Invalid response: {exc}")
+        self.last_error = exc
+        _LOGGER.warning("Modbus %s on slave %s failed: %s",
+                        action, self._slave, exc)
+
+    def _store_reads(self, results):
+        """Store the raw register words of a full update.
+
+        Args:
+            results: Iterable of (offset, registers) tuples of the reads.
+        """
+        start = time.perf_counter()
+        self._stale = False
+        self._set_snapshot(RegisterSnapshot.from_reads(self._layout, results))
+        self._save_snapshot()
+        if self._metrics is not None:
+            self._metrics.observe_duration('store',
+                                           time.perf_counter() - start)
+
+    def _holding_address(self, name: str) -> int:
+        """Return the address of a writable register.
+
+        Raises:
+            KeyError: If the register is unknown.
+            ValueError: If the register is not writable.
+        """
+        decoder = self._decoders.get(name)
+        if decoder is None:
+            raise KeyError(name)
+        if not self._model.writable(name):
+            raise ValueError(f"Register {name} is not writable")
+        return self._layout.locate(decoder.offset)[2]
+
+    def encode_write(self, name: str, value) -> tuple:
+        """Return the address, snapshot offset and raw word of a write.
+
+        Args:
+            name: Name of a writable register.
+            value: Converted value, e.g. a temperature in °C.
+
+        Raises:
+            KeyError: If the register is unknown.
+            ValueError: If the register is not writable or the value is out
+                of range.
+        """
+        address = self._holding_address(name)
+        decoder = self._decoders.get(name)
+        return address, decoder.offset, encode_value(value, decoder)
+
+    def _send_read(self, request):
+        """Send a planned read, returns the response or its awaitable."""
+        if request.table == HOLDING_REGISTERS:
+            read = self._conn.read_holding_registers
         else:
-            for v in self._block_1_input_regs.values():
-                v['value'] = block_1_result_input[v['addr'] - B1_START_ADDR]
+            read = self._conn.read_input_registers
+        return read(slave=self._slave, address=request.address,
+                    count=request.count)
 
-            for v in self._block_2_holding_regs.values():
-                v['value'] = block_2_result_holding[v['addr'] - B2_START_ADDR]
+    def _send_write(self, address: int, values):
+        """Send a write, returns the response or its awaitable."""
+        if len(values) == 1:
+            return self._conn.write_register(
+                slave=self._slave, address=address, value=values[0])
+        return self._conn.write_registers(
+            slave=self._slave, address=address, values=values)
 
-            for v in self._block_3_input_regs.values():
-                v['value'] = block_3_result_input[v['addr'] - B3_START_ADDR]
+    def patch_snapshot(self, results):
+        """Store the words of partial reads in the snapshot.
 
-        return ret
+        The snapshot keeps the timestamp of the last full update.
+
+        Args:
+            results: Iterable of (offset, registers) tuples of the reads.
+        """
+        self._set_snapshot(self._snapshot.patched(results))
+
+    def _set_snapshot(self, snapshot: RegisterSnapshot):
+        """Replace the snapshot and notify subscribers of changes.
+
+        Snapshots are immutable, so readers in other threads see either the
+        previous or the new one, never a mix.
+        """
+        previous = self._snapshot
+        self._snapshot = snapshot
+        self._snapshot_dirty = True
+        if self._subscriptions:
+            self._subscriptions.dispatch(previous, snapshot)
+
+    def subscribe(self, name: str, callback, deadband=None):
+        """Call a function whenever a value changes.
+
+        Args:
+            name: Register name or name of a bit of B3_OPERATING_STATUS.
+            callback: Callable receiving a
+                :class:`pystiebeleltron.subscription.Change`.
+            deadband: Minimum change of an analog value to be reported,
+                in converted units.
+
+        Returns:
+            Callable removing the subscription.
+        """
+        if self._subscriptions is None:
+            self._subscriptions = SubscriptionManager(
+                self._decoders, self._model.bitmasks)
+        return self._subscriptions.subscribe(name, callback, self._snapshot,
+                                             deadband)
+
+    def _sample(self, registers, missed: int) -> Sample:
+        """Return the decoded values of the last poll."""
+        if registers is None:
+            values = self.get_all_converted()
+        else:
+            values = {name: self.get_conv_val(name) for name in registers}
+        return Sample(time.time(), values, self._snapshot, missed)
 
     def get_conv_val(self, name: str):
         """Read and convert value.
@@ -226,22 +571,23 @@ class StiebelEltronAPI():
             name: Name of value to be read.
 
         Returns:
-            Actual value or None.
+            Actual value or None, if the name is unknown or the device
+            reports a sensor error or an unavailable object.
         """
-        value_entry = self._block_1_input_regs.get(name)
-        if value_entry is None:
-            value_entry = self._block_2_holding_regs.get(name)
-        if value_entry is None:
-            value_entry = self._block_3_input_regs.get(name)
-        if value_entry is None:
-            return None
+        return self._decoders.decode(name, self._snapshot.words)
 
-        if value_entry['type'] == 2:
-            return value_entry['value'] * 0.1
-        if value_entry['type'] == 7:
-            return value_entry['value'] * 0.01
+    def get_all_converted(self) -> dict:
+        """Read and convert the values of all registers.
 
-        return value_entry['value']
+        Returns:
+            Dict of register name to actual value or None.
+        """
+        if self._metrics is None:
+            return self._decoders.decode_all(self._snapshot.words)
+        start = time.perf_counter()
+        values = self._decoders.decode_all(self._snapshot.words)
+        self._metrics.observe_duration('decode', time.perf_counter() - start)
+        return values
 
 #    def get_raw_input_register(self, name):
 #        """Get raw register value by name."""
@@ -262,73 +608,317 @@ class StiebelEltronAPI():
 #            address=(self._holding_regs[name]['addr']),
 #            value=value)
 
+    def _operation_value(self, mode: str) -> int:
+        """Return the register value of an operation mode.
+
+        Raises:
+            ValueError: If the mode is unknown.
+        """
+        value = self._model.value('OPERATING_MODE', mode)
+        if value is None:
+            raise ValueError(f"Unknown operation mode {mode!r}")
+        return value
+
+
+class StiebelEltronAPI(BaseStiebelEltronAPI):
+    """Stiebel Eltron API."""
+
+    def __init__(self, conn: 'ModbusClientMixin', slave=1,
+                 update_on_read=False, *, thread_safe=False, **kwargs):
+        """Initialize Stiebel Eltron communication.
+
+        Args:
+            thread_safe: Serialize the requests of several threads and let
+                concurrent getters share one refresh. Writes of other
+                threads go before the remaining block reads of an update.
+
+        See :class:`BaseStiebelEltronAPI` for the other arguments.
+        """
+        super().__init__(conn, slave, update_on_read, **kwargs)
+        if thread_safe:
+            # pylint: disable=import-outside-toplevel
+            from .connection import LockedConnection, PriorityLock
+            self._lock = PriorityLock()
+            self._refresh_lock = threading.Lock()
+            self._conn = LockedConnection(self._conn, self._lock)
+        else:
+            self._refresh_lock = None
+        self._refreshes = 0
+        self._refresh_result = True
+
+    def _instrument(self, conn, metrics: 'MetricsHook'):
+        """Wrap the connection to report requests to the metrics hook."""
+        # pylint: disable=import-outside-toplevel
+        from .metrics import InstrumentedConnection
+        return InstrumentedConnection(conn, metrics, self._model.layout)
+
+    def connect(self) -> bool:
+        """Connect the Modbus client, returns whether it is connected."""
+        return self._conn.connect()
+
+    def refresh(self, max_age=None):
+        """Update the values, if they are older than max_age seconds.
+
+        Getters call it before reading. Concurrent callers of a thread safe
+        API share one update.
+
+        Args:
+            max_age: Overrides the max age of the instance. Without either
+                the values are not updated.
+
+        Returns:
+            False if a required update failed, True otherwise.
+        """
+        if not self._needs_refresh(max_age):
+            return True
+        if self._refresh_lock is None:
+            return self.update()
+        # Threads waiting for a refresh in flight share its result
+        refreshes = self._refreshes
+        with self._refresh_lock:
+            if self._refreshes == refreshes:
+                self._refresh_result = self.update()
+                self._refreshes += 1
+            return self._refresh_result
+
+    def update(self):
+        """Request current values from heat pump.
+
+        With thread_safe, writes of other threads waiting for the connection
+        are sent between the block reads. The snapshot is replaced once all
+        blocks are read.
+        """
+        start = time.perf_counter()
+        ret = True
+        with self._lock:
+            try:
+                results = []
+                for request in self._full_reads:
+                    if results and self._refresh_lock is not None:
+                        # Thread safe, let waiting writes go first
+                        self._lock.yield_lock()
+                    results.append(
+                        (request.offset, self.read_registers(request)))
+            except self._communication_errors as exc:
+                # The unit does not reply reliably
+                ret = False
+                self.request_failed(exc)
+            else:
+                self._store_reads(results)
+
+        if self._metrics is not None:
+            self._metrics.observe_duration('update',
+                                           time.perf_counter() - start)
+        return ret
+
+    def read_registers(self, request):
+        """Read the registers of a planned request.
+
+        Args:
+            request: :class:`pystiebeleltron.planner.ReadRequest`.
+
+        Returns:
+            List of the raw register words.
+        """
+        return self._send_read(request).registers
+
+    def write_registers(self, address: int, values):
+        """Write contiguous holding registers.
+
+        A single register is written with function 6, several with 16.
+
+        Args:
+            address: Address of the first register.
+            values: Raw words to write.
+
+        Returns:
+            The pymodbus response.
+        """
+        return self._send_write(address, values)
+
+    def update_registers(self, names):
+        """Request current values of some registers from heat pump.
+
+        The registers are read with the fewest contiguous requests. The
+        snapshot keeps the timestamp of the last full update.
+
+        Args:
+            names: Names of the registers to read.
+        """
+        with self._lock:
+            try:
+                results = [(request.offset, self.read_registers(request))
+                           for request in self._planner.plan(names)]
+            except self._communication_errors as exc:
+                # The unit does not reply reliably
+                self.request_failed(exc)
+                return False
+            self.patch_snapshot(results)
+            return True
+
+    def poll(self, schedule: PollSchedule):
+        """Update the register groups of a schedule which are due.
+
+        Returns:
+            False if the update failed, True otherwise.
+        """
+        with self._lock:
+            groups = schedule.due()
+            if not groups:
+                return True
+            previous = self._snapshot
+            if not self.update_registers(schedule.registers(groups)):
+                return False
+            schedule.polled(groups, self._snapshot.changed(previous))
+            return True
+
+    def stream(self, interval: float, registers=None, count=None):
+        """Poll at a fixed rate and yield the decoded values.
+
+        Polls start on a fixed grid, so slow polls do not shift later ones.
+        Ticks missed by a slow poll or a slow consumer are skipped, not
+        caught up. Failed polls yield no sample.
+
+        Args:
+            interval: Time between two polls in seconds.
+            registers: Names of the registers to poll, None for all.
+            count: Number of samples to yield, None for no limit.
+
+        Yields:
+            :class:`Sample` with the values of the polled registers.
+        """
+        deadline = time.monotonic()
+        missed = 0
+        samples = 0
+        while count is None or samples < count:
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            if registers is None:
+                success = self.update()
+            else:
+                success = self.update_registers(registers)
+            if success:
+                yield self._sample(registers, missed)
+                samples += 1
+                missed = 0
+            else:
+                missed += 1
+            deadline, skipped = next_deadline(deadline, interval,
+                                              time.monotonic())
+            missed += skipped
+
+    def transaction(self, verify=True, skip_unchanged=True):
+        """Start a batch of holding register writes.
+
+        Args:
+            verify: Read the written registers back on commit.
+            skip_unchanged: Drop writes of values the last poll returned.
+
+        Returns:
+            :class:`pystiebeleltron.transaction.WriteTransaction`, committed
+            when used as context manager.
+        """
+        # pylint: disable=import-outside-toplevel
+        from .transaction import WriteTransaction
+        return WriteTransaction(self, verify, skip_unchanged)
+
     # Handle room temperature & humidity
 
-    def get_current_temp(self):
+    def get_current_temp(self, max_age=None):
         """Get the current room temperature."""
-        if self._update_on_read:
-            self.update()
+        self.refresh(max_age)
         return self.get_conv_val('ACTUAL_ROOM_TEMPERATURE_HC1')
 
-    def get_target_temp(self):
+    def get_target_temp(self, max_age=None):
         """Get the target room temperature."""
-        if self._update_on_read:
-            self.update()
+        self.refresh(max_age)
         return self.get_conv_val('ROOM_TEMP_HEAT_DAY_HC1')
 
-    def set_target_temp(self, temp: float):
-        """Set the target room temperature (day)(HC1)."""
-        self._conn.write_register(
-            slave=self._slave,
-            address=(
-                self._block_2_holding_regs['ROOM_TEMP_HEAT_DAY_HC1']['addr']),
-            value=round(temp * 10.0))
+    def _write_value(self, name: str, value, confirm: bool) -> bool:
+        """Write a converted value to a register.
 
-    def get_current_humidity(self):
+        Raises:
+            ValueError: If the value is out of range, before any request.
+        """
+        if confirm:
+            # Read back by a transaction, returns whether the register holds
+            # the value
+            transaction = self.transaction(skip_unchanged=False)
+            transaction.set(name, value)
+            return transaction.commit()
+        address, _, word = self.encode_write(name, value)
+        self.write_registers(address, [word])
+        return True
+
+    def set_target_temp(self, temp: float, confirm=False):
+        """Set the target room temperature (day)(HC1).
+
+        Args:
+            temp: Temperature in °C.
+            confirm: Read the register back ahead of queued polls.
+
+        Returns:
+            With confirm whether the register holds the temperature, otherwise
+            True once the write is sent.
+        """
+        return self._write_value('ROOM_TEMP_HEAT_DAY_HC1', temp, confirm)
+
+    def get_current_humidity(self, max_age=None):
         """Get the current room humidity."""
-        if self._update_on_read:
-            self.update()
+        self.refresh(max_age)
         return self.get_conv_val('RELATIVE_HUMIDITY_HC1')
 
     # Handle operation mode
 
-    def get_operation(self):
+    def get_operation(self, max_age=None):
         """Return the current mode of operation."""
-        if self._update_on_read:
-            self.update()
+        self.refresh(max_age)
 
         op_mode = self.get_conv_val('OPERATING_MODE')
-        return B2_OPERATING_MODE_READ.get(op_mode, 'UNKNOWN')
+        return self._model.label('OPERATING_MODE', op_mode, 'UNKNOWN')
+
+    def set_operation(self, mode: str, confirm=False):
+        """Set the operation mode.
+
+        Args:
+            mode: Label of the mode, e.g. 'AUTOMATIC'.
+            confirm: Read the register back ahead of queued polls.
 
-    def set_operation(self, mode: str):
-        """Set the operation mode."""
-        self._conn.write_register(
-            slave=self._slave,
-            address=(self._block_2_holding_regs['OPERATING_MODE']['addr']),
-            value=B2_OPERATING_MODE_WRITE.get(mode))
+        Returns:
+            With confirm whether the register holds the mode, otherwise
+            True once the write is sent.
+        """
+        return self._write_value('OPERATING_MODE',
+                                 self._operation_value(mode), confirm)
 
     # Handle device status
 
-    def get_heating_status(self):
+    def get_heating_status(self, max_age=None):
         """Return heater status."""
-        if self._update_on_read:
-            self.update()
-        return bool(self.get_conv_val('OPERATING_STATUS') &
-                    B3_OPERATING_STATUS['HEATING'])
+        self.refresh(max_age)
+        bits = self._model.bitmask('OPERATING_STATUS')
+        return bool(self.get_conv_val('OPERATING_STATUS') & bits['HEATING'])
 
-    def get_cooling_status(self):
+    def get_cooling_status(self, max_age=None):
         """Cooling status."""
-        if self._update_on_read:
-            self.update()
-        return bool(self.get_conv_val('OPERATING_STATUS') &
-                    B3_OPERATING_STATUS['COOLING'])
+        self.refresh(max_age)
+        bits = self._model.bitmask('OPERATING_STATUS')
+        return bool(self.get_conv_val('OPERATING_STATUS') & bits['COOLING'])
 
-    def get_filter_alarm_status(self):
+    def get_filter_alarm_status(self, max_age=None):
         """Return filter alarm."""
-        if self._update_on_read:
-            self.update()
+        self.refresh(max_age)
 
-        filter_mask = (B3_OPERATING_STATUS['FILTER'] |
-                       B3_OPERATING_STATUS['FILTER_EXTRACT_AIR'] |
-                       B3_OPERATING_STATUS['FILTER_VENTILATION_AIR'])
+        bits = self._model.bitmask('OPERATING_STATUS')
+        filter_mask = (bits['FILTER'] | bits['FILTER_EXTRACT_AIR'] |
+                       bits['FILTER_VENTILATION_AIR'])
         return bool(self.get_conv_val('OPERATING_STATUS') & filter_mask)
+
+    def get_status(self, max_age=None) -> 'DeviceStatus':
+        """Return operating, fault and bus status of a single update."""
+        # status builds its enums from the register maps of this module
+        # pylint: disable=import-outside-toplevel
+        from .status import DeviceStatus
+        self.refresh(max_age)
+        return DeviceStatus.from_snapshot(self._snapshot)
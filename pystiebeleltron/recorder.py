@@ -0,0 +1,413 @@
+"""
+Compact append-only recording of register snapshots.
+
+:class:`Recorder` appends :class:`RegisterSnapshot` objects to a binary file,
+e.g. from the ``on_poll`` callback of a :class:`FleetPoller`. Snapshots are
+buffered and written as segments of up to ``segment_rows`` polls. A segment
+stores the timestamps as float64 column and every register word as uint16
+column, encoded as
+
+* CONST: one word, the register did not change within the segment,
+* RLE: run start rows (uint32) and run values (uint16),
+* RAW: one word per poll,
+
+whichever is smallest. As most registers rarely change, a segment of 1024
+polls of all 63 words usually takes a few kB.
+
+:class:`RecordingReader` memory-maps the file. Segments outside a requested
+time range are skipped using their headers, timestamps and RAW or RLE
+columns are returned as memoryviews into the map without copying.
+
+File format (little endian, all sections 8 byte aligned)::
+
+    file header:    b'PYSEREC1', uint32 length, JSON layout description
+    segment header: b'SEGM', uint32 rows, uint32 size, 4 pad bytes,
+                    float64 first timestamp, float64 last timestamp
+    timestamps:     float64[rows]
+    directory:      per word (uint8 encoding, 3 pad bytes, uint32 offset,
+                    uint32 count)
+    columns:        payloads at the directory offsets, 4 byte aligned
+
+A segment torn by a crash is ignored by readers and truncated by the next
+recorder opening the file.
+"""
+
+import bisect
+import contextlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import namedtuple
+
+from .decoder import decode_word
+from .pystiebeleltron import DECODER_TABLE, REGISTER_LAYOUT
+from .snapshot import RegisterSnapshot
+
+FILE_MAGIC = b'PYSEREC1'
+SEGMENT_MAGIC = b'SEGM'
+
+CONST = 0
+RLE = 1
+RAW = 2
+
+_FILE_HEADER = struct.Struct('<8sI')
+_SEGMENT_HEADER = struct.Struct('<4sII4xdd')
+_DIRECTORY_ENTRY = struct.Struct('<BxxxII')
+
+_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+SegmentInfo = namedtuple(
+    'SegmentInfo', ['position', 'rows', 'first', 'last'])
+
+
+def _pad(length: int, alignment: int = 8) -> int:
+    return -length % alignment
+
+
+def _layout_header(layout) -> bytes:
+    description = json.dumps({
+        'blocks': [[start, count, table] for (start, _, count), table
+                   in zip(layout.blocks, layout.tables)],
+        'index': layout.index,
+    }, sort_keys=True).encode()
+    header = _FILE_HEADER.pack(FILE_MAGIC, len(description)) + description
+    return header + b'\0' * _pad(len(header))
+
+
+def _le_bytes(values: array) -> bytes:
+    if not _LITTLE_ENDIAN:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _view(buffer, typecode: str):
+    """Return a typed view of little endian data, zero-copy if possible."""
+    if _LITTLE_ENDIAN:
+        return memoryview(buffer).cast(typecode)
+    values = array(typecode, bytes(buffer))
+    values.byteswap()
+    return memoryview(values)
+
+
+def _runs(column):
+    """Return the start rows and values of the runs of equal words."""
+    starts = array('I', [0])
+    values = array('H', [column[0]])
+    previous = column[0]
+    for row, word in enumerate(column):
+        if word != previous:
+            starts.append(row)
+            values.append(word)
+            previous = word
+    return starts, values
+
+
+def _encode_column(column):
+    """Return (encoding, count, payload) of the smallest encoding."""
+    starts, values = _runs(column)
+    if len(starts) == 1:
+        return CONST, 1, _le_bytes(values)
+    if 6 * len(starts) < 2 * len(column):
+        return RLE, len(starts), _le_bytes(starts) + _le_bytes(values)
+    return RAW, len(column), _le_bytes(column)
+
+
+def encode_segment(timestamps, rows, width: int) -> bytes:
+    """Encode buffered polls as one segment.
+
+    Args:
+        timestamps: array('d') of the poll times.
+        rows: array('H') of the words of all polls, row by row.
+        width: Words per poll.
+    """
+    count = len(timestamps)
+    directory_size = width * _DIRECTORY_ENTRY.size
+    position = (_SEGMENT_HEADER.size + 8 * count + directory_size +
+                _pad(directory_size))
+    directory = []
+    payloads = []
+    for offset in range(width):
+        encoding, length, payload = _encode_column(rows[offset::width])
+        directory.append(_DIRECTORY_ENTRY.pack(encoding, position, length))
+        payload += b'\0' * _pad(len(payload), 4)
+        payloads.append(payload)
+        position += len(payload)
+    position += _pad(position)
+
+    parts = [_SEGMENT_HEADER.pack(SEGMENT_MAGIC, count, position,
+                                  timestamps[0], timestamps[-1]),
+             _le_bytes(timestamps)]
+    parts.extend(directory)
+    parts.append(b'\0' * _pad(directory_size))
+    parts.extend(payloads)
+    data = b''.join(parts)
+    return data + b'\0' * (position - len(data))
+
+
+def _scan(buffer, start: int):
+    """Return the complete segments of a file and the end of the last."""
+    segments = []
+    position = start
+    while position + _SEGMENT_HEADER.size <= len(buffer):
+        magic, rows, size, first, last = _SEGMENT_HEADER.unpack_from(
+            buffer, position)
+        if magic != SEGMENT_MAGIC or position + size > len(buffer):
+            break
+        segments.append(SegmentInfo(position, rows, first, last))
+        position += size
+    return segments, position
+
+
+def _read_header(buffer):
+    """Return the layout description and the end of the file header."""
+    if len(buffer) < _FILE_HEADER.size:
+        raise ValueError("Not a register recording")
+    magic, length = _FILE_HEADER.unpack_from(buffer, 0)
+    if magic != FILE_MAGIC:
+        raise ValueError("Not a register recording")
+    end = _FILE_HEADER.size + length
+    description = json.loads(bytes(buffer[_FILE_HEADER.size:end]))
+    return description, end + _pad(end)
+
+
+class Recorder():
+    """Append register snapshots to a recording file."""
+
+    def __init__(self, path, layout=REGISTER_LAYOUT, segment_rows=1024,
+                 fsync=False):
+        """Open or create a recording.
+
+        Args:
+            path: File to append to, created if missing.
+            layout: Register layout of the recorded snapshots.
+            segment_rows: Polls buffered before a segment is written.
+            fsync: Whether to fsync the file after every segment.
+
+        Raises:
+            ValueError: If the file is no recording of the layout.
+        """
+        self._layout = layout
+        self._segment_rows = segment_rows
+        self._fsync = fsync
+        self._timestamps = array('d')
+        self._rows = array('H')
+        header = _layout_header(layout)
+        resume = os.path.exists(path) and os.path.getsize(path) > 0
+        with contextlib.ExitStack() as stack:
+            self._file = stack.enter_context(
+                open(path, 'r+b' if resume else 'wb'))
+            if resume:
+                self._resume(header, path)
+            else:
+                self._file.write(header)
+                self._file.flush()
+            # The file stays open until close()
+            stack.pop_all()
+
+    def _resume(self, header: bytes, path):
+        """Check the header and append after the last complete segment."""
+        with mmap.mmap(self._file.fileno(), 0,
+                       access=mmap.ACCESS_READ) as buffer:
+            if bytes(buffer[:len(header)]) != header:
+                raise ValueError(f"{path} is no recording of this layout")
+            _, end = _scan(buffer, len(header))
+        # Drop a segment torn by a crash
+        self._file.truncate(end)
+        self._file.seek(end)
+
+    def append(self, snapshot: RegisterSnapshot) -> bool:
+        """Buffer a snapshot, returns False for placeholder snapshots."""
+        if snapshot.timestamp is None:
+            return False
+        if snapshot.layout is not self._layout:
+            raise ValueError("Snapshot of a different layout")
+        self._timestamps.append(snapshot.timestamp)
+        self._rows.extend(snapshot.words)
+        if len(self._timestamps) >= self._segment_rows:
+            self.flush()
+        return True
+
+    def flush(self):
+        """Write the buffered snapshots as a segment."""
+        if not self._timestamps:
+            return
+        self._file.write(encode_segment(self._timestamps, self._rows,
+                                        self._layout.size))
+        self._file.flush()
+        if self._fsync:
+            os.fsync(self._file.fileno())
+        self._timestamps = array('d')
+        self._rows = array('H')
+
+    def close(self):
+        """Write the buffered snapshots and close the file."""
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+
+class Segment():
+    """Memory-mapped segment of a recording."""
+
+    __slots__ = ('info', '_buffer', '_directory', '_width')
+
+    def __init__(self, buffer, info: SegmentInfo, width: int):
+        """Map a segment.
+
+        Args:
+            buffer: memoryview of the whole file.
+            info: Position and size of the segment.
+            width: Words per poll.
+        """
+        self.info = info
+        self._width = width
+        self._buffer = buffer
+        start = info.position + _SEGMENT_HEADER.size + 8 * info.rows
+        self._directory = buffer[start:start + width * _DIRECTORY_ENTRY.size]
+
+    def __len__(self) -> int:
+        return self.info.rows
+
+    @property
+    def timestamps(self) -> memoryview:
+        """Return the poll times."""
+        start = self.info.position + _SEGMENT_HEADER.size
+        return _view(self._buffer[start:start + 8 * self.info.rows], 'd')
+
+    def encoding(self, offset: int):
+        """Return (encoding, position, count) of a word column."""
+        return _DIRECTORY_ENTRY.unpack_from(
+            self._directory, offset * _DIRECTORY_ENTRY.size)
+
+    def runs(self, offset: int):
+        """Return the run start rows and run values of a word column."""
+        encoding, position, count = self.encoding(offset)
+        position += self.info.position
+        if encoding == CONST:
+            return (memoryview(array('I', [0])),
+                    _view(self._buffer[position:position + 2], 'H'))
+        if encoding == RLE:
+            values = position + 4 * count
+            return (_view(self._buffer[position:values], 'I'),
+                    _view(self._buffer[values:values + 2 * count], 'H'))
+        starts, values = _runs(self.words(offset))
+        return memoryview(starts), memoryview(values)
+
+    def words(self, offset: int):
+        """Return the words of a column, zero-copy for RAW columns."""
+        encoding, position, count = self.encoding(offset)
+        position += self.info.position
+        if encoding == RAW:
+            return _view(self._buffer[position:position + 2 * count], 'H')
+        starts, values = self.runs(offset)
+        column = array('H')
+        ends = list(starts[1:]) + [self.info.rows]
+        for start, end, value in zip(starts, ends, values):
+            column.extend(array('H', [value]) * (end - start))
+        return memoryview(column)
+
+    def bounds(self, start=None, end=None):
+        """Return the row range of the polls in [start, end)."""
+        timestamps = self.timestamps
+        first = 0 if start is None else bisect.bisect_left(timestamps, start)
+        last = (len(timestamps) if end is None else
+                bisect.bisect_left(timestamps, end))
+        return first, last
+
+
+class RecordingReader():
+    """Memory-mapped read access to a recording."""
+
+    def __init__(self, path, decoders=DECODER_TABLE):
+        """Map a recording.
+
+        Args:
+            path: Recording file.
+            decoders: Decoder table converting the words of the layout.
+        """
+        self._decoders = decoders
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+        description, start = _read_header(self._buffer)
+        self.index = description['index']
+        self.width = sum(count for _, count, _ in description['blocks'])
+        self.segments, _ = _scan(self._buffer, start)
+
+    def __len__(self) -> int:
+        return sum(info.rows for info in self.segments)
+
+    def _offset(self, column) -> int:
+        return column if isinstance(column, int) else self.index[column]
+
+    def iter_segments(self, start=None, end=None):
+        """Yield the segments with polls in [start, end)."""
+        for info in self.segments:
+            if start is not None and info.last < start:
+                continue
+            if end is not None and info.first >= end:
+                break
+            yield Segment(self._buffer, info, self.width)
+
+    def column(self, column, start=None, end=None):
+        """Return the timestamps and words of a register in [start, end).
+
+        Args:
+            column: Register name or word offset.
+            start: First time to include, None for the beginning.
+            end: Time to stop at, None for the end.
+
+        Returns:
+            Tuple of array('d') timestamps and array('H') words.
+        """
+        offset = self._offset(column)
+        timestamps = array('d')
+        words = array('H')
+        for segment in self.iter_segments(start, end):
+            first, last = segment.bounds(start, end)
+            timestamps.frombytes(segment.timestamps[first:last].cast('B'))
+            words.frombytes(segment.words(offset)[first:last].cast('B'))
+        return timestamps, words
+
+    def decode(self, name: str, start=None, end=None):
+        """Return (timestamp, converted value) tuples of a register."""
+        decoder = self._decoders.get(name)
+        timestamps, words = self.column(name, start, end)
+        return [(timestamp, decode_word(word, decoder))
+                for timestamp, word in zip(timestamps, words)]
+
+    def snapshots(self, start=None, end=None, layout=REGISTER_LAYOUT):
+        """Yield the recorded polls in [start, end) as snapshots."""
+        for segment in self.iter_segments(start, end):
+            first, last = segment.bounds(start, end)
+            columns = [segment.words(offset) for offset in range(self.width)]
+            timestamps = segment.timestamps
+            for row in range(first, last):
+                yield RegisterSnapshot(
+                    layout, [column[row] for column in columns],
+                    timestamps[row])
+
+    def close(self):
+        """Unmap the file.
+
+        Views returned by the reader must be released before.
+        """
+        self._buffer.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
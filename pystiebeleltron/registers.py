@@ -0,0 +1,255 @@
+"""
+Declarative register maps of heat pump models.
+
+A :class:`RegisterModel` describes the registers of one model: address,
+data type, access, and optional enum labels or status bits. The layout,
+decoders and read planner are compiled on first use, so a model costs
+nothing until it is polled.
+
+Register maps ship as JSON files in ``pystiebeleltron/models`` and are
+loaded on demand with :func:`load_model`, only the models in use are read.
+A file looks like::
+
+    {
+      "model": "lwz",
+      "description": "LWZ integral ventilation units",
+      "error_values": [-60, -50],
+      "unavailable": 32768,
+      "aliases": {"MANUAL_SET_TEMP_HC2": "MANUAL_SET_TEAMP_HC2"},
+      "blocks": [
+        {"name": "B2", "table": "holding", "start": 1000, "registers": {
+          "OPERATING_MODE": {"addr": 1000, "type": 8, "access": "rw",
+                             "enum": {"11": "AUTOMATIC", "1": "STANDBY"}}
+        }}
+      ]
+    }
+
+Registers of input blocks are read-only, registers of holding blocks are
+writable unless their access is "r". Status registers list their bits as
+"bits": {"NAME": mask}.
+"""
+
+import json
+import os
+import pkgutil
+import re
+from functools import lru_cache
+
+from .decoder import DATA_TYPES, DecoderTable
+from .planner import ReadPlanner
+from .snapshot import RegisterLayout, INPUT_REGISTERS, HOLDING_REGISTERS
+
+# Sensor errors and the unavailable object of the ISG
+DEFAULT_ERROR_VALUES = (-60, -50)
+DEFAULT_UNAVAILABLE = 0x8000
+
+READ = 'r'
+READ_WRITE = 'rw'
+
+_MODEL_DIR = 'models'
+_MODEL_NAME = re.compile(r'^[A-Za-z0-9_\-]+$')
+
+
+def _parse_blocks(name: str, blocks) -> tuple:
+    """Validate the blocks of a model file.
+
+    Returns:
+        Tuple of the (start address, register map, table) tuples of the
+        blocks and the dict of register name to access given in the file.
+
+    Raises:
+        ValueError: If a table, data type, address or access is invalid.
+    """
+    result = []
+    access = {}
+    addresses = set()
+    for block in blocks:
+        table = block['table']
+        if table not in (INPUT_REGISTERS, HOLDING_REGISTERS):
+            raise ValueError(f"Model {name}: unknown table {table!r}")
+        regmap = {}
+        for register, entry in block['registers'].items():
+            address = entry['addr']
+            if entry['type'] not in DATA_TYPES:
+                raise ValueError(
+                    f"Model {name}: unknown data type of {register}")
+            if (not block['start'] <= address <= 0xFFFF or
+                    (table, address) in addresses or register in regmap):
+                raise ValueError(f"Model {name}: invalid or duplicate "
+                                 f"address of {register}")
+            addresses.add((table, address))
+            regmap[register] = {'addr': address, 'type': entry['type'],
+                                'value': 0}
+            if 'access' in entry:
+                if entry['access'] not in (READ, READ_WRITE) or (
+                        table == INPUT_REGISTERS and entry['access'] != READ):
+                    raise ValueError(
+                        f"Model {name}: invalid access of {register}")
+                access[register] = entry['access']
+        result.append((block['start'], regmap, table))
+    return result, access
+
+
+class RegisterModel():
+    """Register map of a heat pump model, compiled on first use."""
+
+    # The fields of a model file, compiled tables are cached on first use
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+
+    def __init__(self, name, blocks, *, enums=None, bitmasks=None,
+                 aliases=None, access=None, error_values=DEFAULT_ERROR_VALUES,
+                 unavailable=DEFAULT_UNAVAILABLE, description=''):
+        """Define a model.
+
+        Args:
+            name: Name of the model.
+            blocks: Sequence of (start address, register map, table) tuples
+                like :class:`pystiebeleltron.snapshot.RegisterLayout`.
+            enums: Dict of register name to {value: label}.
+            bitmasks: Dict of register name to {bit name: mask}.
+            aliases: Dict of alternative name to register name.
+            access: Dict of register name to READ or READ_WRITE, which
+                overrides the access given by the table of its block.
+            error_values: Converted values of signed registers which signal
+                a sensor error.
+            unavailable: Raw word which signals an unavailable object.
+            description: Human readable description.
+        """
+        self.name = name
+        self.description = description
+        self.blocks = tuple(blocks)
+        self.enums = dict(enums or {})
+        self.bitmasks = dict(bitmasks or {})
+        self.aliases = dict(aliases or {})
+        self.error_values = tuple(error_values)
+        self.unavailable = unavailable
+        self._access = {}
+        for _, regmap, table in self.blocks:
+            default = READ_WRITE if table == HOLDING_REGISTERS else READ
+            for register in regmap:
+                self._access[register] = default
+        self._access.update(access or {})
+        self._layout = None
+        self._decoders = None
+        self._planner = None
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.name!r})'
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create a model from the parsed content of a model file.
+
+        Raises:
+            ValueError: If the definition is invalid.
+        """
+        name = data.get('model', '')
+        blocks, access = _parse_blocks(name, data['blocks'])
+        entries = [(register, entry) for block in data['blocks']
+                   for register, entry in block['registers'].items()]
+        enums = {register: {int(value): label for value, label
+                            in entry['enum'].items()}
+                 for register, entry in entries if 'enum' in entry}
+        bitmasks = {register: dict(entry['bits'])
+                    for register, entry in entries if 'bits' in entry}
+
+        names = {register for _, regmap, _ in blocks for register in regmap}
+        aliases = data.get('aliases', {})
+        for alias, register in aliases.items():
+            if register not in names or alias in names:
+                raise ValueError(f"Model {name}: invalid alias {alias}")
+        return cls(name, blocks, enums=enums, bitmasks=bitmasks,
+                   aliases=aliases, access=access,
+                   error_values=data.get('error_values',
+                                         DEFAULT_ERROR_VALUES),
+                   unavailable=data.get('unavailable', DEFAULT_UNAVAILABLE),
+                   description=data.get('description', ''))
+
+    @property
+    def layout(self) -> RegisterLayout:
+        """Return the flat word layout of all blocks."""
+        if self._layout is None:
+            self._layout = RegisterLayout(self.blocks, self.aliases)
+        return self._layout
+
+    @property
+    def decoders(self) -> DecoderTable:
+        """Return the compiled decoders."""
+        if self._decoders is None:
+            self._decoders = DecoderTable(
+                self.layout, [regmap for _, regmap, _ in self.blocks],
+                self.error_values, self.unavailable)
+        return self._decoders
+
+    @property
+    def planner(self) -> ReadPlanner:
+        """Return the read planner."""
+        if self._planner is None:
+            self._planner = ReadPlanner(self.layout)
+        return self._planner
+
+    @property
+    def names(self):
+        """Return the register names in layout order."""
+        return list(self.layout.index)
+
+    def resolve(self, name: str) -> str:
+        """Return the register name of a name or alias."""
+        return self.aliases.get(name, name)
+
+    def writable(self, name: str) -> bool:
+        """Return whether a register may be written."""
+        return self._access.get(self.resolve(name)) == READ_WRITE
+
+    def label(self, name: str, value, default=None):
+        """Return the enum label of a register value."""
+        return self.enums.get(self.resolve(name), {}).get(value, default)
+
+    def value(self, name: str, label: str):
+        """Return the register value of an enum label or None."""
+        for value, value_label in self.enums.get(self.resolve(name),
+                                                 {}).items():
+            if value_label == label:
+                return value
+        return None
+
+    def bitmask(self, name: str) -> dict:
+        """Return the bits of a status register."""
+        return self.bitmasks.get(self.resolve(name), {})
+
+
+def available_models() -> list:
+    """Return the names of the bundled model files."""
+    directory = os.path.join(os.path.dirname(__file__), _MODEL_DIR)
+    return sorted(filename[:-5] for filename in os.listdir(directory)
+                  if filename.endswith('.json'))
+
+
+@lru_cache(maxsize=None)
+def load_model(name: str) -> RegisterModel:
+    """Load a bundled model file, every model is read once.
+
+    Raises:
+        ValueError: If there is no such model or the file is invalid.
+    """
+    if not _MODEL_NAME.match(name):
+        raise ValueError(f"Invalid model name {name!r}")
+    try:
+        data = pkgutil.get_data(
+            __package__, f'{_MODEL_DIR}/{name}.json')
+    except FileNotFoundError:
+        data = None
+    if data is None:
+        raise ValueError(f"Unknown model {name!r}, available: "
+                         f"{', '.join(available_models())}")
+    return RegisterModel.from_dict(json.loads(data))
+
+
+def load_model_file(path) -> RegisterModel:
+    """Load a model from a JSON file.
+
+    Raises:
+        ValueError: If the file is invalid.
+    """
+    with open(path, encoding='utf-8') as file:
+        return RegisterModel.from_dict(json.load(file))
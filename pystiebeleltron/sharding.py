@@ -0,0 +1,426 @@
+"""
+Poll very large fleets from several processes.
+
+:class:`ShardedFleet` splits the targets into shards, each polled by a
+:class:`pystiebeleltron.fleet.FleetPoller` in its own worker process with
+its own Modbus clients. Targets of one host stay in one shard, so they keep
+sharing a client and the per-host rate limit.
+
+Workers hand the snapshots of successful polls to the parent through a
+:class:`SnapshotRing` in shared memory: fixed size slots of raw register
+words, no pickling. The parent decodes only what it uses.
+
+Workers report every poll cycle over a pipe. :meth:`ShardedFleet.supervise`
+restarts a worker which died or stopped reporting. A shard which died more
+than ``max_restarts`` times is dropped and its targets are moved to the
+remaining workers.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import struct
+import time
+from array import array
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+from .fleet import FleetPoller, FleetTarget, CycleReport
+from .pystiebeleltron import REGISTER_LAYOUT
+from .snapshot import RegisterSnapshot
+
+_LOGGER = logging.getLogger(__name__)
+
+# Head of the ring: number of records written
+_HEAD = struct.Struct('<Q')
+# Slot header: sequence, target index, timestamp
+_SLOT = struct.Struct('<QQd')
+
+ShardStatus = namedtuple('ShardStatus', [
+    'shard', 'pid', 'alive', 'targets', 'restarts', 'cycles',
+    'last_report', 'last_heartbeat'])
+
+
+class SnapshotRing():
+    """Single producer, single consumer ring of snapshots in shared memory.
+
+    Every slot holds the target index, timestamp and raw words of one
+    snapshot, framed by a sequence number which is odd while the slot is
+    written. The reader keeps its own position, skips slots overwritten by
+    a writer which lapped it and counts them as lost.
+
+    A pickled ring attaches to the same shared memory when unpickled.
+    """
+
+    def __init__(self, layout, capacity: int, name=None):
+        """Create a ring or attach to an existing one.
+
+        Args:
+            layout: Register layout of the snapshots.
+            capacity: Number of slots.
+            name: Name of the shared memory to attach to, None to create it.
+        """
+        self._layout = layout
+        self._capacity = capacity
+        self._slot_size = (_SLOT.size + 2 * layout.size + 7) // 8 * 8
+        size = _HEAD.size + capacity * self._slot_size
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+            _HEAD.pack_into(self._shm.buf, 0, 0)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self._head = _HEAD.unpack_from(self._shm.buf, 0)[0]
+        self._tail = self._head
+        self.lost = 0
+
+    @property
+    def capacity(self) -> int:
+        """Return the number of slots."""
+        return self._capacity
+
+    @property
+    def name(self) -> str:
+        """Return the name of the shared memory."""
+        return self._shm.name
+
+    def __reduce__(self):
+        return (SnapshotRing, (self._layout, self._capacity, self.name))
+
+    def _offset(self, number: int) -> int:
+        return _HEAD.size + (number % self._capacity) * self._slot_size
+
+    def put(self, target: int, snapshot: RegisterSnapshot):
+        """Write the snapshot of a target, overwriting the oldest slot."""
+        number = self._head
+        offset = self._offset(number)
+        buf = self._shm.buf
+        _SLOT.pack_into(buf, offset, 2 * number + 1, target,
+                        snapshot.timestamp)
+        start = offset + _SLOT.size
+        buf[start:start + 2 * self._layout.size] = snapshot.words.cast('B')
+        _HEAD.pack_into(buf, offset, 2 * number + 2)
+        self._head = number + 1
+        _HEAD.pack_into(buf, 0, self._head)
+
+    def read(self) -> list:
+        """Return the (target index, snapshot) tuples written since the last
+        read."""
+        buf = self._shm.buf
+        size = 2 * self._layout.size
+        head = _HEAD.unpack_from(buf, 0)[0]
+        if head - self._tail > self._capacity:
+            self.lost += head - self._capacity - self._tail
+            self._tail = head - self._capacity
+        records = []
+        while self._tail < head:
+            number = self._tail
+            self._tail += 1
+            offset = self._offset(number)
+            sequence, target, timestamp = _SLOT.unpack_from(buf, offset)
+            start = offset + _SLOT.size
+            words = array('H', bytes(buf[start:start + size]))
+            if (sequence != 2 * number + 2 or
+                    _HEAD.unpack_from(buf, offset)[0] != sequence):
+                self.lost += 1
+                continue
+            records.append(
+                (target, RegisterSnapshot(self._layout, words, timestamp)))
+        return records
+
+    def close(self):
+        """Detach from the shared memory."""
+        self._shm.close()
+
+    def unlink(self):
+        """Free the shared memory, call after all processes closed it."""
+        self._shm.unlink()
+
+
+def _run_worker(targets, ring, conn, stop, options):
+    """Poll the targets of a shard until stopped.
+
+    Args:
+        targets: List of (target index, target) tuples.
+        ring: SnapshotRing of the shard.
+        conn: Pipe to the parent, receives ('add', targets) messages and
+            sends ('cycle', report) after every cycle.
+        stop: Event set by the parent to stop.
+        options: Arguments of the FleetPoller, including the interval.
+    """
+    interval = options['interval']
+    indices = {FleetTarget(*target): index for index, target in targets}
+
+    def on_poll(target, api, success):
+        if success:
+            ring.put(indices[target], api.snapshot)
+
+    poller = FleetPoller(list(indices), on_poll=on_poll, **options)
+
+    async def run():
+        while not stop.is_set():
+            start = time.monotonic()
+            report = await poller.poll_cycle()
+            conn.send(('cycle', tuple(report)))
+            while conn.poll():
+                message, added = conn.recv()
+                if message == 'add':
+                    indices.update((FleetTarget(*target), index)
+                                   for index, target in added)
+                    poller.add_targets(target for _, target in added)
+            while not stop.is_set():
+                wait = start + interval - time.monotonic()
+                if wait <= 0:
+                    break
+                await asyncio.sleep(min(wait, 0.1))
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        poller.close()
+        ring.close()
+        conn.close()
+
+
+class _Shard():
+    """Worker process of a shard and the state reported by it."""
+
+    # The worker, its pipe and the reported state
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, number, targets, ring):
+        self.number = number
+        self.targets = list(targets)
+        self.ring = ring
+        self.process = None
+        self.conn = None
+        self.restarts = 0
+        self.cycles = 0
+        self.last_report = None
+        self.last_heartbeat = None
+
+    def spawn(self, context, targets, stop, options):
+        """Start the worker process.
+
+        Args:
+            context: Multiprocessing context.
+            targets: Targets of the fleet, indexed by the shard targets.
+            stop: Event set to stop the worker.
+            options: Arguments of the FleetPoller.
+        """
+        parent_conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_run_worker,
+            name=f'pystiebeleltron-shard-{self.number}',
+            args=([(index, tuple(targets[index])) for index in self.targets],
+                  self.ring, child_conn, stop, options),
+            daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.last_heartbeat = time.monotonic()
+
+    def receive(self):
+        """Read the cycle reports of the worker."""
+        try:
+            while self.conn.poll():
+                message, report = self.conn.recv()
+                if message == 'cycle':
+                    self.cycles += 1
+                    self.last_report = CycleReport(*report)
+                    self.last_heartbeat = time.monotonic()
+        except (EOFError, OSError):
+            pass
+
+    def status(self) -> ShardStatus:
+        """Return the status of the shard."""
+        return ShardStatus(
+            self.number, self.process.pid, self.process.is_alive(),
+            len(self.targets), self.restarts, self.cycles,
+            self.last_report, self.last_heartbeat)
+
+
+class ShardedFleet():
+    """Poll a fleet from a pool of worker processes."""
+
+    # Supervision settings on top of the FleetPoller options
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+
+    def __init__(self, targets, *, shards=None, interval=60.0,
+                 capacity=None, heartbeat_timeout=None, max_restarts=3,
+                 on_snapshot=None, **options):
+        """Initialize the fleet.
+
+        Args:
+            targets: Iterable of (host, port, slave) tuples.
+            shards: Number of worker processes, default the CPU count.
+            interval: Time between the starts of two poll cycles in seconds.
+            capacity: Slots of the ring of a shard, default twice its
+                targets at the start so a cycle fits while the parent lags
+                behind. Targets moved in from a failed shard can overflow
+                it, see :attr:`SnapshotRing.lost`.
+            heartbeat_timeout: Seconds without a cycle report after which a
+                worker is restarted, default 3 intervals (at least 30 s).
+            max_restarts: Restarts of a shard before its targets are moved
+                to the other shards.
+            on_snapshot: Callable (target, snapshot) run by :meth:`drain`.
+            options: Further arguments of FleetPoller, the client_factory
+                must be picklable.
+        """
+        self._targets = [FleetTarget(*target) for target in targets]
+        self._shard_count = max(1, min(shards or multiprocessing.cpu_count(),
+                                       len(self._targets)))
+        self._capacity = capacity
+        if heartbeat_timeout is None:
+            heartbeat_timeout = max(3 * interval, 30.0)
+        self._heartbeat_timeout = heartbeat_timeout
+        self._max_restarts = max_restarts
+        self._on_snapshot = on_snapshot
+        self._options = dict(options, interval=interval)
+        self._context = multiprocessing.get_context('spawn')
+        self._stop = None
+        self._shards = []
+        self.latest = {}
+
+    def _partition(self):
+        """Split the target indices into shards, keeping hosts together."""
+        hosts = {}
+        for index, target in enumerate(self._targets):
+            hosts.setdefault((target.host, target.port), []).append(index)
+        shards = [[] for _ in range(self._shard_count)]
+        for group in sorted(hosts.values(), key=len, reverse=True):
+            min(shards, key=len).extend(group)
+        return [sorted(shard) for shard in shards if shard]
+
+    def _ring_capacity(self, indices) -> int:
+        """Return the ring capacity of a shard polling these targets."""
+        if self._capacity:
+            return self._capacity
+        return max(16, 2 * len(indices))
+
+    def start(self):
+        """Start the workers."""
+        if self._shards:
+            return
+        self._stop = self._context.Event()
+        for number, indices in enumerate(self._partition()):
+            ring = SnapshotRing(REGISTER_LAYOUT, self._ring_capacity(indices))
+            shard = _Shard(number, indices, ring)
+            self._shards.append(shard)
+            shard.spawn(self._context, self._targets, self._stop,
+                        self._options)
+
+    def stop(self, timeout=5.0):
+        """Stop the workers and free the shared memory."""
+        if self._stop is not None:
+            self._stop.set()
+        for shard in self._shards:
+            shard.process.join(timeout)
+            if shard.process.is_alive():
+                shard.process.terminate()
+                shard.process.join()
+        self.drain()
+        for shard in self._shards:
+            shard.conn.close()
+            shard.ring.close()
+            shard.ring.unlink()
+        self._shards = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.stop()
+
+    def drain(self) -> list:
+        """Collect the snapshots written by the workers.
+
+        Returns:
+            List of (target, snapshot) tuples, oldest first per shard.
+        """
+        results = []
+        for shard in self._shards:
+            for index, snapshot in shard.ring.read():
+                target = self._targets[index]
+                self.latest[target] = snapshot
+                results.append((target, snapshot))
+                if self._on_snapshot is not None:
+                    self._on_snapshot(target, snapshot)
+        return results
+
+    def supervise(self) -> list:
+        """Restart dead or hung workers, move targets of failing shards.
+
+        Returns:
+            Numbers of the shards restarted or dropped.
+        """
+        handled = []
+        for shard in list(self._shards):
+            shard.receive()
+            alive = shard.process.is_alive()
+            if alive and (time.monotonic() - shard.last_heartbeat <
+                          self._heartbeat_timeout):
+                continue
+            if alive:
+                _LOGGER.warning("Shard %d stopped reporting, restarting it",
+                                shard.number)
+                shard.process.terminate()
+            shard.process.join()
+            shard.conn.close()
+            handled.append(shard.number)
+            if shard.restarts < self._max_restarts or len(self._shards) == 1:
+                _LOGGER.warning("Restarting shard %d (exit code %s)",
+                                shard.number, shard.process.exitcode)
+                shard.restarts += 1
+                shard.spawn(self._context, self._targets, self._stop,
+                            self._options)
+            else:
+                self._rebalance(shard)
+        return handled
+
+    def _rebalance(self, dead: _Shard):
+        """Move the targets of a shard to the remaining shards."""
+        _LOGGER.warning("Moving %d targets of shard %d to other shards",
+                        len(dead.targets), dead.number)
+        self._shards.remove(dead)
+        # Snapshots written before the worker died
+        for index, snapshot in dead.ring.read():
+            self.latest[self._targets[index]] = snapshot
+        dead.ring.close()
+        dead.ring.unlink()
+        # Prefer live workers, a worker which died in this pass gets its
+        # targets when it is restarted
+        receivers = [shard for shard in self._shards
+                     if shard.process.is_alive()] or self._shards
+        added = {shard.number: [] for shard in receivers}
+        for index in dead.targets:
+            shard = min(receivers, key=lambda shard: len(shard.targets))
+            shard.targets.append(index)
+            added[shard.number].append(index)
+        for shard in receivers:
+            if not added[shard.number]:
+                continue
+            try:
+                shard.conn.send(('add', [(index, tuple(self._targets[index]))
+                                         for index in added[shard.number]]))
+            except OSError as exc:
+                _LOGGER.warning("Cannot move targets to shard %d, they are "
+                                "handed over on its restart: %s",
+                                shard.number, exc)
+
+    @property
+    def shards(self) -> list:
+        """Return the status of every shard."""
+        return [shard.status() for shard in self._shards]
+
+    def run(self, duration=None, tick=0.5):
+        """Drain and supervise until interrupted or for duration seconds."""
+        end = None if duration is None else time.monotonic() + duration
+        self.start()
+        while end is None or time.monotonic() < end:
+            self.drain()
+            self.supervise()
+            time.sleep(tick)
+        self.drain()
@@ -0,0 +1,276 @@
+"""
+Immutable snapshots of the raw register words of a device.
+
+A :class:`RegisterLayout` places the registers of several blocks one after
+another in a flat word array and precomputes the name to offset index. A
+:class:`RegisterSnapshot` holds the words of one poll in an ``array('H')``
+exposed as a read-only memoryview, so snapshots are cheap to keep and to
+compare.
+
+:func:`save_snapshot` and :func:`load_snapshot` keep the last snapshot in a
+small JSON file, so the values are known right after a restart.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from array import array
+
+_LOGGER = logging.getLogger(__name__)
+
+SNAPSHOT_FILE_VERSION = 1
+
+# Register tables of a block
+INPUT_REGISTERS = 'input'
+HOLDING_REGISTERS = 'holding'
+
+
+class RegisterLayout():
+    """Flat word layout of several register blocks."""
+
+    __slots__ = ('blocks', 'tables', 'index', 'aliases', 'size', 'defaults')
+
+    def __init__(self, blocks, aliases=None):
+        """Build the layout.
+
+        Args:
+            blocks: Sequence of (start address, register map, table)
+                tuples, the table being INPUT_REGISTERS or
+                HOLDING_REGISTERS. The register maps use the format of the
+                maps in :mod:`pystiebeleltron.pystiebeleltron`.
+            aliases: Dict of alternative name to register name.
+        """
+        spans = []
+        tables = []
+        index = {}
+        defaults = []
+        offset = 0
+        for start, regmap, table in blocks:
+            count = max(v['addr'] for v in regmap.values()) - start + 1
+            words = [0] * count
+            for name, entry in regmap.items():
+                index[name] = offset + entry['addr'] - start
+                words[entry['addr'] - start] = entry.get('value', 0)
+            spans.append((start, offset, count))
+            tables.append(table)
+            defaults.extend(words)
+            offset += count
+        # (start address, offset, count) per block
+        self.blocks = tuple(spans)
+        self.tables = tuple(tables)
+        self.index = index
+        self.aliases = dict(aliases or {})
+        self.size = offset
+        self.defaults = tuple(defaults)
+
+    def offset(self, name: str) -> int:
+        """Return the word offset of a register name or alias."""
+        offset = self.index.get(name)
+        if offset is None:
+            offset = self.index[self.aliases.get(name, name)]
+        return offset
+
+    def locate(self, offset: int):
+        """Return the (block, table, address) of a word offset."""
+        for block, (start, block_offset, count) in enumerate(self.blocks):
+            if block_offset <= offset < block_offset + count:
+                return block, self.tables[block], start + offset - block_offset
+        raise IndexError(offset)
+
+    def block_slice(self, block: int) -> slice:
+        """Return the slice of a block in the flat word array."""
+        _, offset, count = self.blocks[block]
+        return slice(offset, offset + count)
+
+
+class RegisterSnapshot():
+    """Raw register words of a device at one point in time."""
+
+    __slots__ = ('_layout', '_words', '_timestamp')
+
+    def __init__(self, layout: RegisterLayout, words, timestamp=None):
+        """Create a snapshot.
+
+        Args:
+            layout: Layout of the words.
+            words: Raw unsigned 16 bit register words in layout order.
+            timestamp: Time of the poll (seconds since the epoch) or None if
+                the words are placeholders.
+        """
+        buf = array('H', words)
+        if len(buf) != layout.size:
+            raise ValueError(
+                f"Expected {layout.size} register words, got {len(buf)}")
+        self._layout = layout
+        self._words = memoryview(buf).toreadonly()
+        self._timestamp = timestamp
+
+    @classmethod
+    def from_reads(cls, layout: RegisterLayout, reads, timestamp=None):
+        """Create a snapshot from planned reads.
+
+        Words not covered by a read keep their layout default.
+
+        Args:
+            layout: Layout of the words.
+            reads: Iterable of (offset, words) tuples.
+            timestamp: Time of the poll, None for now.
+        """
+        buf = array('H', layout.defaults)
+        for offset, words in reads:
+            buf[offset:offset + len(words)] = array('H', words)
+        if timestamp is None:
+            timestamp = time.time()
+        return cls(layout, buf, timestamp)
+
+    def patched(self, updates):
+        """Return a copy with some words replaced.
+
+        The copy keeps the timestamp, which therefore tracks the last full
+        update of all blocks.
+
+        Args:
+            updates: Iterable of (offset, words) tuples.
+        """
+        buf = array('H', self._words)
+        for offset, words in updates:
+            buf[offset:offset + len(words)] = array('H', words)
+        return RegisterSnapshot(self._layout, buf, self._timestamp)
+
+    @property
+    def layout(self) -> RegisterLayout:
+        """Return the layout of the snapshot."""
+        return self._layout
+
+    @property
+    def words(self) -> memoryview:
+        """Return the raw words as read-only memoryview."""
+        return self._words
+
+    @property
+    def timestamp(self):
+        """Return the time of the poll or None for placeholder values."""
+        return self._timestamp
+
+    def raw(self, name: str) -> int:
+        """Return the raw word of a register."""
+        return self._words[self._layout.offset(name)]
+
+    def block(self, block: int) -> memoryview:
+        """Return the raw words of a block."""
+        return self._words[self._layout.block_slice(block)]
+
+    def changed(self, other) -> list:
+        """Return the names of registers which differ from another snapshot."""
+        if other is None:
+            return list(self._layout.index)
+        if self._words == other.words:
+            return []
+        words = self._words
+        other_words = other.words
+        return [name for name, offset in self._layout.index.items()
+                if words[offset] != other_words[offset]]
+
+    def __getitem__(self, name: str) -> int:
+        return self.raw(name)
+
+    def __contains__(self, name) -> bool:
+        return name in self._layout.index or name in self._layout.aliases
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, RegisterSnapshot):
+            return NotImplemented
+        return self._words == other.words
+
+    def __hash__(self):
+        return hash(self._words.tobytes())
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(timestamp={self._timestamp!r}, '
+                f'words={self._words.tolist()!r})')
+
+
+def layout_digest(layout: RegisterLayout) -> str:
+    """Return a digest of the blocks and register offsets of a layout."""
+    data = json.dumps([layout.blocks, layout.tables,
+                       sorted(layout.index.items())])
+    return hashlib.blake2b(data.encode(), digest_size=8).hexdigest()
+
+
+def save_snapshot(snapshot: RegisterSnapshot, path, identity=None):
+    """Write a snapshot to a JSON file atomically.
+
+    The file is written next to its destination and renamed, so readers
+    and a crash never leave a partial file.
+
+    Args:
+        snapshot: Snapshot to save.
+        path: Path of the file.
+        identity: JSON serializable identity of the device, e.g. model and
+            slave id, which must match when loading.
+
+    Raises:
+        OSError: If the file cannot be written.
+    """
+    data = json.dumps({
+        'version': SNAPSHOT_FILE_VERSION,
+        'identity': identity,
+        'layout': layout_digest(snapshot.layout),
+        'timestamp': snapshot.timestamp,
+        'words': snapshot.words.tolist(),
+    })
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix='.' + os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def load_snapshot(path, layout: RegisterLayout, identity=None):
+    """Read a snapshot saved with :func:`save_snapshot`.
+
+    Args:
+        path: Path of the file.
+        layout: Layout the snapshot must have been saved with.
+        identity: Identity the snapshot must have been saved with.
+
+    Returns:
+        The snapshot or None, if the file is missing, invalid or of another
+        device or layout.
+    """
+    try:
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as exc:
+        _LOGGER.warning("Ignoring snapshot file %s: %s", path, exc)
+        return None
+    try:
+        if (data['version'] != SNAPSHOT_FILE_VERSION or
+                data['identity'] != identity or
+                data['layout'] != layout_digest(layout)):
+            _LOGGER.info("Ignoring snapshot file %s of another device or "
+                         "layout", path)
+            return None
+        return RegisterSnapshot(layout, data['words'],
+                                float(data['timestamp']))
+    except (KeyError, TypeError, ValueError, OverflowError) as exc:
+        _LOGGER.warning("Ignoring snapshot file %s: %s", path, exc)
+        return None
@@ -0,0 +1,135 @@
+"""
+Typed device status of block 3.
+
+:class:`DeviceStatus` holds the three system status registers decoded from
+one snapshot: the operating status bits as :class:`OperatingStatus` flags,
+the fault status and the CAN bus status as enums.
+"""
+
+import enum
+from collections import namedtuple
+
+from .pystiebeleltron import (
+    B3_BUS_STATUS, B3_FAULT_STATUS, B3_OPERATING_STATUS, UNAVAILABLE_OBJECT)
+
+# Raw word of an unavailable object
+UNAVAILABLE = UNAVAILABLE_OBJECT
+
+STATUS_REGISTERS = ('OPERATING_STATUS', 'FAULT_STATUS', 'BUS_STATUS')
+
+
+def _member_name(name: str) -> str:
+    """Return the enum member name of a name of the register maps."""
+    return name.replace('-', '_').replace(' ', '_')
+
+
+class _StatusFlag(enum.IntFlag):
+    """Flags built from a register map."""
+
+    @classmethod
+    def from_name(cls, name: str):
+        """Return the flag of a name of the register map."""
+        return cls[_member_name(name)]
+
+
+class _StatusEnum(enum.IntEnum):
+    """Enum built from a register map."""
+
+    @classmethod
+    def from_name(cls, name: str):
+        """Return the member of a name of the register map."""
+        return cls[_member_name(name)]
+
+
+def _members(register_map: dict) -> dict:
+    return {_member_name(name): value for name, value in register_map.items()}
+
+
+# Bits of the operating status
+OperatingStatus = _StatusFlag('OperatingStatus', _members(B3_OPERATING_STATUS),
+                              module=__name__)
+
+# All filter alarms
+FILTER_ALARM = (OperatingStatus.FILTER | OperatingStatus.FILTER_EXTRACT_AIR |
+                OperatingStatus.FILTER_VENTILATION_AIR)
+
+# Fault status
+FaultStatus = _StatusEnum('FaultStatus', _members(B3_FAULT_STATUS),
+                          module=__name__)
+
+# CAN bus status, negative values of the signed register
+BusStatus = _StatusEnum('BusStatus', _members(B3_BUS_STATUS), module=__name__)
+
+
+def _enum_value(enum_type, value):
+    """Return the enum member of a value or the plain int if unknown."""
+    try:
+        return enum_type(value)
+    except ValueError:
+        return value
+
+
+class DeviceStatus(namedtuple(
+        'DeviceStatus', ['operating', 'fault', 'bus', 'timestamp'])):
+    """Decoded system status, None of unavailable registers."""
+
+    __slots__ = ()
+
+    @classmethod
+    def from_words(cls, operating, fault, bus, timestamp=None):
+        """Decode the raw words of the three status registers.
+
+        Args:
+            operating: Raw word of OPERATING_STATUS or None.
+            fault: Raw word of FAULT_STATUS or None.
+            bus: Raw word of BUS_STATUS (signed) or None.
+            timestamp: Time of the poll.
+        """
+        if operating is not None and operating != UNAVAILABLE:
+            operating = OperatingStatus(operating)
+        else:
+            operating = None
+        if fault is not None and fault != UNAVAILABLE:
+            fault = _enum_value(FaultStatus, fault)
+        else:
+            fault = None
+        if bus is not None and bus != UNAVAILABLE:
+            bus = _enum_value(BusStatus, bus - 0x10000 if bus & 0x8000
+                              else bus)
+        else:
+            bus = None
+        return cls(operating, fault, bus, timestamp)
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """Decode the status registers of a snapshot.
+
+        Registers missing in the layout of the snapshot decode to None.
+        """
+        words = [snapshot.raw(name) if name in snapshot else None
+                 for name in STATUS_REGISTERS]
+        return cls.from_words(*words, timestamp=snapshot.timestamp)
+
+    def _has(self, flags) -> bool:
+        return self.operating is not None and bool(self.operating & flags)
+
+    @property
+    def heating(self) -> bool:
+        """Return whether the unit is heating."""
+        return self._has(OperatingStatus.HEATING)
+
+    @property
+    def cooling(self) -> bool:
+        """Return whether the unit is cooling."""
+        return self._has(OperatingStatus.COOLING)
+
+    @property
+    def filter_alarm(self) -> bool:
+        """Return whether a filter needs to be changed."""
+        return self._has(FILTER_ALARM)
+
+    @property
+    def ok(self) -> bool:
+        """Return whether neither a fault nor a bus error is reported."""
+        return (self.fault == FaultStatus.NO_FAULT and
+                self.bus == BusStatus.STATUS_OK)
@@ -0,0 +1,137 @@
+"""
+Change notifications for register values and status bits.
+
+Subscribers are notified only when the value of their register or status
+bit changes between two snapshots. Analog values can have a deadband: the
+change is only reported once the value moved at least that much away from
+the last reported value. All comparisons are done on the raw words.
+"""
+
+import time
+from collections import namedtuple
+
+from .decoder import decode_word, to_signed
+
+Change = namedtuple('Change', ['name', 'value', 'previous', 'timestamp'])
+Change.__doc__ = """Changed value of a register or status bit.
+
+`previous` is the last reported value, None for the first report.
+`timestamp` is the time the change was detected."""
+
+
+class _Subscription():
+    """A callback waiting for changes of one register or bit."""
+
+    __slots__ = ('name', 'decoder', 'mask', 'deadband', 'callback', 'last')
+
+    def __init__(self, name, decoder, mask, deadband, callback):
+        self.name = name
+        self.decoder = decoder
+        self.mask = mask
+        self.deadband = deadband
+        self.callback = callback
+        # Last reported raw word
+        self.last = None
+
+    def value(self, word):
+        """Convert a raw word to the reported value."""
+        if word is None:
+            return None
+        if self.mask is not None:
+            return bool(word & self.mask)
+        return decode_word(word, self.decoder)
+
+    def check(self, word, timestamp):
+        """Notify the callback if the word changed."""
+        last = self.last
+        if last is not None:
+            if self.mask is not None:
+                if not (word ^ last) & self.mask:
+                    return
+            elif word == last:
+                return
+            elif (self.deadband and
+                  word not in self.decoder.error_words and
+                  last not in self.decoder.error_words):
+                if self.decoder.signed:
+                    delta = abs(to_signed(word) - to_signed(last))
+                else:
+                    delta = abs(word - last)
+                if delta < self.deadband:
+                    return
+        self.last = word
+        self.callback(Change(self.name, self.value(word), self.value(last),
+                             timestamp))
+
+
+class SubscriptionManager():
+    """Dispatch snapshot changes to subscribers."""
+
+    def __init__(self, decoders, bits=None):
+        """Initialize the manager.
+
+        Args:
+            decoders: :class:`pystiebeleltron.decoder.DecoderTable`.
+            bits: Dict of register name to dict of bit name to bit mask.
+        """
+        self._decoders = decoders
+        self._bits = {}
+        for register, masks in (bits or {}).items():
+            for bit, mask in masks.items():
+                self._bits[bit] = (register, mask)
+        self._by_offset = {}
+
+    def __bool__(self) -> bool:
+        return bool(self._by_offset)
+
+    def subscribe(self, name, callback, snapshot, deadband=None):
+        """Call `callback` with a :class:`Change` when `name` changes.
+
+        Args:
+            name: Register name or status bit name.
+            callback: Callable receiving a :class:`Change`.
+            snapshot: Current snapshot, its value counts as reported.
+            deadband: Minimum change of an analog value to be reported.
+
+        Returns:
+            Callable removing the subscription.
+        """
+        mask = None
+        register = name
+        if name not in self._decoders and name in self._bits:
+            register, mask = self._bits[name]
+            if deadband is not None:
+                raise ValueError("Status bits do not support a deadband")
+        decoder = self._decoders.get(register)
+        if decoder is None:
+            raise KeyError(name)
+
+        raw_deadband = None
+        if deadband is not None:
+            raw_deadband = deadband / decoder.multiplier
+        subscription = _Subscription(name, decoder, mask, raw_deadband,
+                                     callback)
+        if snapshot.timestamp is not None:
+            subscription.last = snapshot.words[decoder.offset]
+        self._by_offset.setdefault(decoder.offset, []).append(subscription)
+
+        def unsubscribe():
+            subscriptions = self._by_offset.get(decoder.offset, [])
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+                if not subscriptions:
+                    del self._by_offset[decoder.offset]
+
+        return unsubscribe
+
+    def dispatch(self, previous, snapshot):
+        """Notify the subscribers of values changed between two snapshots."""
+        words = snapshot.words
+        if previous.timestamp is not None and words == previous.words:
+            return
+        timestamp = time.time()
+        for offset, subscriptions in list(self._by_offset.items()):
+            word = words[offset]
+            for subscription in list(subscriptions):
+                if subscription.last != word:
+                    subscription.check(word, timestamp)
@@ -0,0 +1,192 @@
+"""
+Batched writes of holding registers.
+
+A write transaction collects several writes to block 2, validates them
+against the data types of the registers, drops writes of values the last
+snapshot already holds and sends contiguous runs as one ``write_registers``
+request (function 16). Single registers are written with ``write_register``
+(function 6). Optionally the written registers are read back to confirm the
+values landed. The read-backs are sent with READ_BACK priority, so they
+overtake queued polls like the writes, and the time to a confirmed write is
+reported to the metrics hook as 'confirmed_write'.
+
+Example::
+
+    with api.transaction() as tx:
+        tx.set('ROOM_TEMP_HEAT_DAY_HC1', 21.5)
+        tx.set('ROOM_TEMP_HEAT_NIGHT_HC1', 18.0)
+        tx.set('MANUAL_SET_TEMP_HC1', 20.0)
+    assert tx.verified
+"""
+
+import time
+from collections import namedtuple
+
+from .connection import (
+    COMMUNICATION_ERRORS, READ_BACK, WRITE, request_priority)
+from .planner import ReadRequest
+from .snapshot import HOLDING_REGISTERS
+
+WriteRequest = namedtuple('WriteRequest', ['address', 'values', 'offset'])
+WriteRequest.__doc__ = """Contiguous write of holding registers.
+
+`offset` is the position of the first word in the snapshot."""
+
+
+def _response_ok(response) -> bool:
+    """Return whether there is a pymodbus response and it is no error."""
+    if response is None:
+        return False
+    is_error = getattr(response, 'isError', None)
+    return is_error is None or not is_error()
+
+
+class BaseWriteTransaction():
+    """Collect holding register writes and plan their batches."""
+
+    def __init__(self, api, verify=True, skip_unchanged=True):
+        """Initialize the transaction.
+
+        Args:
+            api: The API to write to.
+            verify: Read the written registers back on commit.
+            skip_unchanged: Drop writes of values the last poll returned.
+        """
+        self._api = api
+        self._verify = verify
+        self._skip_unchanged = skip_unchanged
+        self._writes = {}
+        self.verified = None
+
+    def set(self, name: str, value):
+        """Add the write of a converted value.
+
+        Raises:
+            KeyError: If the register is unknown.
+            ValueError: If the register is not writable or the value is out
+                of range.
+        """
+        address, offset, word = self._api.encode_write(name, value)
+        self._writes[offset] = (address, word)
+
+    def plan(self) -> list:
+        """Return the write requests of the transaction.
+
+        Writes are only skipped against values of a poll, not against stale
+        values loaded from the snapshot file.
+        """
+        snapshot = self._api.snapshot
+        skip = (self._skip_unchanged and snapshot.timestamp is not None and
+                not self._api.stale)
+        runs = []
+        for offset in sorted(self._writes):
+            address, word = self._writes[offset]
+            if skip and snapshot.words[offset] == word:
+                continue
+            if runs:
+                last = runs[-1]
+                if last.address + len(last.values) == address:
+                    last.values.append(word)
+                    continue
+            runs.append(WriteRequest(address, [word], offset))
+        return runs
+
+    @staticmethod
+    def _read_request(run: WriteRequest) -> ReadRequest:
+        return ReadRequest(HOLDING_REGISTERS, run.address, len(run.values),
+                           run.offset)
+
+    def _write(self, run: WriteRequest):
+        return self._api.write_registers(run.address, run.values)
+
+    def _observe_confirmed(self, start: float):
+        """Report the latency of a verified commit."""
+        metrics = self._api.metrics
+        if self.verified and metrics is not None:
+            metrics.observe_duration('confirmed_write',
+                                     time.perf_counter() - start)
+
+    def _verify_runs(self, runs, results) -> bool:
+        """Compare read back words and store them in the snapshot."""
+        self._api.patch_snapshot(
+            (run.offset, words) for run, words in zip(runs, results))
+        return all(list(words) == run.values
+                   for run, words in zip(runs, results))
+
+
+class WriteTransaction(BaseWriteTransaction):
+    """Collect holding register writes and send them in batches."""
+
+    def commit(self) -> bool:
+        """Send the writes.
+
+        Returns:
+            False if a write failed or a value could not be verified.
+        """
+        with request_priority(WRITE), self._api.lock:
+            return self._commit()
+
+    def _commit(self) -> bool:
+        start = time.perf_counter()
+        runs = self.plan()
+        self._writes.clear()
+        self.verified = None
+        try:
+            if not all(_response_ok(self._write(run)) for run in runs):
+                self.verified = False
+                return False
+            if not self._verify or not runs:
+                return True
+            with request_priority(READ_BACK):
+                results = [self._api.read_registers(self._read_request(run))
+                           for run in runs]
+        except COMMUNICATION_ERRORS as exc:
+            self.verified = False
+            self._api.request_failed(exc, 'write')
+            return False
+        self.verified = self._verify_runs(runs, results)
+        self._observe_confirmed(start)
+        return self.verified
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+
+
+class AsyncWriteTransaction(BaseWriteTransaction):
+    """Write transaction of an :class:`AsyncStiebelEltronAPI`."""
+
+    async def commit(self) -> bool:
+        """Send the writes."""
+        start = time.perf_counter()
+        runs = self.plan()
+        self._writes.clear()
+        self.verified = None
+        try:
+            for run in runs:
+                if not _response_ok(await self._write(run)):
+                    self.verified = False
+                    return False
+            if not self._verify or not runs:
+                return True
+            with request_priority(READ_BACK):
+                results = [
+                    await self._api.read_registers(self._read_request(run))
+                    for run in runs]
+        except COMMUNICATION_ERRORS as exc:
+            self.verified = False
+            self._api.request_failed(exc, 'write')
+            return False
+        self.verified = self._verify_runs(runs, results)
+        self._observe_confirmed(start)
+        return self.verified
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            await self.commit()
@@ -0,0 +1,137 @@
+"""
+Vectorized decoding of raw register blocks with NumPy.
+
+Decodes many stored snapshots at once, e.g. for history backfills. The input
+is an (N, registers) array of raw unsigned words of blocks 1 to 3 in the
+order of :data:`pystiebeleltron.pystiebeleltron.REGISTER_LAYOUT`. The result
+holds one float array per data type, scaled and sign corrected like
+:meth:`StiebelEltronAPI.get_conv_val`, with error values masked to NaN.
+
+NumPy is an optional dependency: ``pip install pystiebeleltron[numpy]``.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from .pystiebeleltron import DECODER_TABLE
+from .status import OperatingStatus, UNAVAILABLE
+
+DecodedColumns = namedtuple('DecodedColumns', ['names', 'values'])
+
+# Status columns, valid is False in rows with an unavailable register
+StatusColumns = namedtuple('StatusColumns',
+                           ['operating', 'fault', 'bus', 'valid'])
+
+_TypePlan = namedtuple(
+    '_TypePlan', ['names', 'offsets', 'multiplier', 'signed', 'error_words'])
+
+_PLANS = {}
+
+
+def _type_plans(decoders):
+    """Group the registers of a decoder table by data type."""
+    plans = _PLANS.get(decoders)
+    if plans is None:
+        by_type = {}
+        for decoder in decoders.decoders.values():
+            by_type.setdefault(decoder.type, []).append(decoder)
+        plans = {}
+        for data_type, entries in sorted(by_type.items()):
+            first = entries[0]
+            plans[data_type] = _TypePlan(
+                names=tuple(entry.name for entry in entries),
+                offsets=np.array([entry.offset for entry in entries],
+                                 dtype=np.intp),
+                multiplier=first.multiplier,
+                signed=first.signed,
+                error_words=np.array(sorted(first.error_words),
+                                     dtype=np.uint16))
+        _PLANS[decoders] = plans
+    return plans
+
+
+def as_word_array(words, decoders=DECODER_TABLE):
+    """Return the words as (N, registers) uint16 array."""
+    raw = np.asarray(words, dtype=np.uint16)
+    if raw.ndim == 1:
+        raw = raw.reshape(1, -1)
+    if raw.ndim != 2 or raw.shape[1] != decoders.layout.size:
+        raise ValueError(f"Expected an (N, {decoders.layout.size}) array of "
+                         f"register words, got {raw.shape}")
+    return raw
+
+
+def stack_snapshots(snapshots):
+    """Stack the raw words of snapshots into an (N, registers) array."""
+    return np.array([np.frombuffer(snapshot.words, dtype=np.uint16)
+                     for snapshot in snapshots], dtype=np.uint16)
+
+
+def _decode_columns(columns, plan: _TypePlan):
+    """Scale and sign correct raw columns, mask error values with NaN."""
+    if plan.signed:
+        values = columns.view(np.int16).astype(np.float64)
+    else:
+        values = columns.astype(np.float64)
+    if plan.multiplier != 1:
+        values *= plan.multiplier
+    if plan.error_words.size:
+        values[np.isin(columns, plan.error_words)] = np.nan
+    return values
+
+
+def decode_blocks(words, decoders=DECODER_TABLE) -> dict:
+    """Decode the raw words of many snapshots.
+
+    Args:
+        words: (N, registers) array of raw unsigned register words.
+        decoders: Decoder table of the layout of the words.
+
+    Returns:
+        Dict of data type to :class:`DecodedColumns`, the values being an
+        (N, registers of the type) float64 array.
+    """
+    raw = as_word_array(words, decoders)
+    return {
+        data_type: DecodedColumns(
+            plan.names, _decode_columns(raw[:, plan.offsets], plan))
+        for data_type, plan in _type_plans(decoders).items()}
+
+
+def decode_register(words, name: str, decoders=DECODER_TABLE):
+    """Decode the column of a single register as float64 array."""
+    decoder = decoders.decoders[name]
+    plan = _type_plans(decoders)[decoder.type]
+    column = as_word_array(words, decoders)[:, decoder.offset]
+    return _decode_columns(column, plan)
+
+
+def decode_status(words, decoders=DECODER_TABLE) -> StatusColumns:
+    """Decode the status registers of many snapshots.
+
+    Args:
+        words: (N, registers) array of raw unsigned register words.
+        decoders: Decoder table of the layout of the words.
+
+    Returns:
+        :class:`StatusColumns` of the raw operating status bits (uint16),
+        fault and bus status (int16) and the valid rows. Test bits with
+        e.g. ``columns.operating & OperatingStatus.HEATING``.
+    """
+    raw = as_word_array(words, decoders)
+    layout = decoders.layout
+    operating = raw[:, layout.offset('OPERATING_STATUS')]
+    fault = raw[:, layout.offset('FAULT_STATUS')]
+    bus = raw[:, layout.offset('BUS_STATUS')]
+    valid = ((operating != UNAVAILABLE) & (fault != UNAVAILABLE) &
+             (bus != UNAVAILABLE))
+    return StatusColumns(operating, fault.view(np.int16), bus.view(np.int16),
+                         valid)
+
+
+def status_bits(operating) -> dict:
+    """Return a bool array of every operating status bit by name."""
+    operating = np.asarray(operating, dtype=np.uint16)
+    return {flag.name: (operating & flag.value) != 0
+            for flag in OperatingStatus}
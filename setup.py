@@ -46,11 +46,13 @@ setup(
     license='MIT',
     python_requires='>=3.8',
     install_requires=['pymodbus>=3.1.0'],
+    extras_require={'numpy': ['numpy']},
     tests_require=['tox'],
     cmdclass={'test': Tox},
     packages=find_packages(exclude=('test', 'test.*')),
     zip_safe=True,
     include_package_data=True,
+    package_data={'pystiebeleltron': ['models/*.json']},
     # https://pypi.org/classifiers/
     classifiers=[
         'Development Status :: 3 - Alpha',
@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+"""
+Benchmarks of pystiebeleltron against the mock Modbus server.
+
+Measures polls per second and update latency percentiles for 1 to N
+simulated devices, decode throughput, memory per API instance and the time
+and memory to import the core modules. The mock server can inject
+latency, jitter and packet loss. Results are written as
+JSON to compare runs and catch performance regressions.
+
+Run from the repository root, e.g.::
+
+    python -m test.benchmark --devices 1 10 50 --latency 0.01 \\
+        --jitter 0.005 --loss 0.01 --duration 5 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from threading import Thread
+
+from pymodbus.client import AsyncModbusTcpClient, ModbusTcpClient
+
+from pystiebeleltron import pystiebeleltron as pyse
+from pystiebeleltron.async_api import AsyncStiebelEltronAPI
+from test.fake_modbus_client import FakeModbusClient
+from test.mock_modbus_server import MockModbusServer
+
+HOST = "127.0.0.1"
+
+
+def percentile(values, fraction):
+    """ Return the value below which `fraction` of the values fall. """
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1,
+                max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def latency_summary(latencies):
+    """ Summarize latencies in seconds. """
+    return {
+        'p50': percentile(latencies, 0.50),
+        'p99': percentile(latencies, 0.99),
+        'mean': statistics.mean(latencies) if latencies else None,
+        'max': max(latencies) if latencies else None,
+    }
+
+
+def start_server(args, port, devices):
+    """ Start a mock server in a thread and wait until it accepts. """
+    server = MockModbusServer(port=port, devices=devices,
+                              latency=args.latency, jitter=args.jitter,
+                              loss=args.loss)
+    thread = Thread(target=server.run_async_server, name="MockModbusServer",
+                    daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((HOST, port), timeout=0.1).close()
+            return server, thread
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("Mock server did not start on port {}".format(port))
+
+
+def stop_server(server, thread):
+    server.stop_async_server()
+    thread.join(timeout=5)
+
+
+async def bench_async_polling(port, devices, duration, timeout):
+    """ Poll `devices` slaves concurrently, one connection each. """
+    clients = [AsyncModbusTcpClient(HOST, port=port, timeout=timeout,
+                                    retries=0)
+               for _ in range(devices)]
+    for client in clients:
+        await client.connect()
+    apis = [AsyncStiebelEltronAPI(client, slave if devices > 1 else 1)
+            for slave, client in enumerate(clients, start=1)]
+    latencies = []
+    failures = 0
+    end = time.monotonic() + duration
+
+    async def poll(api, client):
+        nonlocal failures
+        while time.monotonic() < end:
+            start = time.perf_counter()
+            if await api.update():
+                latencies.append(time.perf_counter() - start)
+            else:
+                failures += 1
+                if not client.connected:
+                    await client.connect()
+
+    start = time.monotonic()
+    await asyncio.gather(*(poll(api, client)
+                           for api, client in zip(apis, clients)))
+    elapsed = time.monotonic() - start
+    for client in clients:
+        client.close()
+
+    result = {
+        'devices': devices,
+        'polls': len(latencies),
+        'failures': failures,
+        'polls_per_second': len(latencies) / elapsed,
+    }
+    result.update(latency_summary(latencies))
+    return result
+
+
+def bench_sync_polling(port, duration, timeout):
+    """ Poll one device with the synchronous client. """
+    client = ModbusTcpClient(HOST, port=port, timeout=timeout, retries=0)
+    client.connect()
+    api = pyse.StiebelEltronAPI(client, 1)
+    latencies = []
+    failures = 0
+    start = time.monotonic()
+    while time.monotonic() - start < duration:
+        poll_start = time.perf_counter()
+        if api.update():
+            latencies.append(time.perf_counter() - poll_start)
+        else:
+            failures += 1
+            if not client.connected:
+                client.connect()
+    elapsed = time.monotonic() - start
+    client.close()
+
+    result = {
+        'devices': 1,
+        'polls': len(latencies),
+        'failures': failures,
+        'polls_per_second': len(latencies) / elapsed,
+    }
+    result.update(latency_summary(latencies))
+    return result
+
+
+def bench_decode(iterations):
+    """ Measure decode throughput on a populated snapshot. """
+    client = FakeModbusClient()
+    client.input.update((address, address) for address in range(33))
+    client.holding.update((1000 + i, i) for i in range(27))
+    client.input[2000] = 4
+    api = pyse.StiebelEltronAPI(client)
+    api.update()
+    names = list(pyse.REGISTER_LAYOUT.index)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for name in names:
+            api.get_conv_val(name)
+    get_conv_val = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        api.get_all_converted()
+    get_all_converted = time.perf_counter() - start
+
+    return {
+        'get_conv_val_per_second': iterations * len(names) / get_conv_val,
+        'get_all_converted_per_second': iterations / get_all_converted,
+    }
+
+
+def bench_memory(instances):
+    """ Measure the memory of API instances holding a snapshot. """
+    client = FakeModbusClient()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    apis = []
+    for _ in range(instances):
+        api = pyse.StiebelEltronAPI(client)
+        api.update()
+        apis.append(api)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in
+                    after.compare_to(before, 'filename'))
+    return {
+        'instances': instances,
+        'bytes_per_instance': allocated / instances,
+    }
+
+
+CORE_MODULES = ('pystiebeleltron.pystiebeleltron', 'pystiebeleltron.registers',
+                'pystiebeleltron.decoder', 'pystiebeleltron.snapshot',
+                'pystiebeleltron.status')
+
+_IMPORT_SCRIPT = """
+import importlib, json, resource, sys, time, tracemalloc
+trace = sys.argv[1] == 'trace'
+if trace:
+    tracemalloc.start()
+start = time.perf_counter()
+for name in sys.argv[2:]:
+    importlib.import_module(name)
+seconds = time.perf_counter() - start
+json.dump({
+    'seconds': seconds,
+    'allocated_kib': tracemalloc.get_traced_memory()[0] / 1024,
+    'max_rss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modules': len(sys.modules),
+    'pymodbus': sorted(name for name in sys.modules
+                       if name.split('.')[0] == 'pymodbus'),
+}, sys.stdout)
+"""
+
+
+def _run_import(trace, modules):
+    output = subprocess.run(
+        [sys.executable, '-c', _IMPORT_SCRIPT, trace] + list(modules),
+        check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def bench_import(modules=CORE_MODULES):
+    """ Measure importing modules in a fresh interpreter.
+
+    The time is measured without tracing, the memory allocated by the
+    imports in a second interpreter with tracemalloc.
+    """
+    result = _run_import('time', modules)
+    result['allocated_kib'] = _run_import('trace', modules)['allocated_kib']
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--devices', type=int, nargs='+', default=[1, 10],
+                        help="simulated device counts to benchmark")
+    parser.add_argument('--duration', type=float, default=3.0,
+                        help="seconds of polling per device count")
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="injected mean latency per request (s)")
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help="injected latency jitter (s)")
+    parser.add_argument('--loss', type=float, default=0.0,
+                        help="probability of a dropped request")
+    parser.add_argument('--timeout', type=float, default=1.0,
+                        help="client timeout (s)")
+    parser.add_argument('--port', type=int, default=5020,
+                        help="first TCP port of the mock servers")
+    parser.add_argument('--decode-iterations', type=int, default=10000)
+    parser.add_argument('--memory-instances', type=int, default=1000)
+    parser.add_argument('--output', help="JSON output file, default stdout")
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.CRITICAL)
+
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.time(),
+        },
+        'config': {key: value for key, value in vars(args).items()
+                   if key != 'output'},
+        'decode': bench_decode(args.decode_iterations),
+        'memory': bench_memory(args.memory_instances),
+        'import': bench_import(),
+        'polling': [],
+    }
+
+    port = args.port
+    server, thread = start_server(args, port, 1)
+    try:
+        results['sync_polling'] = bench_sync_polling(port, args.duration,
+                                                     args.timeout)
+    finally:
+        stop_server(server, thread)
+
+    for devices in args.devices:
+        port += 1
+        server, thread = start_server(args, port, devices)
+        try:
+            results['polling'].append(asyncio.run(bench_async_polling(
+                port, devices, args.duration, args.timeout)))
+        finally:
+            stop_server(server, thread)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+
+
+if __name__ == "__main__":
+    main()
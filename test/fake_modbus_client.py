@@ -0,0 +1,113 @@
+"""In-memory stand-ins for the pymodbus clients.
+
+The fakes keep holding and input registers in plain dicts and mimic the
+subset of the pymodbus client interface used by the API classes.
+"""
+import asyncio
+import time
+
+
+class FakeResponse(object):
+    """Successful register response."""
+
+    def __init__(self, registers=None):
+        self.registers = registers or []
+
+    def isError(self):
+        return False
+
+
+class FakeErrorResponse(object):
+    """Error response, it has no registers like the pymodbus one."""
+
+    def isError(self):
+        return True
+
+
+class FakeModbusClient(object):
+    """Synchronous fake of ``ModbusTcpClient``."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.connected = True
+        self.fail_reads = False
+        self.holding = {}
+        self.input = {}
+        self.requests = []
+
+    def connect(self):
+        self.connected = True
+        return True
+
+    def close(self):
+        self.connected = False
+
+    def _read(self, table, function_code, address, count, slave):
+        self.requests.append((function_code, address, count, slave))
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail_reads:
+            return FakeErrorResponse()
+        return FakeResponse([table.get(address + i, 0) for i in range(count)])
+
+    def _write(self, function_code, address, values, slave):
+        self.requests.append((function_code, address, len(values), slave))
+        if self.delay:
+            time.sleep(self.delay)
+        for i, value in enumerate(values):
+            self.holding[address + i] = value
+        return FakeResponse()
+
+    def read_input_registers(self, address, count=1, slave=0):
+        return self._read(self.input, 4, address, count, slave)
+
+    def read_holding_registers(self, address, count=1, slave=0):
+        return self._read(self.holding, 3, address, count, slave)
+
+    def write_register(self, address, value, slave=0):
+        return self._write(6, address, [value], slave)
+
+    def write_registers(self, address, values, slave=0):
+        return self._write(16, address, list(values), slave)
+
+
+class FakeAsyncModbusClient(FakeModbusClient):
+    """Asynchronous fake of ``AsyncModbusTcpClient``.
+
+    Every request awaits ``delay`` seconds, so concurrent requests overlap
+    like pipelined requests on a real connection.
+    """
+
+    def __init__(self, delay=0.0):
+        super().__init__()
+        self.async_delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def connect(self):
+        self.connected = True
+        return True
+
+    async def _wait(self):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.async_delay)
+        finally:
+            self.in_flight -= 1
+
+    async def read_input_registers(self, address, count=1, slave=0):
+        await self._wait()
+        return super().read_input_registers(address, count, slave)
+
+    async def read_holding_registers(self, address, count=1, slave=0):
+        await self._wait()
+        return super().read_holding_registers(address, count, slave)
+
+    async def write_register(self, address, value, slave=0):
+        await self._wait()
+        return super().write_register(address, value, slave)
+
+    async def write_registers(self, address, values, slave=0):
+        await self._wait()
+        return super().write_registers(address, values, slave)
@@ -10,6 +10,9 @@ of nodes which can be helpful for testing monitoring software.
 # --------------------------------------------------------------------------- #
 # import the various server implementations
 # --------------------------------------------------------------------------- #
+import asyncio
+import random
+
 from pymodbus.server import StartTcpServer, ServerStop
 
 from pymodbus.device import ModbusDeviceIdentification
@@ -17,7 +20,56 @@ from pymodbus.datastore import ModbusSequentialDataBlock
 from pymodbus.datastore import ModbusSlaveContext, ModbusServerContext
 
 
+class DelayedResponses(object):
+    """ Mixin of a slave context answering after an injected latency.
+
+    The context sets ``latency``, the mean delay of every request in
+    seconds, and ``jitter``, the delay varies uniformly by +/- jitter.
+    """
+
+    latency = 0.0
+    jitter = 0.0
+
+    def response_delay(self):
+        return self.latency + random.uniform(-self.jitter, self.jitter)
+
+    async def _delay(self):
+        delay = self.response_delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def async_getValues(self, fc_as_hex, address, count=1):
+        await self._delay()
+        return self.getValues(fc_as_hex, address, count)
+
+    async def async_setValues(self, fc_as_hex, address, values):
+        await self._delay()
+        self.setValues(fc_as_hex, address, values)
+
+
+class DelayedSlaveContext(DelayedResponses, ModbusSlaveContext):
+    """ Slave context answering after an injected latency.
+
+    :param latency: Mean delay of every request in seconds
+    :param jitter: The delay varies uniformly by +/- jitter seconds
+    """
+
+    def __init__(self, *args, latency=0.0, jitter=0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latency = latency
+        self.jitter = jitter
+
+
 class MockModbusServer(object):
+    """ Modbus TCP server mocking one or several ISGs.
+
+    :param port: TCP port to listen on
+    :param devices: Number of slaves, with more than one device the slaves
+                    1 to devices get their own registers
+    :param latency: Mean delay of every request in seconds
+    :param jitter: The delay varies uniformly by +/- jitter seconds
+    :param loss: Probability of a request being dropped without response
+    """
     # --------------------------------------------------------------------------- #
     # configure the service logging
     # --------------------------------------------------------------------------- #
@@ -28,6 +80,27 @@ class MockModbusServer(object):
     log = logging.getLogger()
     log.setLevel(logging.DEBUG)
 
+    def __init__(self, port=5020, devices=1, latency=0.0, jitter=0.0,
+                 loss=0.0):
+        self.port = port
+        self.devices = devices
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.context = None
+
+    def _create_store(self):
+        return DelayedSlaveContext(
+            hr=ModbusSequentialDataBlock(0, [0]*3000),
+            ir=ModbusSequentialDataBlock(0, [0]*3000),
+            latency=self.latency, jitter=self.jitter)
+
+    def _drop_response(self, response):
+        """ Response manipulator dropping a share of the responses. """
+        if random.random() < self.loss:
+            response.should_respond = False
+        return response, False
+
     def run_async_server(self):
         # ----------------------------------------------------------------------- #
         # initialize your data store
@@ -83,10 +156,13 @@ class MockModbusServer(object):
         #
         #     store = ModbusSlaveContext(..., zero_mode=True)
         # ----------------------------------------------------------------------- #
-        store = ModbusSlaveContext(
-            hr=ModbusSequentialDataBlock(0, [0]*3000),
-            ir=ModbusSequentialDataBlock(0, [0]*3000))
-        self.context = ModbusServerContext(slaves=store, single=True)
+        if self.devices == 1:
+            self.context = ModbusServerContext(slaves=self._create_store(),
+                                               single=True)
+        else:
+            slaves = {slave: self._create_store()
+                      for slave in range(1, self.devices + 1)}
+            self.context = ModbusServerContext(slaves=slaves, single=False)
 
         # ----------------------------------------------------------------------- #
         # initialize the server information
@@ -106,12 +182,15 @@ class MockModbusServer(object):
         # ----------------------------------------------------------------------- #
 
         # TCP Server
-        StartTcpServer(self.context, identity=identity, address=("localhost", 5020))
+        response_manipulator = self._drop_response if self.loss else None
+        StartTcpServer(context=self.context, identity=identity,
+                       address=("localhost", self.port),
+                       response_manipulator=response_manipulator)
 
     def stop_async_server(self):
         ServerStop()
 
-    def update_context(self, register, address, values):
+    def update_context(self, register, address, values, slave_id=0x00):
         """ Update values of the active context. It should be noted
         that there is a race condition for the update.
 
@@ -120,9 +199,9 @@ class MockModbusServer(object):
                             4: input register
         :param address: The starting address of the value to be changed
         :param values: List of values
+        :param slave_id: Slave to update, if there are several devices
         """
         assert register == 3 or register == 4
-        slave_id = 0x00
         old_values = self.context[slave_id].getValues(register,
                                                       address, count=1)
         self.log.debug("Change value at address {} from {} to {}".format(
@@ -0,0 +1,487 @@
+#!/usr/bin/env python
+"""
+Simulator of many Stiebel Eltron ISGs for load tests.
+
+Every :class:`VirtualHeatPump` keeps the registers of blocks B1, B2 and B3
+of one device and evolves them over (simulated) time: the outside
+temperature follows a daily cycle, the compressor heats the heating circuit
+with hysteresis, hot water cools down and is reheated with priority, the
+status bits of B3 follow the plant and settings written to B2 are honoured.
+Registers of components the device does not have (HC2, ventilation, solar)
+read as the unavailable object sentinel 0x8000.
+
+The model only evolves when a device is read or written, so an idle
+simulator costs nothing and one process can serve thousands of devices.
+
+:class:`IsgSimulator` serves the devices over Modbus TCP, as slaves 1 to N
+on one or more ports, and emulates slow and dropped responses. Run it
+standalone from the repository root, e.g.::
+
+    python -m test.simulator --ports 5020 5021 --devices 50 --speed 60
+"""
+import argparse
+import asyncio
+import logging
+import math
+import random
+import time
+from threading import Event, Thread
+
+from pymodbus.datastore import ModbusServerContext
+from pymodbus.datastore.context import ModbusBaseSlaveContext
+from pymodbus.server import ModbusTcpServer
+
+from pystiebeleltron import pystiebeleltron as pyse
+from pystiebeleltron.decoder import decode_word, encode_value
+from test.mock_modbus_server import DelayedResponses
+
+_LOGGER = logging.getLogger(__name__)
+
+# Registers of components a typical air source heat pump does not have
+DEFAULT_UNAVAILABLE = frozenset((
+    'ACTUAL_ROOM_TEMPERATURE_HC2', 'SET_ROOM_TEMPERATURE_HC2',
+    'RELATIVE_HUMIDITY_HC2', 'ACTUAL_VALUE_HC2', 'SET_VALUE_HC2',
+    'VENTILATION_AIR_ACTUAL_FAN_SPEED', 'VENTILATION_AIR_SET_FLOW_RATE',
+    'EXTRACT_AIR_ACTUAL_FAN_SPEED', 'EXTRACT_AIR_SET_FLOW_RATE',
+    'EXTRACT_AIR_HUMIDITY', 'EXTRACT_AIR_TEMPERATURE',
+    'EXTRACT_AIR_DEW_POINT', 'DEW_POINT_TEMPERATUR_HC2',
+    'COLLECTOR_TEMPERATURE', 'MIXED_WATER_AMOUNT'))
+
+DEFAULT_SETTINGS = {
+    'OPERATING_MODE': 11,
+    'ROOM_TEMP_HEAT_DAY_HC1': 21.0,
+    'ROOM_TEMP_HEAT_NIGHT_HC1': 18.0,
+    'MANUAL_SET_TEMP_HC1': 20.0,
+    'ROOM_TEMP_HEAT_DAY_HC2': 21.0,
+    'ROOM_TEMP_HEAT_NIGHT_HC2': 18.0,
+    'MANUAL_SET_TEAMP_HC2': 20.0,
+    'GRADIENT_HC1': 0.4,
+    'LOW_END_HC1': 0.0,
+    'GRADIENT_HC2': 0.4,
+    'LOW_END_HC2': 0.0,
+    'DHW_TEMP_SET_DAY': 50.0,
+    'DHW_TEMP_SET_NIGHT': 45.0,
+    'DHW_TEMP_SET_MANUAL': 50.0,
+    'ROOM_TEMP_COOL_DAY_HC1': 25.0,
+    'ROOM_TEMP_COOL_NIGHT_HC1': 27.0,
+    'ROOM_TEMP_COOL_DAY_HC2': 25.0,
+    'ROOM_TEMP_COOL_NIGHT_HC2': 27.0,
+}
+
+STANDBY = 1
+DHW_ONLY = 5
+EMERGENCY = 0
+
+# Largest integration step in simulated seconds
+MAX_STEP = 10.0
+# Longest simulated catch-up, a device idle for longer skips ahead
+MAX_CATCH_UP = 86400.0
+
+DHW_HYSTERESIS = 5.0
+FLOW_HYSTERESIS = 2.0
+DEFROST_INTERVAL = 7200.0
+DEFROST_DURATION = 300.0
+
+STATUS = pyse.B3_OPERATING_STATUS
+
+
+class VirtualHeatPump():
+    """ Register model of one heat pump behind an ISG.
+
+    :param seed: Seed of the random variations of this device
+    :param speed: Simulated seconds per real second
+    :param unavailable: Names of registers reading as 0x8000
+    :param clock: Function returning the real time in seconds
+    """
+
+    def __init__(self, seed=None, speed=1.0, unavailable=DEFAULT_UNAVAILABLE,
+                 clock=time.monotonic):
+        self._random = random.Random(seed)
+        self.speed = speed
+        self.unavailable = frozenset(unavailable)
+        self._clock = clock
+        self._last = clock()
+        self.elapsed = 0.0
+
+        self.outside_mean = self._random.uniform(-5.0, 10.0)
+        self.outside_amplitude = self._random.uniform(3.0, 6.0)
+        self.outside = self.outside_mean
+        self.room = self._random.uniform(19.0, 21.0)
+        self.flow = self._random.uniform(25.0, 35.0)
+        self.dhw = self._random.uniform(40.0, 50.0)
+        self.compressor = False
+        self.dhw_heating = False
+        self.compressor_starts = self._random.randrange(1000, 20000)
+        self.runtime = 0.0
+        self.defrost_until = None
+
+        self.input = {}
+        self.holding = {}
+        for name, entry in pyse.B2_REGMAP_HOLDING.items():
+            value = DEFAULT_SETTINGS.get(name, 0)
+            self.holding[entry['addr']] = self._encode(name, value)
+        self._publish()
+
+    @staticmethod
+    def _encode(name, value):
+        return encode_value(value, pyse.DECODER_TABLE.get(name))
+
+    def setting(self, name):
+        """ Return the converted value of a B2 setting. """
+        entry = pyse.B2_REGMAP_HOLDING[name]
+        return decode_word(self.holding[entry['addr']],
+                           pyse.DECODER_TABLE.get(name))
+
+    def write(self, address, values):
+        """ Write holding registers like a Modbus request. """
+        self.advance()
+        for offset, value in enumerate(values):
+            self.holding[address + offset] = value & 0xFFFF
+        self._publish()
+
+    def advance(self, now=None):
+        """ Evolve the model up to `now` (real time). """
+        now = self._clock() if now is None else now
+        remaining = min((now - self._last) * self.speed, MAX_CATCH_UP)
+        self._last = now
+        while remaining > 0:
+            step = min(remaining, MAX_STEP)
+            self.step(step)
+            remaining -= step
+        self._publish()
+
+    def step(self, dt):
+        """ Integrate the physics over `dt` simulated seconds. """
+        self.elapsed += dt
+        mode = self.setting('OPERATING_MODE')
+        room_set = self.setting('ROOM_TEMP_HEAT_DAY_HC1')
+        dhw_set = self.setting('DHW_TEMP_SET_DAY')
+
+        self.outside = (self.outside_mean + self.outside_amplitude *
+                        math.sin(2 * math.pi * self.elapsed / 86400.0) +
+                        self._random.gauss(0, 0.05))
+
+        # Hot water has priority over heating
+        if mode == STANDBY:
+            self.dhw_heating = False
+        elif self.dhw < dhw_set - DHW_HYSTERESIS:
+            self.dhw_heating = True
+        elif self.dhw >= dhw_set:
+            self.dhw_heating = False
+
+        heating = mode not in (STANDBY, DHW_ONLY) and self.outside < room_set
+        flow_set = self.flow_set(room_set)
+        if self.dhw_heating:
+            running = True
+        elif heating:
+            if self.flow < flow_set - FLOW_HYSTERESIS:
+                running = True
+            elif self.flow > flow_set + FLOW_HYSTERESIS:
+                running = False
+            else:
+                running = self.compressor
+        else:
+            running = False
+        if mode == EMERGENCY:
+            running = False
+        if running and not self.compressor:
+            self.compressor_starts += 1
+        self.compressor = running
+
+        if (self.defrost_until is not None and
+                self.elapsed >= self.defrost_until):
+            self.defrost_until = None
+        if self.compressor:
+            self.runtime += dt
+            if self.outside < 5.0 and self.runtime >= DEFROST_INTERVAL:
+                self.runtime = 0.0
+                self.defrost_until = self.elapsed + DEFROST_DURATION
+
+        # Temperatures approach their targets exponentially
+        if self.dhw_heating and self.compressor:
+            self.dhw += dt * 10.0 / 3600.0
+        else:
+            self.dhw -= dt * 0.5 / 3600.0
+        if self.compressor and not self.dhw_heating:
+            self.flow += (55.0 - self.flow) * (1 - math.exp(-dt / 1800.0))
+        elif mode == EMERGENCY and heating:
+            self.flow += (flow_set - self.flow) * (1 - math.exp(-dt / 900.0))
+        else:
+            self.flow += (self.room - self.flow) * (1 - math.exp(-dt / 3600.0))
+        gain = (self.flow - self.room) * (1 - math.exp(-dt / 36000.0))
+        loss = (self.room - self.outside) * (1 - math.exp(-dt / 72000.0))
+        self.room += 0.5 * gain - loss
+
+    def flow_set(self, room_set):
+        """ Return the flow temperature of the heating curve. """
+        gradient = self.setting('GRADIENT_HC1')
+        low_end = self.setting('LOW_END_HC1')
+        curve = room_set + low_end + 1.5 * gradient * (room_set - self.outside)
+        return min(60.0, max(room_set, curve))
+
+    def operating_status(self):
+        """ Return the bits of the OPERATING_STATUS register. """
+        mode = self.setting('OPERATING_MODE')
+        status = 0
+        if mode == 11:
+            status |= STATUS['SWITCHING_PROGRAM_ENABLED']
+        if self.compressor:
+            status |= STATUS['COMPRESSOR']
+            status |= STATUS['DHW' if self.dhw_heating else 'HEATING']
+        if mode == EMERGENCY and self.outside < 20.0:
+            status |= STATUS['ELECTRIC_REHEATING'] | STATUS['HEATING']
+        if mode not in (STANDBY, DHW_ONLY):
+            status |= STATUS['HEATING_CIRCUIT_PUMP']
+        if self.defrost_until is not None:
+            status |= STATUS['EVAPORATOR_DEFROST']
+        return status
+
+    def _publish(self):
+        """ Write the state to the input registers. """
+        running = self.compressor
+        room_set = self.setting('ROOM_TEMP_HEAT_DAY_HC1')
+        values = {
+            'ACTUAL_ROOM_TEMPERATURE_HC1': self.room,
+            'SET_ROOM_TEMPERATURE_HC1': room_set,
+            'RELATIVE_HUMIDITY_HC1': 45.0,
+            'OUTSIDE_TEMPERATURE': self.outside,
+            'ACTUAL_VALUE_HC1': self.flow,
+            'SET_VALUE_HC1': self.flow_set(room_set),
+            'FLOW_TEMPERATURE': self.flow,
+            'RETURN_TEMPERATURE': self.flow - (5.0 if running else 1.0),
+            'PRESSURE_HEATING_CIRCUIT': 1.8,
+            'FLOW_RATE': 15.0 if running else 0.0,
+            'ACTUAL_DHW_TEMPERATURE': self.dhw,
+            'SET_DHW_TEMPERATURE': self.setting('DHW_TEMP_SET_DAY'),
+            'DEW_POINT_TEMPERATUR_HC1': self.room - 9.0,
+            'HOT_GAS_TEMPERATURE': self.flow + (30.0 if running else 0.0),
+            'HIGH_PRESSURE': 25.0 if running else 12.0,
+            'LOW_PRESSURE': 5.0 if running else 12.0,
+            'COMPRESSOR_STARTS': self.compressor_starts & 0xFFFF,
+            'COMPRESSOR_SPEED': 80.0 if running else 0.0,
+        }
+        for name, entry in pyse.B1_REGMAP_INPUT.items():
+            if name in self.unavailable:
+                word = pyse.UNAVAILABLE_OBJECT
+            else:
+                word = self._encode(name, values.get(name, 0))
+            self.input[entry['addr']] = word
+        self.input[pyse.B3_REGMAP_INPUT['OPERATING_STATUS']['addr']] = \
+            self.operating_status()
+        self.input[pyse.B3_REGMAP_INPUT['FAULT_STATUS']['addr']] = 0
+        self.input[pyse.B3_REGMAP_INPUT['BUS_STATUS']['addr']] = 0
+
+
+class SimulatedSlaveContext(DelayedResponses, ModbusBaseSlaveContext):
+    """ Slave context serving the registers of a virtual heat pump.
+
+    Addresses are used as sent by the client (no offset), requests outside
+    of the register map are answered with an illegal address exception.
+
+    :param pump: The virtual heat pump
+    :param latency: Mean delay of every request in seconds
+    :param jitter: The delay varies uniformly by +/- jitter seconds
+    :param slow_rate: Probability of a slow response
+    :param slow_delay: Additional delay of a slow response in seconds
+    :param loss: Probability of a request being dropped without response
+    """
+
+    def __init__(self, pump, latency=0.0, jitter=0.0, slow_rate=0.0,
+                 slow_delay=1.0, loss=0.0):
+        self.pump = pump
+        self.latency = latency
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.loss = loss
+        self.requests = 0
+
+    def __str__(self):
+        return "Simulated ISG"
+
+    def _table(self, fc_as_hex):
+        table = self.decode(fc_as_hex)
+        if table == 'h':
+            return self.pump.holding
+        if table == 'i':
+            return self.pump.input
+        return {}
+
+    def validate(self, fc_as_hex, address, count=1):
+        table = self._table(fc_as_hex)
+        return all(address + i in table for i in range(count))
+
+    def getValues(self, fc_as_hex, address, count=1):
+        self.pump.advance()
+        table = self._table(fc_as_hex)
+        return [table[address + i] for i in range(count)]
+
+    def setValues(self, fc_as_hex, address, values):
+        if self.decode(fc_as_hex) == 'h':
+            self.pump.write(address, values)
+
+    def response_delay(self):
+        delay = super().response_delay()
+        if self.slow_rate and random.random() < self.slow_rate:
+            delay += self.slow_delay
+        return delay
+
+    async def async_getValues(self, fc_as_hex, address, count=1):
+        self.requests += 1
+        return await super().async_getValues(fc_as_hex, address, count)
+
+    async def async_setValues(self, fc_as_hex, address, values):
+        self.requests += 1
+        await super().async_setValues(fc_as_hex, address, values)
+
+
+class IsgSimulator(object):
+    """ Modbus TCP servers hosting many virtual heat pumps.
+
+    Every port serves the slaves 1 to `devices`, each with its own
+    :class:`VirtualHeatPump`. All servers run in one event loop in a
+    background thread.
+
+    :param ports: TCP ports to listen on
+    :param devices: Number of slaves per port
+    :param host: Address to listen on
+    :param speed: Simulated seconds per real second
+    :param seed: Seed of the devices, None for random devices
+    :param unavailable: Names of registers reading as 0x8000
+    :param latency, jitter, slow_rate, slow_delay, loss: Quirks of every
+        device, see :class:`SimulatedSlaveContext`
+    """
+
+    def __init__(self, ports=(5020,), devices=1, host="127.0.0.1", speed=1.0,
+                 seed=None, unavailable=DEFAULT_UNAVAILABLE, latency=0.0,
+                 jitter=0.0, slow_rate=0.0, slow_delay=1.0, loss=0.0):
+        self.host = host
+        self.ports = tuple(ports)
+        self.devices = devices
+        seeds = random.Random(seed)
+        self.contexts = {}
+        for port in self.ports:
+            for slave in range(1, devices + 1):
+                pump = VirtualHeatPump(seeds.getrandbits(32), speed,
+                                       unavailable)
+                self.contexts[(port, slave)] = SimulatedSlaveContext(
+                    pump, latency, jitter, slow_rate, slow_delay, loss)
+        self._servers = []
+        self._loop = None
+        self._thread = None
+        self._started = Event()
+        self._error = None
+
+    def pump(self, port, slave):
+        """ Return the virtual heat pump of a port and slave id. """
+        return self.contexts[(port, slave)].pump
+
+    @property
+    def targets(self):
+        """ Return (host, port, slave) tuples of all devices. """
+        return [(self.host, port, slave) for port, slave in self.contexts]
+
+    def _manipulator(self, port):
+        def drop_response(response):
+            context = self.contexts.get((port, response.slave_id))
+            if context is not None and random.random() < context.loss:
+                response.should_respond = False
+            return response, False
+        return drop_response
+
+    async def _serve(self):
+        for port in self.ports:
+            slaves = {slave: self.contexts[(port, slave)]
+                      for slave in range(1, self.devices + 1)}
+            server = ModbusTcpServer(
+                ModbusServerContext(slaves=slaves, single=False),
+                address=(self.host, port),
+                response_manipulator=self._manipulator(port))
+            self._servers.append(server)
+            if not await server.listen():
+                self._error = OSError("Cannot listen on port {}".format(port))
+                break
+        self._started.set()
+        if self._error is not None:
+            for server in self._servers:
+                await server.shutdown()
+            return
+        await asyncio.gather(*(server.serving for server in self._servers))
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._serve())
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    def start(self, timeout=10.0):
+        """ Start serving in a background thread. """
+        self._thread = Thread(target=self._run, name="IsgSimulator",
+                              daemon=True)
+        self._thread.start()
+        if not self._started.wait(timeout):
+            raise RuntimeError("Simulator did not start")
+        if self._error is not None:
+            self._thread.join(timeout)
+            raise self._error
+
+    def stop(self):
+        """ Stop all servers and the thread. """
+        async def shutdown():
+            for server in self._servers:
+                await server.shutdown()
+
+        if self._loop is not None and self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(
+                shutdown(), self._loop).result(timeout=10)
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        self._servers = []
+        self._started.clear()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Simulate Stiebel Eltron ISGs.")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--ports', type=int, nargs='+', default=[5020])
+    parser.add_argument('--devices', type=int, default=1,
+                        help="slaves per port")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="simulated seconds per real second")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--slow-rate', type=float, default=0.0)
+    parser.add_argument('--slow-delay', type=float, default=1.0)
+    parser.add_argument('--loss', type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    # The mock server module turns on debug logging when imported
+    logging.getLogger().setLevel(logging.WARNING)
+    simulator = IsgSimulator(
+        args.ports, args.devices, args.host, args.speed, args.seed,
+        latency=args.latency, jitter=args.jitter, slow_rate=args.slow_rate,
+        slow_delay=args.slow_delay, loss=args.loss)
+    simulator.start()
+    print("Simulating {} devices on {}:{}".format(
+        len(simulator.contexts), args.host, args.ports))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        simulator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+import pytest
+
+from pystiebeleltron import pystiebeleltron as pyse
+from pystiebeleltron.aggregate import (
+    DeviceAggregator, FleetAggregator, RollingWindow)
+from pystiebeleltron.snapshot import RegisterSnapshot
+
+slave = 1
+COMPRESSOR = pyse.B3_OPERATING_STATUS['COMPRESSOR']
+DHW = pyse.B3_OPERATING_STATUS['DHW']
+
+
+def snapshot(timestamp, **raw):
+    words = list(pyse.REGISTER_LAYOUT.defaults)
+    for name, value in raw.items():
+        words[pyse.REGISTER_LAYOUT.index[name]] = value & 0xFFFF
+    return RegisterSnapshot(pyse.REGISTER_LAYOUT, words, timestamp)
+
+
+class TestRollingWindow:
+    def test_stats(self):
+        window = RollingWindow(60, buckets=6)
+        for second, value in enumerate([3, -1, 4, 1, 5]):
+            window.add(1000 + second, value, duration=1)
+        stats = window.stats()
+        assert (stats.min, stats.max, stats.count) == (-1, 5, 5)
+        assert stats.mean == pytest.approx(2.4)
+        assert stats.rate(per=1) == pytest.approx(2.4)
+
+    def test_old_buckets_expire(self):
+        window = RollingWindow(60, buckets=6)
+        window.add(1000, 100)
+        window.add(1055, 1)
+        assert window.stats().max == 100
+        window.add(1065, 2)
+        assert window.stats().max == 2
+        assert window.stats(now=2000).count == 0
+        assert window.stats(now=2000).mean is None
+
+    def test_memory_is_bounded(self):
+        window = RollingWindow(60, buckets=6)
+        for second in range(10000):
+            window.add(second, second)
+        assert len(window._slots) == 6
+        assert window.stats().min >= 10000 - 70
+
+
+class TestDeviceAggregator:
+    def test_derived_metrics(self):
+        aggregator = DeviceAggregator(window=3600)
+        start = 100000.0
+        for minute in range(60):
+            status = COMPRESSOR if minute % 4 == 0 else 0
+            if 30 <= minute < 40:
+                status |= DHW
+            aggregator.add(snapshot(
+                start + minute * 60,
+                OPERATING_STATUS=status,
+                COMPRESSOR_STARTS=65530 + minute // 4,
+                FLOW_TEMPERATURE=350 + minute,
+                RETURN_TEMPERATURE=300,
+                ACTUAL_DHW_TEMPERATURE=400 + 5 * minute))
+
+        assert aggregator.duty_cycle('COMPRESSOR') == pytest.approx(15 / 59)
+        assert aggregator.time_in_state()['DHW'] == pytest.approx(600)
+        assert aggregator.starts_per_hour() == pytest.approx(14 / 59 * 60)
+        assert aggregator.dhw_heat_up_rate() == pytest.approx(30.0)
+        delta_t = aggregator.delta_t()
+        assert (delta_t.min, delta_t.max) == pytest.approx((5.0, 10.9))
+        assert aggregator.stats('OUTSIDE_TEMPERATURE').count == 60
+
+    def test_gaps_and_duplicates(self):
+        aggregator = DeviceAggregator(max_gap=120)
+        aggregator.add(snapshot(None))
+        aggregator.add(snapshot(1000, OPERATING_STATUS=COMPRESSOR))
+        aggregator.add(snapshot(1000, OPERATING_STATUS=COMPRESSOR))
+        aggregator.add(snapshot(2000, OPERATING_STATUS=COMPRESSOR))
+        assert aggregator.duty_cycle() is None
+        aggregator.add(snapshot(2060))
+        assert aggregator.duty_cycle() == 1.0
+        assert aggregator.stats('FLOW_TEMPERATURE').count == 3
+
+    def test_fleet_on_poll(self):
+        class Api:
+            snapshot = snapshot(1000, OUTSIDE_TEMPERATURE=-35)
+
+        fleet = FleetAggregator(window=600)
+        fleet.on_poll(('isg', 502, slave), Api, True)
+        fleet.on_poll(('other', 502, slave), Api, False)
+        assert list(fleet.devices) == [('isg', 502, slave)]
+        stats = fleet.device(('isg', 502, slave)).stats('OUTSIDE_TEMPERATURE')
+        assert stats.mean == -3.5
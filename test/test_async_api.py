@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+import asyncio
+import time
+
+import pytest
+
+from pystiebeleltron.async_api import AsyncStiebelEltronAPI
+from pystiebeleltron.metrics import Metrics
+from test.fake_modbus_client import FakeAsyncModbusClient
+
+slave = 1
+
+
+class TestAsyncStiebelEltronApi:
+
+    def test_update_pipelines_block_reads(self):
+        client = FakeAsyncModbusClient(delay=0.2)
+        api = AsyncStiebelEltronAPI(client, slave)
+
+        start = time.monotonic()
+        assert asyncio.run(api.update())
+        duration = time.monotonic() - start
+
+        assert client.max_in_flight == 3
+        assert duration < 0.4
+
+    def test_getters(self):
+        client = FakeAsyncModbusClient()
+        api = AsyncStiebelEltronAPI(client, slave, update_on_read=True)
+        client.input[0] = 215
+        client.input[2] = 495
+        client.input[2000] = 0x2104
+        client.holding[1000] = 5
+
+        async def read():
+            return (await api.get_current_temp(),
+                    await api.get_current_humidity(),
+                    await api.get_operation(),
+                    await api.get_heating_status(),
+                    await api.get_cooling_status(),
+                    await api.get_filter_alarm_status())
+
+        assert asyncio.run(read()) == (21.5, 49.5, 'DHW', True, False, True)
+
+    def test_setters(self):
+        client = FakeAsyncModbusClient()
+        api = AsyncStiebelEltronAPI(client, slave, update_on_read=True)
+
+        async def write():
+            assert await api.set_target_temp(22.5) is True
+            assert await api.set_operation('MANUAL MODE') is True
+            return await api.get_target_temp(), await api.get_operation()
+
+        assert asyncio.run(write()) == (22.5, 'MANUAL MODE')
+
+    def test_update_failure(self):
+        client = FakeAsyncModbusClient()
+        client.fail_reads = True
+        api = AsyncStiebelEltronAPI(client, slave)
+
+        assert asyncio.run(api.update()) is False
+
+    def test_writes_overtake_queued_polls(self):
+        client = FakeAsyncModbusClient(delay=0.05)
+        metrics = Metrics()
+        api = AsyncStiebelEltronAPI(client, slave, metrics=metrics,
+                                    max_in_flight=1)
+
+        async def run():
+            update = asyncio.ensure_future(api.update())
+            await asyncio.sleep(0.01)
+            confirmed = await api.set_target_temp(22.5, confirm=True)
+            return confirmed, await update
+
+        assert asyncio.run(run()) == (True, True)
+        assert [request[:2] for request in client.requests] == [
+            (4, 0), (6, 1001), (3, 1001), (3, 1000), (4, 2000)]
+        assert client.max_in_flight == 1
+        assert api.get_conv_val('ROOM_TEMP_HEAT_DAY_HC1') == 22.5
+        assert metrics.durations['confirmed_write'].count == 1
+
+    def test_confirmed_operation(self):
+        client = FakeAsyncModbusClient()
+        api = AsyncStiebelEltronAPI(client, slave)
+
+        assert asyncio.run(api.set_operation('AUTOMATIC', confirm=True))
+        assert api.get_conv_val('OPERATING_MODE') == 11
+        with pytest.raises(ValueError):
+            asyncio.run(api.set_operation('SAUNA', confirm=True))
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+from test import benchmark
+
+# Bounds of importing the core modules, measured with Python 3.11 at 20 ms
+# and 2.5 MiB. Loading pymodbus or numpy allocates more than 7 MiB.
+IMPORT_SECONDS = 0.5
+IMPORT_KIB = 5 * 1024
+
+
+class TestBenchmark:
+
+    def test_percentile(self):
+        values = [0.5, 0.1, 0.4, 0.2, 0.3]
+        assert benchmark.percentile(values, 0.5) == 0.3
+        assert benchmark.percentile(values, 0.99) == 0.5
+        assert benchmark.percentile([], 0.5) is None
+
+    def test_offline_benchmarks(self):
+        decode = benchmark.bench_decode(10)
+        assert decode['get_conv_val_per_second'] > 0
+        assert decode['get_all_converted_per_second'] > 0
+        memory = benchmark.bench_memory(10)
+        assert memory['bytes_per_instance'] > 0
+
+    def test_core_imports_without_pymodbus(self):
+        result = benchmark.bench_import()
+        assert result['pymodbus'] == []
+        assert 0 < result['seconds'] < IMPORT_SECONDS
+        assert 0 < result['allocated_kib'] < IMPORT_KIB
+        assert result['max_rss_kib'] > 0
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+import threading
+import time
+
+import pytest
+
+from pystiebeleltron import bus
+from pystiebeleltron.connection import (
+    CircuitOpenError, READ_BACK, request_priority)
+from test.fake_modbus_client import FakeModbusClient
+
+slave = 1
+SLAVES = (1, 2, 3)
+
+
+class GatedClient(FakeModbusClient):
+    """ Fake client blocking the first request until released. """
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _request(self, method, *args):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if not self.started.is_set():
+                self.started.set()
+                self.release.wait(5)
+            return method(*args)
+        finally:
+            self.in_flight -= 1
+
+    def _read(self, *args):
+        return self._request(super()._read, *args)
+
+    def _write(self, *args):
+        return self._request(super()._write, *args)
+
+
+class DeadSlaveClient(FakeModbusClient):
+    """ Fake client of a line where slave 2 does not answer. """
+
+    def _read(self, table, function_code, address, count, slave):
+        if slave == 2:
+            self.requests.append((function_code, address, count, slave))
+            raise ConnectionError("Timeout")
+        return super()._read(table, function_code, address, count, slave)
+
+
+class TestBusScheduler:
+    def test_views_share_client(self):
+        client = FakeModbusClient()
+        with bus.BusScheduler(client) as scheduler:
+            for unit in SLAVES:
+                scheduler.api(unit)
+            assert scheduler.api(1) is scheduler.views[1]
+            assert scheduler.update_all() == {1: True, 2: True, 3: True}
+            scheduler.api(2).set_target_temp(21.5)
+        assert {request[3] for request in client.requests} == set(SLAVES)
+        assert (6, 1001, 1, 2) in client.requests
+        assert scheduler.requests == len(client.requests)
+        assert not client.connected
+
+    def test_priority(self):
+        client = GatedClient()
+        scheduler = bus.BusScheduler(client)
+        order = []
+
+        def submit(priority, method, **kwargs):
+            future = scheduler.submit(priority, method, slave=slave, **kwargs)
+            future.add_done_callback(lambda _: order.append(priority))
+
+        submit(bus.READ, 'read_input_registers', address=0, count=1)
+        assert client.started.wait(5)
+        submit(bus.READ, 'read_input_registers', address=500, count=1)
+        submit(bus.STATUS, 'read_input_registers', address=2000, count=1)
+        submit(bus.WRITE, 'write_register', address=1001, value=215)
+        submit(bus.READ, 'read_holding_registers', address=1000, count=1)
+        client.release.set()
+        scheduler.stop()
+        assert order == [bus.READ, bus.WRITE, bus.STATUS, bus.READ, bus.READ]
+        assert client.max_in_flight == 1
+
+    def test_concurrent_start(self, monkeypatch):
+        client = GatedClient()
+        scheduler = bus.BusScheduler(client)
+        barrier = threading.Barrier(8)
+        futures = []
+
+        def submit():
+            barrier.wait()
+            futures.append(scheduler.submit(
+                bus.READ, 'read_input_registers', address=0, count=1,
+                slave=slave))
+
+        class SlowThread(threading.Thread):
+            def __init__(self, *args, **kwargs):
+                time.sleep(0.05)
+                super().__init__(*args, **kwargs)
+
+        threads = [threading.Thread(target=submit) for _ in range(8)]
+        monkeypatch.setattr(threading, 'Thread', SlowThread)
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        workers = [thread for thread in threading.enumerate()
+                   if thread.name == 'BusScheduler']
+        client.release.set()
+        assert all(future.result(5) for future in futures)
+        scheduler.stop()
+        assert len(workers) == 1
+        assert client.max_in_flight == 1
+
+    def test_status_reads_first(self):
+        scheduler = bus.BusScheduler(FakeModbusClient())
+        conn = scheduler.api(slave)._conn
+        assert conn.priority('input', 1999, 3) == bus.STATUS
+        assert conn.priority('input', 0, 40) == bus.READ
+        assert conn.priority('holding', 2000, 1) == bus.READ
+        with request_priority(READ_BACK):
+            assert conn.priority('holding', 1001, 1) == bus.WRITE
+
+    def test_confirmed_write(self):
+        client = FakeModbusClient()
+        with bus.BusScheduler(client) as scheduler:
+            assert scheduler.api(2).set_target_temp(21.5, confirm=True)
+        assert client.requests == [(6, 1001, 1, 2), (3, 1001, 1, 2)]
+
+    def test_inter_frame_delay(self):
+        client = FakeModbusClient()
+        with bus.BusScheduler(client, frame_delay=0.02) as scheduler:
+            start = time.monotonic()
+            futures = [scheduler.submit(bus.READ, 'read_input_registers',
+                                        address=0, count=1, slave=slave)
+                       for _ in range(5)]
+            for future in futures:
+                future.result()
+            assert time.monotonic() - start >= 0.08
+
+    def test_inter_frame_delay_of_baudrate(self):
+        assert bus.inter_frame_delay(9600) == pytest.approx(0.00401, abs=1e-5)
+        assert bus.inter_frame_delay(115200) == 0.00175
+
+    def test_dead_slave_is_skipped(self):
+        client = DeadSlaveClient()
+        with bus.BusScheduler(client, failure_threshold=2) as scheduler:
+            for unit in SLAVES:
+                scheduler.api(unit)
+            for _ in range(3):
+                assert scheduler.update_all() == {1: True, 2: False, 3: True}
+            with pytest.raises(CircuitOpenError):
+                scheduler.submit(bus.READ, 'read_input_registers', address=0,
+                                 count=1, slave=2).result()
+        assert sum(request[3] == 2 for request in client.requests) == 2
+
+    def test_stop_fails_queued_requests(self):
+        client = GatedClient()
+        scheduler = bus.BusScheduler(client)
+        first = scheduler.submit(bus.READ, 'read_input_registers', address=0,
+                                 count=1, slave=slave)
+        assert client.started.wait(5)
+        scheduler._queue.put((bus._STOP, -1, None))
+        queued = scheduler.submit(bus.READ, 'read_input_registers',
+                                  address=0, count=1, slave=slave)
+        client.release.set()
+        scheduler.stop()
+        assert first.result().registers == [0]
+        with pytest.raises(CircuitOpenError):
+            queued.result()
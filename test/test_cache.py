@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+import asyncio
+
+from pystiebeleltron import pystiebeleltron as pyse
+from pystiebeleltron.async_api import AsyncStiebelEltronAPI
+from test.fake_modbus_client import FakeModbusClient, FakeAsyncModbusClient
+
+slave = 1
+
+
+class TestSnapshotCache:
+
+    def test_max_age(self):
+        client = FakeModbusClient()
+        api = pyse.StiebelEltronAPI(client, slave, max_age=60)
+
+        api.get_current_temp()
+        api.get_target_temp()
+        api.get_operation()
+        api.get_heating_status()
+
+        assert len(client.requests) == 3
+        assert api.cache_stats == pyse.CacheStats(hits=3, misses=1)
+
+    def test_max_age_override(self):
+        client = FakeModbusClient()
+        api = pyse.StiebelEltronAPI(client, slave, max_age=60)
+
+        api.get_current_temp()
+        client.input[0] = 200
+        assert api.get_current_temp() == 0
+        assert api.get_current_temp(max_age=0) == 20.0
+        assert len(client.requests) == 6
+
+    def test_refresh(self):
+        client = FakeModbusClient()
+        api = pyse.StiebelEltronAPI(client, slave)
+
+        assert api.refresh()
+        assert client.requests == []
+        assert api.refresh(60)
+        assert api.refresh(60)
+        assert len(client.requests) == 3
+
+    def test_update_on_read(self):
+        client = FakeModbusClient()
+        api = pyse.StiebelEltronAPI(client, slave, update_on_read=True)
+
+        api.get_current_temp()
+        api.get_current_temp()
+
+        assert len(client.requests) == 6
+        assert api.cache_stats.misses == 2
+
+    def test_no_update_on_read(self):
+        client = FakeModbusClient()
+        api = pyse.StiebelEltronAPI(client, slave)
+
+        assert api.get_current_temp() == 0
+        assert api.snapshot_age is None
+        assert client.requests == []
+
+    def test_async_shared_refresh(self):
+        client = FakeAsyncModbusClient(delay=0.05)
+        api = AsyncStiebelEltronAPI(client, slave, max_age=60)
+        client.input[0] = 215
+
+        async def read():
+            return await asyncio.gather(
+                api.get_current_temp(), api.get_current_temp(),
+                api.get_target_temp(), api.get_heating_status())
+
+        assert asyncio.run(read()) == [21.5, 21.5, 0, False]
+        assert len(client.requests) == 3
+        assert api.cache_stats == pyse.CacheStats(hits=0, misses=4)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+import asyncio
+import time
+
+import pytest
+from pymodbus.exceptions import ConnectionException, ModbusIOException
+
+from pystiebeleltron import pystiebeleltron as pyse
+from pystiebeleltron.async_api import AsyncStiebelEltronAPI
+from pystiebeleltron.connection import (
+    ResilientConnection, AsyncResilientConnection, CircuitBreaker,
+    CircuitOpenError, CLOSED, OPEN, HALF_OPEN)
+from test.fake_modbus_client import FakeModbusClient, FakeAsyncModbusClient
+
+slave = 1
+
+
+class FlakyClient(FakeModbusClient):
+    """Drops the connection for the next `failures` requests."""
+
+    def __init__(self, failures=0):
+        super().__init__()
+        self.failures = failures
+        self.connects = 0
+
+    def connect(self):
+        self.connects += 1
+        return super().connect()
+
+    def read_input_registers(self, address, count=1, slave=0):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionException("Connection reset")
+        return super().read_input_registers(address, count, slave)
+
+
+class TestResilientConnection:
+
+    def test_retry_and_reconnect(self):
+        client = FlakyClient(failures=2)
+        conn = ResilientConnection(client, retries=2, backoff_base=0.001)
+        client.input[0] = 215
+
+        assert conn.read_input_registers(0, 1, slave).registers == [215]
+        assert client.connects == 2
+        assert conn.breaker.state == CLOSED
+
+    def test_returned_exception(self):
+        client = FakeModbusClient()
+        client.read_holding_registers = \
+            lambda **kwargs: ModbusIOException("No response")
+        conn = ResilientConnection(client, retries=1, backoff_base=0.001)
+
+        with pytest.raises(ModbusIOException):
+            conn.read_holding_registers(1000, 1, slave)
+
+    def test_circuit_breaker(self):
+        client = FlakyClient(failures=100)
+        conn = ResilientConnection(client, retries=0,
+                                   breaker=CircuitBreaker(2, 0.05))
+        api = pyse.StiebelEltronAPI(conn, slave)
+
+        assert api.update() is False
+        assert api.update() is False
+        assert conn.breaker.state == OPEN
+        requests = client.failures
+        assert api.update() is False
+        assert isinstance(api.last_error, CircuitOpenError)
+        assert client.failures == requests
+
+        time.sleep(0.05)
+        assert conn.breaker.state == HALF_OPEN
+        client.failures = 0
+        assert api.update()
+        assert conn.breaker.state == CLOSED
+
+    def test_error_response_not_retried(self):
+        client = FakeModbusClient()
+        client.fail_reads = True
+        conn = ResilientConnection(client, retries=3,
+                                   breaker=CircuitBreaker(1))
+        api = pyse.StiebelEltronAPI(conn, slave)
+
+        assert api.update() is False
+        assert len(client.requests) == 1
+        assert conn.breaker.state == CLOSED
+        assert 'Invalid response' in str(api.last_error)
+
+    def test_async(self):
+        client = FakeAsyncModbusClient()
+        client.connected = False
+        conn = AsyncResilientConnection(client)
+        api = AsyncStiebelEltronAPI(conn, slave)
+        client.input[0] = 215
+
+        assert asyncio.run(api.update())
+        assert client.connected
+        assert api.get_conv_val('ACTUAL_ROOM_TEMPERATURE_HC1') == 21.5
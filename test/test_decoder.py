@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+from pystiebeleltron import pystiebeleltron as pyse
+from pystiebeleltron.decoder import to_signed
+from test.fake_modbus_client import FakeModbusClient
+
+slave = 1
+
+
+class TestDecoderTable:
+
+    @staticmethod
+    def make_api(**input_regs):
+        client = FakeModbusClient()
+        for name, value in input_regs.items():
+            client.input[pyse.B1_REGMAP_INPUT[name]['addr']] = value & 0xFFFF
+        api = pyse.StiebelEltronAPI(client, slave)
+        assert api.update()
+        return api
+
+    def test_signed_values(self):
+        api = self.make_api(OUTSIDE_TEMPERATURE=-55, LOW_PRESSURE=-120,
+                            COMPRESSOR_STARTS=40000)
+        assert api.get_conv_val('OUTSIDE_TEMPERATURE') == -5.5
+        assert api.get_conv_val('LOW_PRESSURE') == -1.2
+        assert api.get_conv_val('COMPRESSOR_STARTS') == 40000
+
+    def test_error_values(self):
+        api = self.make_api(OUTSIDE_TEMPERATURE=-600, FLOW_TEMPERATURE=-500,
+                            RETURN_TEMPERATURE=0x8000,
+                            MIXED_WATER_AMOUNT=0x8000)
+        assert api.get_conv_val('OUTSIDE_TEMPERATURE') is None
+        assert api.get_conv_val('FLOW_TEMPERATURE') is None
+        assert api.get_conv_val('RETURN_TEMPERATURE') is None
+        assert api.get_conv_val('MIXED_WATER_AMOUNT') == 0x8000
+
+    def test_unknown_name(self):
+        api = self.make_api()
+        assert api.get_conv_val('NO_SUCH_REGISTER') is None
+
+    def test_get_all_converted(self):
+        api = self.make_api(ACTUAL_ROOM_TEMPERATURE_HC1=215)
+        values = api.get_all_converted()
+        assert len(values) == pyse.REGISTER_LAYOUT.size
+        assert values['ACTUAL_ROOM_TEMPERATURE_HC1'] == 21.5
+        assert values['OPERATING_MODE'] == 0
+
+    def test_to_signed(self):
+        assert to_signed(0xFFFF) == -1
+        assert to_signed(0x7FFF) == 0x7FFF
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+import asyncio
+import time
+
+from pystiebeleltron.fleet import FleetPoller, FleetTarget
+from test.fake_modbus_client import FakeAsyncModbusClient
+
+
+class TestFleetPoller:
+
+    @staticmethod
+    def make_poller(delay=0.0, **kwargs):
+        clients = {}
+
+        def factory(host, port):
+            clients[(host, port)] = FakeAsyncModbusClient(delay=delay)
+            return clients[(host, port)]
+
+        targets = [('10.0.0.1', 502, 1), ('10.0.0.1', 502, 2),
+                   ('10.0.0.2', 502, 1), ('10.0.0.3', 502, 1)]
+        poller = FleetPoller(targets, client_factory=factory, jitter=0,
+                             **kwargs)
+        return poller, clients
+
+    def test_poll_cycle(self):
+        polled = []
+        poller, clients = self.make_poller(
+            on_poll=lambda target, api, ok: polled.append((target, ok)))
+
+        report = asyncio.run(poller.poll_cycle())
+
+        assert report.polled == 4
+        assert report.failed == 0
+        assert len(clients) == 3
+        assert len(polled) == 4
+        stats = poller.stats[FleetTarget('10.0.0.2', 502, 1)]
+        assert stats.polls == 1
+        assert stats.mean_latency is not None
+
+    def test_concurrency_limit(self):
+        poller, _ = self.make_poller(delay=0.05, max_concurrency=1)
+
+        start = time.monotonic()
+        asyncio.run(poller.poll_cycle())
+
+        assert time.monotonic() - start >= 4 * 0.05
+
+    def test_host_rate_limit(self):
+        poller, _ = self.make_poller(host_min_interval=0.1)
+
+        start = time.monotonic()
+        asyncio.run(poller.poll_cycle())
+
+        # Two slaves behind 10.0.0.1
+        assert time.monotonic() - start >= 0.1
+
+    def test_host_rate_limit_with_full_semaphore(self):
+        started = []
+
+        class Client(FakeAsyncModbusClient):
+            async def read_input_registers(self, address, count=1, slave=0):
+                if address == 0:
+                    started.append((slave, time.monotonic()))
+                return await super().read_input_registers(address, count,
+                                                          slave)
+
+        targets = [('10.0.0.2', 502, 1), ('10.0.0.3', 502, 1),
+                   ('10.0.0.1', 502, 1), ('10.0.0.1', 502, 2)]
+        poller = FleetPoller(
+            targets, max_concurrency=1, host_min_interval=0.2, jitter=0,
+            client_factory=lambda host, port: Client(delay=0.05))
+
+        asyncio.run(poller.poll_cycle())
+
+        (_, first), (_, second) = started[-2:]
+        assert second - first >= 0.2
+
+    def test_backoff(self):
+        poller, clients = self.make_poller(backoff_base=60)
+
+        async def run():
+            await poller.poll_cycle()
+            clients[('10.0.0.3', 502)].fail_reads = True
+            first = await poller.poll_cycle()
+            second = await poller.poll_cycle()
+            return first, second
+
+        first, second = asyncio.run(run())
+        assert first.failed == 1
+        assert second.skipped == 1
+        assert second.polled == 3
+        assert poller.stats[FleetTarget('10.0.0.3', 502, 1)].skipped == 1
+
+    def test_backoff_per_slave(self):
+        poller, clients = self.make_poller(backoff_base=60)
+        poller.api(('10.0.0.1', 502, 1))
+        client = clients[('10.0.0.1', 502)]
+        read = client._read
+
+        def read_slave_1(table, function_code, address, count, slave):
+            if slave == 1:
+                raise ConnectionError("Timeout")
+            return read(table, function_code, address, count, slave)
+
+        client._read = read_slave_1
+
+        async def run():
+            first = await poller.poll_cycle()
+            second = await poller.poll_cycle()
+            return first, second
+
+        first, second = asyncio.run(run())
+        assert first.failed == 1
+        assert second.skipped == 1
+        assert second.polled == 3
+        assert poller.stats[FleetTarget('10.0.0.1', 502, 2)].polls == 2
+
+    def test_reconnect(self):
+        poller, clients = self.make_poller()
+        api = poller.api(('10.0.0.2', 502, 1))
+        clients[('10.0.0.2', 502)].connected = False
+        assert not api.connected
+
+        report = asyncio.run(poller.poll_cycle())
+        assert report.failed == 0
+        assert api.connected
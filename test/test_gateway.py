@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+import asyncio
+import json
+
+from pystiebeleltron import pystiebeleltron as pyse
+from pystiebeleltron.async_api import AsyncStiebelEltronAPI
+from pystiebeleltron.gateway import Gateway
+from test.fake_modbus_client import FakeAsyncModbusClient, FakeModbusClient
+
+slave = 1
+
+
+class OverlapCountingClient(FakeModbusClient):
+    """ Fake client recording the most requests in flight at once. """
+
+    def __init__(self, delay=0.0):
+        super().__init__(delay)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _count(self, request, *args):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return request(*args)
+        finally:
+            self.in_flight -= 1
+
+    def _read(self, *args):
+        return self._count(super()._read, *args)
+
+    def _write(self, *args):
+        return self._count(super()._write, *args)
+
+
+async def request(port, method, path, body=None, headers=None):
+    """ Send one HTTP request, return status, headers and parsed body. """
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    data = json.dumps(body).encode() if body is not None else b''
+    lines = ['{} {} HTTP/1.1'.format(method, path), 'Host: localhost',
+             'Connection: close', 'Content-Length: {}'.format(len(data))]
+    lines.extend('{}: {}'.format(*header)
+                 for header in (headers or {}).items())
+    writer.write('\r\n'.join(lines).encode() + b'\r\n\r\n' + data)
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b'\r\n\r\n')
+    status_line, *header_lines = head.decode().split('\r\n')
+    response_headers = dict(line.split(': ', 1) for line in header_lines)
+    return (int(status_line.split()[1]), response_headers,
+            json.loads(content) if content else None)
+
+
+def serve(api, test, max_age=10.0):
+    async def run():
+        async with Gateway(api, port=0, max_age=max_age) as gateway:
+            return await test(gateway.port)
+    return asyncio.run(run())
+
+
+class TestGateway:
+    def test_snapshot_is_cached(self):
+        client = FakeAsyncModbusClient()
+        client.input[0] = 215
+        api = AsyncStiebelEltronAPI(client, slave)
+
+        async def test(port):
+            first = await request(port, 'GET', '/snapshot')
+            second = await request(port, 'GET', '/snapshot')
+            return first, second
+
+        first, second = serve(api, test)
+        assert first[0] == 200
+        assert first[2]['values']['ACTUAL_ROOM_TEMPERATURE_HC1'] == 21.5
+        assert first[2]['timestamp'] == api.snapshot.timestamp
+        assert second[1]['ETag'] == first[1]['ETag']
+        assert len(client.requests) == 3
+
+    def test_conditional_request(self):
+        client = FakeAsyncModbusClient()
+        api = AsyncStiebelEltronAPI(client, slave)
+
+        async def test(port):
+            status, headers, _ = await request(port, 'GET', '/snapshot')
+            etag = headers['ETag']
+            unchanged = await request(port, 'GET', '/snapshot',
+                                      headers={'If-None-Match': etag})
+            client.input[0] = 200
+            changed = await request(port, 'GET', '/snapshot',
+                                    headers={'If-None-Match': etag})
+            return unchanged, changed
+
+        unchanged, changed = serve(api, test, max_age=0)
+        assert unchanged[0] == 304
+        assert unchanged[2] is None
+        assert changed[0] == 200
+        assert changed[1]['ETag'] != unchanged[1]['ETag']
+        assert changed[2]['values']['ACTUAL_ROOM_TEMPERATURE_HC1'] == 20.0
+
+    def test_set_target_temp(self):
+        client = FakeAsyncModbusClient()
+        api = AsyncStiebelEltronAPI(client, slave)
+
+        async def test(port):
+            return (await request(port, 'POST', '/target_temp',
+                                  {'temperature': 21.5}),
+                    await request(port, 'POST', '/target_temp',
+                                  {'temperature': 'warm'}))
+
+        written, invalid = serve(api, test)
+        assert written[0] == 200
+        assert written[2] == {'ROOM_TEMP_HEAT_DAY_HC1': 21.5}
+        assert client.holding[1001] == 215
+        assert invalid[0] == 400
+
+    def test_set_target_temp_out_of_range(self):
+        client = FakeAsyncModbusClient()
+        api = AsyncStiebelEltronAPI(client, slave)
+
+        async def test(port):
+            return [await request(port, 'POST', '/target_temp',
+                                  {'temperature': temp})
+                    for temp in (5000, float('inf'), 1e309)]
+
+        for status, _, body in serve(api, test):
+            assert status == 400
+            assert 'ROOM_TEMP_HEAT_DAY_HC1' in body['error']
+        assert client.requests == []
+
+    def test_set_operation_with_sync_api(self):
+        client = FakeModbusClient()
+        api = pyse.StiebelEltronAPI(client, slave)
+
+        async def test(port):
+            return (await request(port, 'POST', '/operation',
+                                  {'mode': 'AUTOMATIC'}),
+                    await request(port, 'POST', '/operation',
+                                  {'mode': 'SAUNA'}))
+
+        written, invalid = serve(api, test)
+        assert written[2] == {'OPERATING_MODE': 'AUTOMATIC'}
+        assert client.holding[1000] == 11
+        assert invalid[0] == 400
+
+    def test_sync_api_calls_do_not_overlap(self):
+        client = OverlapCountingClient(delay=0.01)
+        api = pyse.StiebelEltronAPI(client, slave)
+
+        async def test(port):
+            return await asyncio.gather(
+                *(request(port, 'GET', '/snapshot') for _ in range(4)),
+                request(port, 'POST', '/target_temp', {'temperature': 21.5}))
+
+        responses = serve(api, test)
+        assert [response[0] for response in responses] == [200] * 5
+        assert client.max_in_flight == 1
+        assert [function for function, *_ in client.requests].count(4) == 2
+
+    def test_errors(self):
+        client = FakeAsyncModbusClient()
+        client.fail_reads = True
+        api = AsyncStiebelEltronAPI(client, slave)
+
+        async def test(port):
+            return [(await request(port, *args))[0] for args in (
+                ('GET', '/snapshot'),
+                ('GET', '/unknown'),
+                ('POST', '/snapshot'),
+                ('POST', '/operation'),
+                ('POST', '/target_temp', {'temperature': 20})
+            )]
+
+        assert serve(api, test) == [503, 404, 405, 400, 502]
+
+    def test_keep_alive(self):
+        client = FakeAsyncModbusClient()
+        api = AsyncStiebelEltronAPI(client, slave)
+
+        async def test(port):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            statuses = []
+            for _ in range(2):
+                writer.write(b'GET /snapshot HTTP/1.1\r\n\r\n')
+                status = await reader.readline()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line == b'\r\n':
+                        break
+                    name, value = line.decode().strip().split(': ', 1)
+                    headers[name] = value
+                await reader.readexactly(int(headers['Content-Length']))
+                statuses.append(status.split()[1])
+            writer.close()
+            return statuses
+
+        assert serve(api, test) == [b'200', b'200']
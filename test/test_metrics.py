@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+import asyncio
+
+from pymodbus.exceptions import ConnectionException
+
+from pystiebeleltron import pystiebeleltron as pyse
+from pystiebeleltron.async_api import AsyncStiebelEltronAPI
+from pystiebeleltron.metrics import Metrics, render_prometheus
+from test.fake_modbus_client import FakeModbusClient, FakeAsyncModbusClient
+
+slave = 1
+
+
+class TestMetrics:
+
+    def test_update_and_writes(self):
+        client = FakeModbusClient()
+        metrics = Metrics()
+        api = pyse.StiebelEltronAPI(client, slave, metrics=metrics)
+
+        assert api.update()
+        api.set_target_temp(21.0)
+        with api.transaction(verify=False) as tx:
+            tx.set('ROOM_TEMP_COOL_DAY_HC1', 25.0)
+            tx.set('ROOM_TEMP_COOL_NIGHT_HC1', 26.0)
+        api.get_all_converted()
+
+        assert metrics.requests[('read_input_registers', 'B1')].count == 1
+        assert metrics.requests[('read_holding_registers', 'B2')].count == 1
+        assert metrics.requests[('read_input_registers', 'B3')].count == 1
+        assert metrics.bytes_received[('read_input_registers', 'B1')] == \
+            9 + 2 * 33
+        assert metrics.bytes_sent[('write_registers', 'B2')] == 13 + 2 * 2
+        assert metrics.bytes_sent[('write_register', 'B2')] == 12
+        assert set(metrics.durations) == {'update', 'store', 'decode'}
+        assert metrics.errors == {}
+
+    def test_errors(self):
+        client = FakeModbusClient()
+        client.fail_reads = True
+        metrics = Metrics()
+        api = pyse.StiebelEltronAPI(client, slave, metrics=metrics)
+        assert api.update() is False
+
+        def broken(**kwargs):
+            raise ConnectionException("reset")
+        client.read_input_registers = broken
+        assert api.update() is False
+
+        assert metrics.errors == {
+            ('read_input_registers', 'B1', 'error_response'): 1,
+            ('read_input_registers', 'B1', 'exception'): 1}
+
+    def test_prometheus(self):
+        metrics = Metrics(labels={'host': 'isg'})
+        api = pyse.StiebelEltronAPI(FakeModbusClient(), slave,
+                                    metrics=metrics)
+        api.update()
+
+        text = render_prometheus(metrics)
+        assert '# TYPE stiebeleltron_request_duration_seconds histogram' \
+            in text
+        assert ('stiebeleltron_request_duration_seconds_count{host="isg",'
+                'operation="read_holding_registers",block="B2"} 1') in text
+        assert ('stiebeleltron_received_bytes_total{host="isg",'
+                'operation="read_input_registers",block="B3"} 15') in text
+        assert 'le="+Inf"' in text
+
+    def test_async(self):
+        metrics = Metrics()
+        api = AsyncStiebelEltronAPI(FakeAsyncModbusClient(), slave,
+                                    metrics=metrics)
+
+        assert asyncio.run(api.update())
+        assert len(metrics.requests) == 3
+        assert api._conn.connected
+
+    def test_disabled(self):
+        client = FakeModbusClient()
+        api = pyse.StiebelEltronAPI(client, slave)
+        assert api._conn is client
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+import asyncio
+
+from pystiebeleltron import pystiebeleltron as pyse
+from pystiebeleltron.async_api import AsyncStiebelEltronAPI
+from pystiebeleltron.planner import (
+    ReadPlanner, ReadRequest, PollGroup, PollSchedule)
+from test.fake_modbus_client import FakeModbusClient, FakeAsyncModbusClient
+
+slave = 1
+
+
+class TestReadPlanner:
+
+    def test_merge_contiguous(self):
+        planner = ReadPlanner(pyse.REGISTER_LAYOUT, max_gap=0)
+        reads = planner.plan(['FLOW_TEMPERATURE', 'RETURN_TEMPERATURE',
+                              'OPERATING_STATUS', 'FAULT_STATUS'])
+        assert reads == (ReadRequest('input', 11, 2, 11),
+                         ReadRequest('input', 2000, 2, 60))
+
+    def test_gap(self):
+        names = ['ACTUAL_ROOM_TEMPERATURE_HC1', 'OUTSIDE_TEMPERATURE']
+        assert len(ReadPlanner(pyse.REGISTER_LAYOUT, max_gap=4).plan(
+            names)) == 2
+        assert ReadPlanner(pyse.REGISTER_LAYOUT, max_gap=5).plan(names) == (
+            ReadRequest('input', 0, 7, 0),)
+
+    def test_blocks_not_merged(self):
+        planner = ReadPlanner(pyse.REGISTER_LAYOUT, max_gap=100)
+        reads = planner.plan(['MIXED_WATER_AMOUNT', 'OPERATING_MODE',
+                              'BUS_STATUS'])
+        assert [read.table for read in reads] == ['input', 'holding', 'input']
+        assert [read.address for read in reads] == [32, 1000, 2002]
+
+    def test_max_count(self):
+        planner = ReadPlanner(pyse.REGISTER_LAYOUT, max_count=10)
+        reads = planner.plan(pyse.B1_REGMAP_INPUT)
+        assert [read.count for read in reads] == [10, 10, 10, 3]
+
+    def test_plan_all(self):
+        planner = ReadPlanner(pyse.REGISTER_LAYOUT)
+        reads = planner.plan_all()
+        assert [read.address for read in reads] == [0, 1000, 2000]
+        assert planner.plan(pyse.REGISTER_LAYOUT.index) is reads
+
+
+class TestSelectivePolling:
+
+    def test_update_registers(self):
+        client = FakeModbusClient()
+        client.input[2000] = 0x0004
+        client.input[0] = 215
+        api = pyse.StiebelEltronAPI(client, slave)
+
+        assert api.update_registers(pyse.B3_REGMAP_INPUT)
+        assert client.requests == [(4, 2000, 3, slave)]
+        assert api.get_heating_status() is True
+        assert api.get_current_temp() == 0
+
+    def test_poll_schedule(self):
+        client = FakeModbusClient()
+        api = pyse.StiebelEltronAPI(client, slave)
+        schedule = pyse.default_poll_schedule()
+
+        assert api.poll(schedule)
+        assert len(client.requests) == 3
+        assert api.poll(schedule)
+        assert len(client.requests) == 3
+
+        schedule.groups['status'].next_due = 0
+        assert api.poll(schedule)
+        assert client.requests[-1] == (4, 2000, 3, slave)
+
+    def test_adaptive_interval(self):
+        group = PollGroup('sensors', ['FLOW_TEMPERATURE'], 10,
+                          max_interval=40)
+        schedule = PollSchedule([group])
+
+        schedule.polled([group], [], now=0)
+        assert group.is_due(20) and not group.is_due(19)
+        schedule.polled([group], [], now=20)
+        schedule.polled([group], [], now=60)
+        assert group.interval == 40
+        schedule.polled([group], ['FLOW_TEMPERATURE'], now=100)
+        assert group.interval == 10
+        assert schedule.next_due(now=100) == 10
+
+    def test_async_update_registers(self):
+        client = FakeAsyncModbusClient()
+        client.holding[1000] = 5
+        api = AsyncStiebelEltronAPI(client, slave)
+
+        assert asyncio.run(api.update_registers(
+            ['OPERATING_MODE', 'OPERATING_STATUS']))
+        assert asyncio.run(api.get_operation()) == 'DHW'
+        assert len(client.requests) == 2
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+import os
+
+import pytest
+
+from pystiebeleltron import pystiebeleltron as pyse
+from pystiebeleltron.recorder import (
+    Recorder, RecordingReader, CONST, RLE, RAW)
+from pystiebeleltron.snapshot import RegisterSnapshot
+
+OUTSIDE = pyse.REGISTER_LAYOUT.index['OUTSIDE_TEMPERATURE']
+FLOW = pyse.REGISTER_LAYOUT.index['FLOW_TEMPERATURE']
+STARTS = pyse.REGISTER_LAYOUT.index['COMPRESSOR_STARTS']
+
+
+def snapshot(row):
+    words = [0] * pyse.REGISTER_LAYOUT.size
+    words[OUTSIDE] = 50 + row // 100
+    words[FLOW] = (300 + 7 * row) % 500
+    words[STARTS] = 1000
+    return RegisterSnapshot(pyse.REGISTER_LAYOUT, words, 1000.0 + row)
+
+
+class TestRecorder:
+
+    def test_roundtrip(self, tmp_path):
+        path = str(tmp_path / 'poll.rec')
+        with Recorder(path, segment_rows=256) as recorder:
+            assert not recorder.append(pyse.StiebelEltronAPI(None).snapshot)
+            for row in range(1000):
+                recorder.append(snapshot(row))
+
+        # 4 segments of 1000 polls with 63 words in much less than raw size
+        assert os.path.getsize(path) < 1000 * (8 + 2 * 63) / 4
+
+        with RecordingReader(path) as reader:
+            assert len(reader) == 1000
+            assert len(reader.segments) == 4
+            segment = next(reader.iter_segments())
+            assert segment.encoding(STARTS)[0] == CONST
+            assert segment.encoding(OUTSIDE)[0] == RLE
+            assert segment.encoding(FLOW)[0] == RAW
+            assert isinstance(segment.words(FLOW), memoryview)
+            assert segment.words(FLOW).obj is not None
+            starts, values = segment.runs(OUTSIDE)
+            assert list(starts) == [0, 100, 200]
+            assert list(values) == [50, 51, 52]
+            del segment, starts, values
+
+            timestamps, words = reader.column('FLOW_TEMPERATURE',
+                                              1500.0, 1510.0)
+            assert list(timestamps) == [1000.0 + r for r in range(500, 510)]
+            assert list(words) == [(300 + 7 * r) % 500
+                                   for r in range(500, 510)]
+            assert reader.decode('OUTSIDE_TEMPERATURE', 1990.0) == [
+                (1990.0 + r, 5.9) for r in range(10)]
+
+            snapshots = list(reader.snapshots(1255.0, 1258.0))
+            assert snapshots == [snapshot(r) for r in range(255, 258)]
+            assert snapshots[0].timestamp == 1255.0
+            del timestamps, words, snapshots
+
+    def test_append_and_torn_segment(self, tmp_path):
+        path = str(tmp_path / 'poll.rec')
+        with Recorder(path, segment_rows=10) as recorder:
+            for row in range(10):
+                recorder.append(snapshot(row))
+        size = os.path.getsize(path)
+        with open(path, 'ab') as file:
+            file.write(b'SEGM' + b'\xff' * 40)
+
+        with RecordingReader(path) as reader:
+            assert len(reader) == 10
+
+        with Recorder(path, segment_rows=10) as recorder:
+            assert os.path.getsize(path) == size
+            for row in range(10, 15):
+                recorder.append(snapshot(row))
+
+        with RecordingReader(path) as reader:
+            timestamps, _ = reader.column(FLOW)
+            assert list(timestamps) == [1000.0 + r for r in range(15)]
+
+    def test_wrong_file(self, tmp_path):
+        path = str(tmp_path / 'other.rec')
+        with open(path, 'wb') as file:
+            file.write(b'something else')
+        with pytest.raises(ValueError):
+            Recorder(path)
+        with pytest.raises(ValueError):
+            RecordingReader(path)
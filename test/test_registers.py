@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+import json
+
+import pytest
+
+from pystiebeleltron import pystiebeleltron as pyse
+from pystiebeleltron.registers import (
+    RegisterModel, available_models, load_model, load_model_file)
+from test.fake_modbus_client import FakeModbusClient
+
+slave = 1
+
+
+def large_model():
+    """ Model with 200 input registers and a read-only holding register. """
+    return RegisterModel.from_dict({
+        'model': 'large',
+        'aliases': {'MODE': 'OPERATING_MODE'},
+        'blocks': [
+            {'table': 'input', 'start': 500, 'registers': {
+                'VALUE_{}'.format(i): {'addr': 500 + i, 'type': 2}
+                for i in range(200)}},
+            {'table': 'holding', 'start': 1500, 'registers': {
+                'OPERATING_MODE': {'addr': 1500, 'type': 8,
+                                   'enum': {'1': 'STANDBY', '11': 'AUTO'}},
+                'SERIAL_NUMBER': {'addr': 1501, 'type': 6, 'access': 'r'}}},
+        ]})
+
+
+class TestRegisterModel:
+
+    def test_bundled_model_matches_builtin(self):
+        assert 'lwz' in available_models()
+        model = load_model('lwz')
+        assert load_model('lwz') is model
+
+        builtin = pyse.REGISTER_MODEL
+        assert model.layout.index == builtin.layout.index
+        assert model.layout.blocks == builtin.layout.blocks
+        assert model.layout.aliases == pyse.REGISTER_ALIASES
+        assert model.decoders.decoders == builtin.decoders.decoders
+        assert model.enums['OPERATING_MODE'] == pyse.B2_OPERATING_MODE_READ
+        assert model.bitmask('OPERATING_STATUS') == pyse.B3_OPERATING_STATUS
+        assert model.writable('GRADIENT_HC1')
+        assert not model.writable('FLOW_TEMPERATURE')
+
+    def test_unknown_model(self):
+        with pytest.raises(ValueError):
+            load_model('no_such_model')
+        with pytest.raises(ValueError):
+            load_model('../setup')
+
+    def test_invalid_definitions(self, tmp_path):
+        definition = {'model': 'bad', 'blocks': [
+            {'table': 'input', 'start': 0, 'registers': {
+                'A': {'addr': 0, 'type': 2},
+                'B': {'addr': 0, 'type': 2}}}]}
+        path = tmp_path / 'bad.json'
+        path.write_text(json.dumps(definition))
+        with pytest.raises(ValueError):
+            load_model_file(str(path))
+
+        definition['blocks'][0]['registers']['B'] = {'addr': 1, 'type': 3}
+        with pytest.raises(ValueError):
+            RegisterModel.from_dict(definition)
+
+        definition['blocks'][0]['registers']['B'] = {
+            'addr': 1, 'type': 2, 'access': 'rw'}
+        with pytest.raises(ValueError):
+            RegisterModel.from_dict(definition)
+
+    def test_lazy_compilation(self):
+        model = large_model()
+        assert model._layout is None
+        assert model.layout.size == 202
+        assert model.names[:2] == ['VALUE_0', 'VALUE_1']
+
+
+class TestModelApi:
+
+    def test_aliases(self):
+        client = FakeModbusClient()
+        client.input[24] = 105
+        client.holding[1006] = 195
+        api = pyse.StiebelEltronAPI(client, slave)
+        api.update()
+
+        assert api.get_conv_val('DEW_POINT_TEMPERATURE_HC1') == 10.5
+        assert api.get_conv_val('MANUAL_SET_TEMP_HC2') == \
+            api.get_conv_val('MANUAL_SET_TEAMP_HC2') == 19.5
+        assert 'MANUAL_SET_TEMP_HC2' in api.snapshot
+        assert 'MANUAL_SET_TEMP_HC2' not in api.get_all_converted()
+
+        client.requests.clear()
+        api.update_registers(['MANUAL_SET_TEMP_HC2'])
+        assert client.requests == [(3, 1006, 1, slave)]
+
+        with api.transaction(verify=False) as tx:
+            tx.set('MANUAL_SET_TEMP_HC2', 21.0)
+        assert client.holding[1006] == 210
+
+    def test_large_model(self):
+        client = FakeModbusClient()
+        client.input[699] = 42
+        client.holding[1500] = 11
+        api = pyse.StiebelEltronAPI(client, slave, model=large_model())
+
+        assert api.update()
+        # Reads are split at the Modbus limit of 125 registers
+        assert client.requests == [(4, 500, 125, slave), (4, 625, 75, slave),
+                                   (3, 1500, 2, slave)]
+        assert api.get_conv_val('VALUE_199') == 4.2
+        assert api.get_operation() == 'AUTO'
+
+        api.set_operation('STANDBY')
+        assert client.holding[1500] == 1
+        tx = api.transaction()
+        with pytest.raises(ValueError):
+            tx.set('SERIAL_NUMBER', 1)
+        with pytest.raises(ValueError):
+            tx.set('VALUE_0', 1.0)
+
+    def test_model_name(self):
+        api = pyse.StiebelEltronAPI(FakeModbusClient(), slave, model='lwz')
+        assert api.model is load_model('lwz')
+        assert api.update()
+        assert api.get_operation() == 'EMERGENCY OPERATION'
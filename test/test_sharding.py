@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+import time
+
+from pystiebeleltron import pystiebeleltron as pyse
+from pystiebeleltron.sharding import ShardedFleet, SnapshotRing, _Shard
+from pystiebeleltron.snapshot import RegisterSnapshot
+from test.fake_modbus_client import FakeAsyncModbusClient
+
+TARGETS = [('10.0.0.{}'.format(host), 502, slave)
+           for host in range(1, 5) for slave in (1, 2)]
+
+
+def fake_client(host, port):
+    """ Client of the workers, the room temperature is the last octet. """
+    client = FakeAsyncModbusClient()
+    client.input[0] = int(host.rsplit('.', 1)[1])
+    return client
+
+
+def wait_for(fleet, condition, timeout=30.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        fleet.drain()
+        fleet.supervise()
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class TestSnapshotRing:
+    def test_put_and_read(self):
+        layout = pyse.REGISTER_LAYOUT
+        ring = SnapshotRing(layout, 4)
+        writer = SnapshotRing(layout, 4, ring.name)
+        try:
+            for i in range(6):
+                writer.put(i, RegisterSnapshot(layout, [i] * layout.size,
+                                               1000.0 + i))
+            records = ring.read()
+            assert [target for target, _ in records] == [2, 3, 4, 5]
+            assert records[-1][1].words.tolist() == [5] * layout.size
+            assert records[-1][1].timestamp == 1005.0
+            assert ring.lost == 2
+            assert ring.read() == []
+        finally:
+            writer.close()
+            ring.close()
+            ring.unlink()
+
+
+class TestShardedFleet:
+    def test_ring_capacity_of_shard(self):
+        targets = [('10.0.1.{}'.format(host), 502, 1) for host in range(40)]
+        fleet = ShardedFleet(targets, shards=2)
+        shards = fleet._partition()
+        assert [len(shard) for shard in shards] == [20, 20]
+        assert fleet._ring_capacity(shards[0]) == 40
+        assert fleet._ring_capacity(shards[0][:4]) == 16
+        assert ShardedFleet(targets, capacity=8)._ring_capacity([1]) == 8
+
+    def test_rebalance_to_live_workers(self):
+        class Process:
+            def __init__(self, alive):
+                self.alive = alive
+
+            def is_alive(self):
+                return self.alive
+
+        class Conn:
+            def __init__(self, broken):
+                self.broken = broken
+                self.sent = []
+
+            def send(self, message):
+                if self.broken:
+                    raise BrokenPipeError("worker died")
+                self.sent.append(message)
+
+        fleet = ShardedFleet(TARGETS, shards=3)
+        for number, alive in enumerate((False, True, False, False)):
+            shard = _Shard(number, [2 * number, 2 * number + 1],
+                           SnapshotRing(pyse.REGISTER_LAYOUT, 4))
+            shard.process = Process(alive)
+            shard.conn = Conn(broken=not alive)
+            fleet._shards.append(shard)
+        dead, live, *others = fleet._shards
+
+        fleet._rebalance(dead)
+        assert live.targets == [2, 3, 0, 1]
+        assert live.conn.sent == [('add', [(0, TARGETS[0]), (1, TARGETS[1])])]
+
+        # Without live workers the targets wait for the restarts
+        live.process.alive = False
+        live.conn.broken = True
+        fleet._rebalance(live)
+        assert sorted(len(shard.targets) for shard in others) == [4, 4]
+        for shard in others:
+            shard.ring.close()
+            shard.ring.unlink()
+
+    def test_poll_restart_and_rebalance(self):
+        fleet = ShardedFleet(TARGETS, shards=2, interval=0.1,
+                             max_restarts=1, client_factory=fake_client,
+                             jitter=0)
+        with fleet:
+            assert wait_for(fleet, lambda: len(fleet.latest) == len(TARGETS))
+            shards = fleet.shards
+            assert [shard.targets for shard in shards] == [4, 4]
+            snapshot = fleet.latest[TARGETS[-1]]
+            assert snapshot.raw('ACTUAL_ROOM_TEMPERATURE_HC1') == 4
+
+            # A killed worker is restarted
+            fleet._shards[0].process.kill()
+            fleet._shards[0].process.join()
+            fleet.latest.clear()
+            assert wait_for(fleet, lambda: len(fleet.latest) == len(TARGETS))
+            assert fleet.shards[0].restarts == 1
+
+            # After max_restarts its targets move to the other shard
+            fleet._shards[0].process.kill()
+            fleet._shards[0].process.join()
+            fleet.latest.clear()
+            assert wait_for(fleet, lambda: len(fleet.latest) == len(TARGETS))
+            assert [shard.targets for shard in fleet.shards] == [8]
+            assert fleet.shards[0].alive
+        assert fleet.shards == []
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+import asyncio
+
+from pymodbus.client import ModbusTcpClient
+
+from pystiebeleltron import pystiebeleltron as pyse
+from pystiebeleltron.fleet import FleetPoller
+from test.simulator import IsgSimulator, VirtualHeatPump
+
+host_ip = "127.0.0.1"
+ports = (5031, 5032)
+slave = 1
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestVirtualHeatPump:
+
+    def test_dhw_priority(self):
+        clock = FakeClock()
+        pump = VirtualHeatPump(seed=1, clock=clock)
+        pump.dhw = 40.0
+
+        clock.now = 60
+        pump.advance()
+        status = pump.input[pyse.B3_REGMAP_INPUT['OPERATING_STATUS']['addr']]
+        assert status & pyse.B3_OPERATING_STATUS['DHW']
+        assert status & pyse.B3_OPERATING_STATUS['COMPRESSOR']
+        assert not status & pyse.B3_OPERATING_STATUS['HEATING']
+
+        clock.now = 2 * 3600
+        pump.advance()
+        assert 49 < pump.dhw < 51
+        assert not pump.dhw_heating
+
+    def test_writes_and_unavailable(self):
+        clock = FakeClock()
+        pump = VirtualHeatPump(seed=2, clock=clock)
+        standby = pyse.B2_OPERATING_MODE_WRITE['STANDBY']
+        pump.write(pyse.B2_REGMAP_HOLDING['OPERATING_MODE']['addr'],
+                   [standby])
+        clock.now = 600
+        pump.advance()
+
+        assert pump.setting('OPERATING_MODE') == standby
+        assert pump.input[pyse.B3_REGMAP_INPUT['OPERATING_STATUS']['addr']] \
+            == 0
+        addr = pyse.B1_REGMAP_INPUT['ACTUAL_ROOM_TEMPERATURE_HC2']['addr']
+        assert pump.input[addr] == pyse.UNAVAILABLE_OBJECT
+
+
+class TestIsgSimulator:
+
+    def test_fleet_and_writes(self):
+        with IsgSimulator(ports=ports, devices=3, speed=60, seed=3) as sim:
+            poller = FleetPoller(sim.targets, interval=0.1, jitter=0)
+
+            async def poll():
+                report = await poller.poll_cycle()
+                poller.close()
+                return report
+
+            report = asyncio.run(poll())
+            assert report.polled == 6
+            assert report.failed == 0
+
+            client = ModbusTcpClient(host_ip, port=ports[1], timeout=2)
+            api = pyse.StiebelEltronAPI(client, slave)
+            api.set_target_temp(22.5)
+            assert api.update()
+            client.close()
+
+            assert sim.pump(ports[1], slave).setting(
+                'ROOM_TEMP_HEAT_DAY_HC1') == 22.5
+            assert api.get_target_temp() == 22.5
+            assert api.get_conv_val('ACTUAL_ROOM_TEMPERATURE_HC2') is None
+            assert -20 < api.get_conv_val('OUTSIDE_TEMPERATURE') < 20
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+import pytest
+
+from pystiebeleltron import pystiebeleltron as pyse
+from pystiebeleltron.snapshot import (
+    RegisterSnapshot, load_snapshot, save_snapshot)
+from test.fake_modbus_client import FakeModbusClient
+
+slave = 1
+
+
+class TestRegisterSnapshot:
+
+    def test_layout(self):
+        layout = pyse.REGISTER_LAYOUT
+        assert layout.size == 33 + 27 + 3
+        assert layout.index['ACTUAL_ROOM_TEMPERATURE_HC1'] == 0
+        assert layout.index['OPERATING_MODE'] == 33
+        assert layout.index['BUS_STATUS'] == 62
+        assert layout.block_slice(2) == slice(60, 63)
+
+    def test_snapshot(self):
+        layout = pyse.REGISTER_LAYOUT
+        words = list(range(layout.size))
+        snapshot = RegisterSnapshot(layout, words, timestamp=1.0)
+
+        assert snapshot['OPERATING_MODE'] == 33
+        assert snapshot.block(2).tolist() == [60, 61, 62]
+        assert snapshot.timestamp == 1.0
+        with pytest.raises(TypeError):
+            snapshot.words[0] = 1
+
+        words[33] = 5
+        other = RegisterSnapshot(layout, words, timestamp=2.0)
+        assert other != snapshot
+        assert other.changed(snapshot) == ['OPERATING_MODE']
+        assert snapshot == RegisterSnapshot(layout, range(layout.size))
+
+    def test_wrong_size(self):
+        with pytest.raises(ValueError):
+            RegisterSnapshot(pyse.REGISTER_LAYOUT, [0, 1, 2])
+
+    def test_instances_do_not_share_values(self):
+        client_1 = FakeModbusClient()
+        client_2 = FakeModbusClient()
+        client_1.input[0] = 215
+        client_2.input[0] = 190
+        api_1 = pyse.StiebelEltronAPI(client_1, slave)
+        api_2 = pyse.StiebelEltronAPI(client_2, slave)
+
+        assert api_1.update()
+        assert api_2.update()
+
+        assert api_1.get_current_temp() == 21.5
+        assert api_2.get_current_temp() == 19.0
+        assert pyse.B1_REGMAP_INPUT['ACTUAL_ROOM_TEMPERATURE_HC1']['value'] == 0
+
+
+class TestSnapshotFile:
+
+    def test_save_and_load(self, tmp_path):
+        path = str(tmp_path / 'snapshot.json')
+        layout = pyse.REGISTER_LAYOUT
+        snapshot = RegisterSnapshot(layout, range(layout.size), 1234.5)
+        save_snapshot(snapshot, path, {'slave': slave})
+
+        loaded = load_snapshot(path, layout, {'slave': slave})
+        assert loaded == snapshot
+        assert loaded.timestamp == 1234.5
+        assert load_snapshot(path, layout, {'slave': 2}) is None
+        assert load_snapshot(str(tmp_path / 'missing.json'), layout) is None
+        assert [p.name for p in tmp_path.iterdir()] == ['snapshot.json']
+
+    def test_invalid_file_is_ignored(self, tmp_path):
+        path = tmp_path / 'snapshot.json'
+        path.write_text('{"version": 1, "words"')
+        assert load_snapshot(str(path), pyse.REGISTER_LAYOUT) is None
+
+    def test_warm_start(self, tmp_path):
+        path = str(tmp_path / 'snapshot.json')
+        client = FakeModbusClient()
+        client.input[0] = 215
+        api = pyse.StiebelEltronAPI(client, slave, snapshot_file=path)
+        assert not api.stale
+        assert api.update()
+
+        client.fail_reads = True
+        restarted = pyse.StiebelEltronAPI(client, slave, snapshot_file=path)
+        assert restarted.stale
+        assert restarted.snapshot.timestamp == api.snapshot.timestamp
+        assert restarted.get_conv_val('ACTUAL_ROOM_TEMPERATURE_HC1') == 21.5
+        assert not restarted.update()
+        assert restarted.stale
+
+        client.fail_reads = False
+        assert restarted.update()
+        assert not restarted.stale
+
+    def test_snapshot_of_other_slave_is_ignored(self, tmp_path):
+        path = str(tmp_path / 'snapshot.json')
+        api = pyse.StiebelEltronAPI(FakeModbusClient(), slave,
+                                    snapshot_file=path)
+        assert api.update()
+        other = pyse.StiebelEltronAPI(FakeModbusClient(), 2,
+                                      snapshot_file=path)
+        assert not other.stale
+        assert other.snapshot.timestamp is None
+
+    def test_saves_are_throttled(self, tmp_path, monkeypatch):
+        path = str(tmp_path / 'snapshot.json')
+        saved = []
+        monkeypatch.setattr(pyse, 'save_snapshot',
+                            lambda snapshot, *args: saved.append(snapshot))
+        client = FakeModbusClient()
+        api = pyse.StiebelEltronAPI(client, slave, snapshot_file=path,
+                                    snapshot_interval=60)
+        assert api.update()
+        assert api.update()
+        assert api.update_registers(['OUTSIDE_TEMPERATURE'])
+        api.set_target_temp(21.5, confirm=True)
+        assert len(saved) == 1
+
+        api.close()
+        assert len(saved) == 2
+        assert saved[-1] is api.snapshot
+        api.close()
+        assert len(saved) == 2
+
+    def test_stale_snapshot_is_refreshed(self, tmp_path):
+        path = str(tmp_path / 'snapshot.json')
+        client = FakeModbusClient()
+        assert pyse.StiebelEltronAPI(client, slave,
+                                     snapshot_file=path).update()
+        client.input[0] = 200
+        restarted = pyse.StiebelEltronAPI(client, slave, max_age=3600,
+                                          snapshot_file=path)
+        assert restarted.stale
+        assert restarted.get_current_temp() == 20.0
+        assert not restarted.stale
+
+    def test_stale_snapshot_does_not_skip_writes(self, tmp_path):
+        path = str(tmp_path / 'snapshot.json')
+        client = FakeModbusClient()
+        client.holding[1001] = 215
+        assert pyse.StiebelEltronAPI(client, slave,
+                                     snapshot_file=path).update()
+        client.holding[1001] = 180
+        restarted = pyse.StiebelEltronAPI(client, slave, snapshot_file=path)
+        assert restarted.stale
+
+        with restarted.transaction() as tx:
+            tx.set('ROOM_TEMP_HEAT_DAY_HC1', 21.5)
+
+        assert tx.verified is True
+        assert client.holding[1001] == 215
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+import asyncio
+
+from pystiebeleltron import pystiebeleltron as pyse
+from pystiebeleltron.async_api import AsyncStiebelEltronAPI
+from pystiebeleltron.status import (
+    BusStatus, DeviceStatus, FaultStatus, OperatingStatus)
+from test.fake_modbus_client import FakeAsyncModbusClient, FakeModbusClient
+
+slave = 1
+
+
+class TestDeviceStatus:
+    def test_flags_match_register_map(self):
+        assert {flag.name: flag.value for flag in OperatingStatus} == {
+            name.replace('-', '_'): mask
+            for name, mask in pyse.B3_OPERATING_STATUS.items()}
+        assert OperatingStatus.from_name('POWER-OFF') == 1 << 7
+        assert {member.value for member in BusStatus} == set(
+            pyse.B3_BUS_STATUS.values())
+        assert BusStatus.from_name('BUS-OFF') is BusStatus.BUS_OFF
+        assert FaultStatus.from_name('FAULT') is FaultStatus.FAULT
+
+    def test_get_status_reads_once(self):
+        client = FakeModbusClient()
+        client.input[2000] = 0x2104
+        client.input[2001] = 1
+        client.input[2002] = 0xFFFD
+        api = pyse.StiebelEltronAPI(client, slave, update_on_read=True)
+
+        status = api.get_status()
+        assert len(client.requests) == 3
+        assert status.operating == (OperatingStatus.HEATING |
+                                    OperatingStatus.FILTER |
+                                    OperatingStatus.FILTER_VENTILATION_AIR)
+        assert status.fault is FaultStatus.FAULT
+        assert status.bus is BusStatus.BUS_OFF
+        assert status.timestamp == api.snapshot.timestamp
+        assert status.heating and status.filter_alarm
+        assert not status.cooling and not status.ok
+
+    def test_async_get_status(self):
+        client = FakeAsyncModbusClient()
+        client.input[2000] = 1 << 3
+        api = AsyncStiebelEltronAPI(client, slave, update_on_read=True)
+
+        status = asyncio.run(api.get_status())
+        assert status.cooling
+        assert status.ok
+
+    def test_unavailable_and_unknown_values(self):
+        status = DeviceStatus.from_words(0x8000, 7, 0x8000)
+        assert status.operating is None
+        assert status.fault == 7
+        assert status.bus is None
+        assert not status.heating and not status.ok
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+import asyncio
+import time
+
+import pytest
+
+from pystiebeleltron import pystiebeleltron as pyse
+from pystiebeleltron.async_api import AsyncStiebelEltronAPI
+from test.fake_modbus_client import FakeModbusClient, FakeAsyncModbusClient
+
+slave = 1
+
+
+class TestStream:
+
+    def test_next_deadline(self):
+        assert pyse.next_deadline(10.0, 1.0, 10.5) == (11.0, 0)
+        assert pyse.next_deadline(10.0, 1.0, 11.0) == (12.0, 1)
+        assert pyse.next_deadline(10.0, 1.0, 13.2) == (14.0, 3)
+
+    def test_registers(self):
+        client = FakeModbusClient()
+        client.input[11] = 352
+        api = pyse.StiebelEltronAPI(client, slave)
+
+        samples = list(api.stream(0.01, ['FLOW_TEMPERATURE'], count=3))
+
+        assert len(samples) == 3
+        assert samples[0].values == {'FLOW_TEMPERATURE': 35.2}
+        assert samples[0].missed == 0
+        assert client.requests == [(4, 11, 1, slave)] * 3
+
+    def test_drift_free(self):
+        # Every poll takes 30 ms of the 50 ms interval
+        client = FakeModbusClient(delay=0.01)
+        api = pyse.StiebelEltronAPI(client, slave)
+
+        start = time.monotonic()
+        samples = list(api.stream(0.05, count=5))
+        elapsed = time.monotonic() - start
+
+        assert len(samples) == 5
+        assert 0.2 < elapsed < 0.3
+        assert samples[-1].values['OPERATING_STATUS'] == 0
+
+    def test_slow_consumer(self):
+        api = pyse.StiebelEltronAPI(FakeModbusClient(), slave)
+
+        missed = []
+        for sample in api.stream(0.01, count=3):
+            missed.append(sample.missed)
+            time.sleep(0.035)
+
+        assert missed[0] == 0
+        assert missed[1] >= 2
+
+    def test_async_latest_only(self):
+        client = FakeAsyncModbusClient()
+        api = AsyncStiebelEltronAPI(client, slave)
+
+        async def consume():
+            samples = []
+            async for sample in api.stream(0.01, count=3):
+                samples.append(sample)
+                await asyncio.sleep(0.045)
+            requests = len(client.requests)
+            await asyncio.sleep(0.03)
+            return samples, requests
+
+        samples, requests = asyncio.run(consume())
+
+        assert len(samples) == 3
+        assert samples[0].missed == 0
+        assert samples[1].missed >= 3
+        # The producer stopped with the consumer
+        assert len(client.requests) == requests
+
+    def test_async_producer_error(self):
+        client = FakeAsyncModbusClient()
+        api = AsyncStiebelEltronAPI(client, slave)
+
+        async def fail(registers):
+            raise RuntimeError("poll failed")
+
+        api.update_registers = fail
+
+        async def consume():
+            async for _ in api.stream(0.01, ['OPERATING_MODE']):
+                pass
+
+        with pytest.raises(RuntimeError, match="poll failed"):
+            asyncio.run(consume())
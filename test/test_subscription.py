@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+import asyncio
+
+import pytest
+
+from pystiebeleltron import pystiebeleltron as pyse
+from pystiebeleltron.async_api import AsyncStiebelEltronAPI
+from test.fake_modbus_client import FakeModbusClient, FakeAsyncModbusClient
+
+slave = 1
+
+
+class TestSubscriptions:
+
+    def test_register_changes(self):
+        client = FakeModbusClient()
+        api = pyse.StiebelEltronAPI(client, slave)
+        changes = []
+        api.subscribe('FLOW_TEMPERATURE', changes.append)
+
+        client.input[11] = 300
+        api.update()
+        api.update()
+        client.input[11] = 301
+        api.update()
+
+        assert [(c.value, c.previous) for c in changes] == [
+            (30.0, None), (pytest.approx(30.1), 30.0)]
+
+    def test_deadband(self):
+        client = FakeModbusClient()
+        api = pyse.StiebelEltronAPI(client, slave)
+        api.update()
+        changes = []
+        api.subscribe('OUTSIDE_TEMPERATURE', changes.append, deadband=0.5)
+
+        for value in (2, 4, 5, 3, 0xFDA8):
+            client.input[6] = value
+            api.update()
+
+        # 0.2, 0.4 and 0.3 stay within the deadband of the last report,
+        # the error value is always reported
+        assert [c.value for c in changes] == [0.5, None]
+
+    def test_status_bit(self):
+        client = FakeModbusClient()
+        api = pyse.StiebelEltronAPI(client, slave)
+        api.update()
+        changes = []
+        api.subscribe('HEATING', changes.append)
+
+        for value in (0x0002, 0x0006, 0x0007, 0x0003):
+            client.input[2000] = value
+            api.update()
+
+        assert [c.value for c in changes] == [True, False]
+
+    def test_unsubscribe(self):
+        client = FakeModbusClient()
+        api = pyse.StiebelEltronAPI(client, slave)
+        changes = []
+        unsubscribe = api.subscribe('OPERATING_MODE', changes.append)
+        unsubscribe()
+
+        client.holding[1000] = 11
+        api.update()
+
+        assert changes == []
+
+    def test_invalid_names(self):
+        api = pyse.StiebelEltronAPI(FakeModbusClient(), slave)
+        with pytest.raises(KeyError):
+            api.subscribe('NO_SUCH_REGISTER', print)
+        with pytest.raises(ValueError):
+            api.subscribe('HEATING', print, deadband=1)
+
+    def test_async_changes(self):
+        client = FakeAsyncModbusClient()
+        api = AsyncStiebelEltronAPI(client, slave)
+
+        async def collect():
+            changes = api.changes(['COOLING', 'OPERATING_MODE'])
+            received = []
+            task = asyncio.ensure_future(changes.__anext__())
+            await asyncio.sleep(0)
+            client.input[2000] = 0x0008
+            await api.update()
+            received.append(await task)
+            client.holding[1000] = 1
+            await api.update()
+            received.append(await changes.__anext__())
+            await changes.aclose()
+            return received
+
+        received = asyncio.run(collect())
+        names = sorted((c.name, c.value) for c in received)
+        assert ('COOLING', True) in names
+        assert api._subscriptions is not None
+        assert not api._subscriptions
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+import threading
+import time
+
+from pystiebeleltron import pystiebeleltron as pyse
+from test.fake_modbus_client import FakeModbusClient
+
+slave = 1
+THREADS = 8
+
+
+class ConcurrencyCheckingClient(FakeModbusClient):
+    """ Fake client counting overlapping requests.
+
+    Every read of block 1 starts a new generation, all registers read
+    return the current generation.
+    """
+
+    def __init__(self, delay=0.0):
+        super().__init__(delay)
+        self.generation = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _read(self, table, function_code, address, count, slave):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if address == 0:
+                self.generation += 1
+            time.sleep(self.delay)
+            return super()._read(
+                {address + i: self.generation for i in range(count)},
+                function_code, address, count, slave)
+        finally:
+            self.in_flight -= 1
+
+
+def run_threads(target):
+    barrier = threading.Barrier(THREADS)
+
+    def run():
+        barrier.wait()
+        target()
+
+    threads = [threading.Thread(target=run) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+class TestThreadSafe:
+
+    def test_single_flight_refresh(self):
+        client = ConcurrencyCheckingClient(delay=0.02)
+        api = pyse.StiebelEltronAPI(client, slave, max_age=60,
+                                    thread_safe=True)
+        results = []
+
+        run_threads(lambda: results.append(api.get_current_temp()))
+
+        assert len(client.requests) == 3
+        assert results == [0.1] * THREADS
+        assert client.max_in_flight == 1
+
+    def test_consistent_snapshots(self):
+        client = ConcurrencyCheckingClient(delay=0.001)
+        api = pyse.StiebelEltronAPI(client, slave, thread_safe=True)
+        torn = []
+
+        def update():
+            for _ in range(10):
+                api.update()
+                words = api.snapshot.words
+                if not words[0] == words[33] == words[60]:
+                    torn.append(words.tolist())
+
+        run_threads(update)
+
+        assert client.max_in_flight == 1
+        assert not torn
+        assert api.snapshot.words[0] == client.generation
+
+    def test_writes_serialized(self):
+        client = ConcurrencyCheckingClient(delay=0.001)
+        api = pyse.StiebelEltronAPI(client, slave, thread_safe=True)
+
+        def write():
+            for _ in range(5):
+                with api.transaction() as tx:
+                    tx.set('ROOM_TEMP_HEAT_DAY_HC1', 21.0)
+                api.update()
+
+        run_threads(write)
+
+        assert client.max_in_flight == 1
+
+    def test_write_between_block_reads(self):
+        client = FakeModbusClient(delay=0.05)
+        api = pyse.StiebelEltronAPI(client, slave, thread_safe=True)
+        update = threading.Thread(target=api.update)
+        update.start()
+        time.sleep(0.02)
+        assert api.set_target_temp(21.0) is True
+        update.join()
+
+        assert [request[0] for request in client.requests] == [4, 6, 3, 4]
+        assert api.get_conv_val('ROOM_TEMP_HEAT_DAY_HC1') == 21.0
+
+    def test_transaction_before_block_reads(self):
+        client = FakeModbusClient(delay=0.05)
+        api = pyse.StiebelEltronAPI(client, slave, thread_safe=True)
+        update = threading.Thread(target=api.update)
+        update.start()
+        time.sleep(0.02)
+        with api.transaction() as tx:
+            tx.set('ROOM_TEMP_HEAT_DAY_HC1', 21.0)
+        update.join()
+
+        assert tx.verified is True
+        assert [request[0] for request in client.requests] == [4, 6, 3, 3, 4]
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+import asyncio
+
+import pytest
+
+from pystiebeleltron import pystiebeleltron as pyse
+from pystiebeleltron.async_api import AsyncStiebelEltronAPI
+from test.fake_modbus_client import FakeModbusClient, FakeAsyncModbusClient
+
+slave = 1
+
+
+class TestWriteTransaction:
+
+    def test_contiguous_runs(self):
+        client = FakeModbusClient()
+        api = pyse.StiebelEltronAPI(client, slave)
+
+        with api.transaction() as tx:
+            tx.set('ROOM_TEMP_HEAT_DAY_HC1', 21.5)
+            tx.set('ROOM_TEMP_HEAT_NIGHT_HC1', 18.0)
+            tx.set('MANUAL_SET_TEMP_HC1', 20.0)
+            tx.set('DHW_TEMP_SET_DAY', 50.0)
+
+        assert client.requests == [(16, 1001, 3, slave), (6, 1011, 1, slave),
+                                   (3, 1001, 3, slave), (3, 1011, 1, slave)]
+        assert client.holding[1002] == 180
+        assert tx.verified is True
+        assert api.get_conv_val('DHW_TEMP_SET_DAY') == 50.0
+
+    def test_skip_unchanged(self):
+        client = FakeModbusClient()
+        client.holding[1001] = 215
+        api = pyse.StiebelEltronAPI(client, slave)
+        api.update()
+        client.requests.clear()
+
+        tx = api.transaction(verify=False)
+        tx.set('ROOM_TEMP_HEAT_DAY_HC1', 21.5)
+        tx.set('ROOM_TEMP_HEAT_NIGHT_HC1', 17.5)
+        assert tx.commit()
+
+        assert client.requests == [(6, 1002, 1, slave)]
+
+    def test_validation(self):
+        api = pyse.StiebelEltronAPI(FakeModbusClient(), slave)
+        tx = api.transaction()
+        with pytest.raises(ValueError):
+            tx.set('FLOW_TEMPERATURE', 30.0)
+        with pytest.raises(ValueError):
+            tx.set('OPERATING_MODE', 256)
+        with pytest.raises(ValueError):
+            tx.set('ROOM_TEMP_HEAT_DAY_HC1', 4000)
+        with pytest.raises(ValueError):
+            tx.set('ROOM_TEMP_HEAT_DAY_HC1', float('inf'))
+        with pytest.raises(KeyError):
+            tx.set('NO_SUCH_REGISTER', 1)
+        tx.set('GRADIENT_HC1', -0.35)
+
+    def test_encode_write(self):
+        api = pyse.StiebelEltronAPI(FakeModbusClient(), slave)
+        address, offset, word = api.encode_write('GRADIENT_HC1', -0.35)
+        assert address == 1007
+        assert api.snapshot.layout.offset('GRADIENT_HC1') == offset
+        assert word == 0xFFDD
+
+    def test_setters_validate(self):
+        client = FakeModbusClient()
+        api = pyse.StiebelEltronAPI(client, slave)
+        with pytest.raises(ValueError):
+            api.set_target_temp(4000)
+        with pytest.raises(ValueError):
+            api.set_operation('SAUNA')
+        assert client.requests == []
+        assert api.set_target_temp(-5.0) is True
+        assert client.holding[1001] == 0xFFCE
+
+        client = FakeAsyncModbusClient()
+        api = AsyncStiebelEltronAPI(client, slave)
+        with pytest.raises(ValueError):
+            asyncio.run(api.set_target_temp(float('nan')))
+        with pytest.raises(ValueError):
+            asyncio.run(api.set_operation('SAUNA'))
+        assert client.requests == []
+        assert asyncio.run(api.set_target_temp(-5.0)) is True
+        assert client.holding[1001] == 0xFFCE
+
+    def test_verify_failure(self):
+        client = FakeModbusClient()
+        api = pyse.StiebelEltronAPI(client, slave)
+        client.write_registers = lambda **kwargs: None
+
+        tx = api.transaction()
+        tx.set('ROOM_TEMP_COOL_DAY_HC1', 25.0)
+        tx.set('ROOM_TEMP_COOL_NIGHT_HC1', 26.0)
+
+        assert tx.commit() is False
+        assert tx.verified is False
+
+    def test_missing_response_fails(self):
+        client = FakeModbusClient()
+        api = pyse.StiebelEltronAPI(client, slave)
+        client.write_register = lambda **kwargs: None
+
+        tx = api.transaction(verify=False)
+        tx.set('ROOM_TEMP_HEAT_DAY_HC1', 21.5)
+        assert tx.commit() is False
+        assert tx.verified is False
+
+    def test_async_transaction(self):
+        client = FakeAsyncModbusClient()
+        api = AsyncStiebelEltronAPI(client, slave)
+
+        async def write():
+            async with api.transaction() as tx:
+                tx.set('ROOM_TEMP_HEAT_DAY_HC2', 21.0)
+                tx.set('ROOM_TEMP_HEAT_NIGHT_HC2', 17.0)
+            return tx
+
+        tx = asyncio.run(write())
+        assert tx.verified is True
+        assert client.requests[0] == (16, 1004, 2, slave)
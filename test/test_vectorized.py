@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+import pytest
+
+from pystiebeleltron import pystiebeleltron as pyse
+from pystiebeleltron.snapshot import RegisterSnapshot
+
+np = pytest.importorskip("numpy")
+vectorized = pytest.importorskip("pystiebeleltron.vectorized")
+
+
+class TestVectorizedDecoding:
+
+    @staticmethod
+    def make_words(rows):
+        words = np.zeros((rows, pyse.REGISTER_LAYOUT.size), dtype=np.uint16)
+        index = pyse.REGISTER_LAYOUT.index
+        words[:, index['OUTSIDE_TEMPERATURE']] = np.arange(rows) - 60
+        words[:, index['HIGH_PRESSURE']] = 1234
+        words[:, index['COMPRESSOR_STARTS']] = 40000
+        words[:, index['OPERATING_MODE']] = 11
+        return words
+
+    def test_matches_get_conv_val(self):
+        words = self.make_words(100)
+        words[3, pyse.REGISTER_LAYOUT.index['FLOW_TEMPERATURE']] = 0x8000
+        decoded = vectorized.decode_blocks(words)
+
+        assert sorted(decoded) == [2, 6, 7, 8]
+        for row in (0, 3, 99):
+            api = pyse.StiebelEltronAPI(None)
+            api._snapshot = RegisterSnapshot(pyse.REGISTER_LAYOUT, words[row])
+            for columns in decoded.values():
+                for i, name in enumerate(columns.names):
+                    expected = api.get_conv_val(name)
+                    value = columns.values[row, i]
+                    if expected is None:
+                        assert np.isnan(value)
+                    else:
+                        assert value == expected
+
+    def test_decode_register(self):
+        words = self.make_words(10)
+        words[0, pyse.REGISTER_LAYOUT.index['OUTSIDE_TEMPERATURE']] = 0xFDA8
+        values = vectorized.decode_register(words, 'OUTSIDE_TEMPERATURE')
+
+        assert np.isnan(values[0])
+        assert values[1] == pytest.approx(-5.9)
+
+    def test_stack_snapshots(self):
+        snapshots = [RegisterSnapshot(pyse.REGISTER_LAYOUT, row)
+                     for row in self.make_words(3)]
+        words = vectorized.stack_snapshots(snapshots)
+
+        assert words.shape == (3, pyse.REGISTER_LAYOUT.size)
+        assert (words == self.make_words(3)).all()
+
+    def test_wrong_shape(self):
+        with pytest.raises(ValueError):
+            vectorized.decode_blocks(np.zeros((2, 10), dtype=np.uint16))
+
+    def test_decode_status(self):
+        words = self.make_words(3)
+        index = pyse.REGISTER_LAYOUT.index
+        words[:, index['OPERATING_STATUS']] = [0x0004, 0x0108, 0x8000]
+        words[:, index['BUS_STATUS']] = [0, 0xFFFC, 0]
+        status = vectorized.decode_status(words)
+
+        assert status.bus.tolist() == [0, -4, 0]
+        assert status.valid.tolist() == [True, True, False]
+        bits = vectorized.status_bits(status.operating)
+        assert bits['HEATING'].tolist() == [True, False, False]
+        assert bits['FILTER'].tolist() == [False, True, False]
+        assert len(bits) == 15